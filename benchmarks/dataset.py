@@ -0,0 +1,265 @@
+"""
+Generates a production-shaped database with the current models.
+
+Every executor gets a teacher, work hours, a weekend, lunch breaks and
+`--students` students. Students have weekly series (some already ended),
+one-off lessons, moved and cancelled occurrences and vacations, everyone
+has `--years` of event_history.
+
+    PYTHONPATH=.:src python benchmarks/dataset.py --executors 5 --students 50 \
+        --output db/bench.sqlite
+"""
+
+import argparse
+import random
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+
+from src.core.config import MAX_LESSONS_PER_DAY
+from src.models import (
+    Base,
+    CancelledRecurrentEvent,
+    Event,
+    EventHistory,
+    Executor,
+    NotificationSetting,
+    RecurrentEvent,
+    User,
+)
+
+WORK_START = time(9, 0)
+WORK_END = time(21, 0)
+HISTORY_EVENTS = (
+    ("start", "register"),
+    ("add_lesson", "added_lesson"),
+    ("move_lesson", "recur_lesson_moved"),
+    ("move_lesson", "recur_lesson_deleted"),
+    ("week_schedule", "help"),
+    ("vacations", "added_vacation"),
+)
+
+
+def this_monday(today: date) -> datetime:
+    return datetime.combine(today - timedelta(days=today.weekday()), time(0))
+
+
+def add_executor(db: Session, rng: random.Random, index: int, students: int, today: date):
+    monday = this_monday(today)
+    executor = Executor(code=f"executor-{index}", telegram_id=10_000_000 + index)
+    db.add(executor)
+    db.flush()
+    teacher = User(
+        telegram_id=executor.telegram_id,
+        username=f"teacher{index}",
+        full_name=f"Teacher {index}",
+        role=User.Roles.TEACHER,
+        executor_id=executor.id,
+    )
+    db.add(teacher)
+    db.flush()
+
+    def recurrent(event_type, start, end, interval, user_id=teacher.id, **kwargs):
+        event = RecurrentEvent(
+            executor_id=executor.id,
+            user_id=user_id,
+            event_type=event_type,
+            start=start,
+            end=end,
+            interval=interval,
+            **kwargs,
+        )
+        db.add(event)
+        return event
+
+    year_ago = monday - timedelta(weeks=52)
+    recurrent(
+        RecurrentEvent.EventTypes.WORK_START,
+        year_ago,
+        datetime.combine(year_ago.date(), WORK_START),
+        1,
+    )
+    recurrent(
+        RecurrentEvent.EventTypes.WORK_END,
+        datetime.combine(year_ago.date(), WORK_END),
+        datetime.combine(year_ago.date(), time(23, 59)),
+        1,
+    )
+    recurrent(
+        RecurrentEvent.EventTypes.WEEKEND,
+        year_ago + timedelta(days=6),
+        year_ago + timedelta(days=7),
+        7,
+    )
+    for weekday in range(5):
+        lunch = datetime.combine((year_ago + timedelta(days=weekday)).date(), time(13))
+        recurrent(
+            RecurrentEvent.EventTypes.WORK_BREAK, lunch, lunch + timedelta(hours=1), 7
+        )
+
+    # Weekly slots avoid lunch, at most MAX_LESSONS_PER_DAY a day
+    slots = [
+        (weekday, hour)
+        for hour in (10, 11, 14, 15, 16, 17, 18, 19)[:MAX_LESSONS_PER_DAY]
+        for weekday in range(6)
+    ]
+    rng.shuffle(slots)
+    free_slots = iter(slots)
+    users = []
+    for s in range(students):
+        student = User(
+            telegram_id=20_000_000 + index * 10_000 + s,
+            username=f"student{index}_{s}" if rng.random() < 0.8 else None,
+            full_name=f"Student {index}.{s}",
+            role=User.Roles.STUDENT,
+            executor_id=executor.id,
+        )
+        db.add(student)
+        users.append(student)
+    db.flush()
+
+    for student in users:
+        for _ in range(rng.choice((1, 1, 2))):
+            weekday, hour = next(free_slots, (rng.randrange(6), rng.randrange(10, 20)))
+            start = monday - timedelta(weeks=rng.randrange(1, 40))
+            start = datetime.combine((start + timedelta(days=weekday)).date(), time(hour))
+            ended = rng.random() < 0.1
+            series = recurrent(
+                RecurrentEvent.EventTypes.LESSON,
+                start,
+                start + timedelta(hours=1),
+                7,
+                user_id=student.id,
+                interval_end=monday - timedelta(weeks=1) if ended else None,
+            )
+            db.flush()
+            # Cancelled and moved occurrences over the next weeks
+            for week in range(4):
+                roll = rng.random()
+                if roll > 0.2:
+                    continue
+                occurrence = datetime.combine(
+                    (monday + timedelta(weeks=week, days=weekday)).date(), time(hour)
+                )
+                db.add(
+                    CancelledRecurrentEvent(
+                        event_id=series.id,
+                        break_type=CancelledRecurrentEvent.CancelTypes.LESSON_CANCELED,
+                        start=occurrence,
+                        end=occurrence + timedelta(hours=1),
+                    )
+                )
+                if roll < 0.1:
+                    moved = occurrence + timedelta(days=rng.choice((-1, 1)), hours=1)
+                    db.add(
+                        Event(
+                            executor_id=executor.id,
+                            user_id=student.id,
+                            event_type=Event.EventTypes.MOVED_LESSON,
+                            start=moved,
+                            end=moved + timedelta(hours=1),
+                            is_reschedule=True,
+                        )
+                    )
+
+        for _ in range(rng.randrange(3)):
+            day = monday + timedelta(days=rng.randrange(28))
+            if day.weekday() == 6:
+                continue
+            start = datetime.combine(day.date(), time(rng.randrange(10, 20)))
+            db.add(
+                Event(
+                    executor_id=executor.id,
+                    user_id=student.id,
+                    event_type=Event.EventTypes.LESSON,
+                    start=start,
+                    end=start + timedelta(hours=1),
+                )
+            )
+
+        if rng.random() < 0.1:
+            start = monday + timedelta(days=rng.randrange(28))
+            db.add(
+                Event(
+                    executor_id=executor.id,
+                    user_id=student.id,
+                    event_type=Event.EventTypes.VACATION,
+                    start=start,
+                    end=start + timedelta(days=rng.randrange(3, 14)),
+                )
+            )
+        if rng.random() < 0.3:
+            db.add(
+                NotificationSetting(
+                    user_id=student.id, time=time(rng.randrange(7, 11), 0)
+                )
+            )
+    return [teacher, *users]
+
+
+def add_history(db: Session, rng: random.Random, users: list[User], years: int, today: date):
+    """About one action a week per user, inserted with executemany."""
+    rows = []
+    for user in users:
+        author = user.username or user.full_name
+        for week in range(52 * years):
+            scene, event_type = rng.choice(HISTORY_EVENTS)
+            rows.append(
+                {
+                    "author": author,
+                    "scene": scene,
+                    "event_type": event_type,
+                    "event_value": "",
+                    "created_at": datetime.combine(today, time(12))
+                    - timedelta(weeks=week, hours=rng.randrange(72)),
+                }
+            )
+        if len(rows) > 10_000:
+            db.execute(insert(EventHistory), rows)
+            rows = []
+    if rows:
+        db.execute(insert(EventHistory), rows)
+
+
+def generate(
+    path: str,
+    executors: int,
+    students: int,
+    years: int = 2,
+    seed: int = 0,
+    today: date | None = None,
+    url: str | None = None,
+):
+    """Create (or extend) the SQLite database at `path`, or the database at `url`."""
+    rng = random.Random(seed)
+    today = today or date.today()
+    engine = create_engine(url or f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        offset = db.query(Executor).count()
+        users = []
+        for index in range(offset, offset + executors):
+            users += add_executor(db, rng, index, students, today)
+        add_history(db, rng, users, years, today)
+        db.commit()
+    engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--executors", type=int, default=1)
+    parser.add_argument("--students", type=int, default=30)
+    parser.add_argument("--years", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="db/bench.sqlite")
+    args = parser.parse_args()
+    generate(args.output, args.executors, args.students, args.years, args.seed)
+    print(
+        f"{args.output}: {args.executors} executors, "
+        f"{args.executors * args.students} students"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Local stand-in for api.telegram.org used by the benchmarks."""
+
+import asyncio
+import time
+
+from aiohttp import web
+
+BOT_USER = {"id": 42, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+
+
+def fake_message(chat_id: int | str, text: str | None = None) -> dict:
+    return {
+        "message_id": 1,
+        "date": int(time.time()),
+        "chat": {"id": int(chat_id), "type": "private"},
+        "text": text or "",
+    }
+
+
+class FakeTelegramAPI:
+    """Answers every Bot API method with `ok: true` and counts the calls."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8081):
+        self.host = host
+        self.port = port
+        self.calls: dict[str, int] = {}
+        self._transports: set[int] = set()
+        self._runner: web.AppRunner | None = None
+        # Updates served to getUpdates and (method, perf_counter) of every call
+        self.updates: asyncio.Queue[dict] = asyncio.Queue()
+        self.received: asyncio.Queue[tuple[str, float]] = asyncio.Queue()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.calls[method] = self.calls.get(method, 0) + 1
+        params = dict(request.query)
+        if request.can_read_body:
+            params.update(await request.post())
+        self.received.put_nowait((method, time.perf_counter()))
+        if method == "getUpdates":
+            result = await self.next_updates(
+                float(params.get("timeout") or 0), int(params.get("limit") or 100)
+            )
+        elif method == "getMe":
+            result = BOT_USER
+        elif method in ("sendMessage", "sendPhoto", "sendVideo", "editMessageText"):
+            result = fake_message(params.get("chat_id", 0), params.get("text"))
+        elif method == "sendMediaGroup":
+            result = [fake_message(params.get("chat_id", 0))]
+        elif method == "copyMessage":
+            result = {"message_id": 1}
+        elif method == "copyMessages":
+            result = [{"message_id": 1}]
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    async def next_updates(self, timeout: float, limit: int) -> list[dict]:
+        try:
+            update = await asyncio.wait_for(self.updates.get(), timeout or 0.01)
+        except asyncio.TimeoutError:
+            return []
+        updates = [update]
+        while not self.updates.empty() and len(updates) < limit:
+            updates.append(self.updates.get_nowait())
+        return updates
+
+    async def wait_for(self, method: str) -> float:
+        """perf_counter of the next call of `method`."""
+        while True:
+            called, at = await self.received.get()
+            if called == method:
+                return at
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_route("*", "/bot{token}/{method}", self.handle)
+        app.on_response_prepare.append(self._count_connection)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+    @property
+    def connections(self) -> int:
+        """Number of distinct TCP connections the server has seen."""
+        return len(self._transports)
+
+    async def _count_connection(self, request: web.Request, _response) -> None:
+        if request.transport is not None:
+            self._transports.add(id(request.transport))
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
@@ -0,0 +1,375 @@
+"""
+End-to-end load test of the bot without a network.
+
+Builds the real dispatcher with every router on a generated dataset and
+plays scripted users against it through `feed_update`: students book lessons
+and page through their week, teachers check overlaps and send broadcasts.
+Buttons are tapped from the keyboards the bot actually sent, the bot's
+session only records the calls. Prints updates/second and p50/p95/p99 per
+scene step, `--output` writes them as JSON. Every executor's teacher and
+students are simulated users, all of them play at once:
+
+    PYTHONPATH=.:src python -m benchmarks.load --executors 2 --students 50
+    PYTHONPATH=.:src python -m benchmarks.load --executors 20 --students 100 \
+        --think 2000 --output load.json
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import subprocess
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+
+from aiogram import Bot
+from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.base import BaseSession
+from aiogram.types import InlineKeyboardMarkup, Update
+
+from benchmarks.dataset import generate
+from benchmarks.fake_api import BOT_USER, fake_message
+
+TOKEN = "42:benchmark"
+
+
+class RecordingSession(BaseSession):
+    """
+    Answers every Bot API call locally and remembers the last keyboard per chat.
+
+    `transcript` keeps what every chat was sent, in order, to compare two builds.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls: Counter[str] = Counter()
+        self.keyboards: dict[int, list[str]] = {}
+        self.transcript: dict[int, list[str]] = defaultdict(list)
+        self.message_ids = itertools.count(1)
+
+    def result(self, name: str, method) -> object:
+        chat_id = getattr(method, "chat_id", None)
+        if name == "getMe":
+            return BOT_USER
+        if name in ("sendMessage", "sendPhoto", "sendVideo", "editMessageText"):
+            message = fake_message(chat_id or 0, getattr(method, "text", None))
+            message["message_id"] = next(self.message_ids)
+            return message
+        if name == "sendMediaGroup":
+            return [fake_message(chat_id or 0)]
+        if name == "copyMessage":
+            return {"message_id": next(self.message_ids)}
+        if name == "copyMessages":
+            return [{"message_id": next(self.message_ids)}]
+        return True
+
+    async def make_request(self, bot: Bot, method, timeout=None):
+        name = method.__api_method__
+        self.calls[name] += 1
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is not None:
+            self.transcript[int(chat_id)].append(
+                f"{name} {getattr(method, 'text', None) or ''}".rstrip()
+            )
+        markup = getattr(method, "reply_markup", None)
+        if isinstance(markup, InlineKeyboardMarkup):
+            self.keyboards[int(method.chat_id)] = [
+                button.callback_data
+                for row in markup.inline_keyboard
+                for button in row
+                if button.callback_data
+            ]
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        response = self.check_response(
+            bot,
+            method,
+            200,
+            json.dumps({"ok": True, "result": self.result(name, method)}),
+        )
+        return response.result
+
+    async def stream_content(self, *args, **kwargs):
+        raise NotImplementedError
+        yield b""
+
+    async def close(self):
+        pass
+
+
+class ErrorCounter(logging.Handler):
+    """Handler errors are answered by the errors router and only logged."""
+
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.count = 0
+
+    def emit(self, record):
+        self.count += 1
+
+
+class Harness:
+    def __init__(self, dp, bot: Bot, session: RecordingSession):
+        self.dp = dp
+        self.bot = bot
+        self.session = session
+        self.update_ids = itertools.count(1)
+        self.message_ids = itertools.count(1_000_000)
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.failed: Counter[str] = Counter()
+
+    async def feed(self, step: str, update: dict):
+        update["update_id"] = next(self.update_ids)
+        event = Update.model_validate(update, context={"bot": self.bot})
+        started = time.perf_counter()
+        try:
+            await self.dp.feed_update(self.bot, event)
+        except Exception as e:
+            self.failed[step] += 1
+            logging.getLogger(__name__).warning(f"{step} failed: {e!r}")
+        self.latencies[step].append(time.perf_counter() - started)
+
+
+class SimulatedUser:
+    def __init__(self, harness: Harness, telegram_id: int, think: float, rng: random.Random):
+        self.harness = harness
+        self.think = think
+        self.rng = rng
+        self.chat = {"id": telegram_id, "type": "private", "first_name": "Load"}
+        self.user = {"id": telegram_id, "is_bot": False, "first_name": "Load"}
+
+    async def pause(self):
+        if self.think:
+            await asyncio.sleep(self.rng.uniform(0, self.think))
+
+    def message(self, text: str) -> dict:
+        return {
+            "message_id": next(self.harness.message_ids),
+            "date": int(time.time()),
+            "chat": self.chat,
+            "from": self.user,
+            "text": text,
+        }
+
+    async def send(self, step: str, text: str):
+        await self.pause()
+        await self.harness.feed(step, {"message": self.message(text)})
+
+    async def tap(self, step: str, prefix: str, last: bool = False) -> bool:
+        """Press a button of the last keyboard the bot sent, False if there is none."""
+        from src.callbacks import expand
+
+        buttons = [
+            data
+            for data in self.harness.session.keyboards.get(self.chat["id"], [])
+            if expand(data).startswith(prefix)
+        ]
+        if not buttons:
+            return False
+        await self.pause()
+        callback = {
+            "id": str(next(self.harness.message_ids)),
+            "from": self.user,
+            "chat_instance": str(self.chat["id"]),
+            "data": buttons[-1] if last else self.rng.choice(buttons),
+            "message": self.message(""),
+        }
+        await self.harness.feed(step, {"callback_query": callback})
+        return True
+
+
+# Flows start from the reply keyboard buttons, like real users do
+async def book_lesson(user: SimulatedUser, today: date):
+    from src.keyboards import Commands
+    from src.routers.lessons.add_lesson import AddLesson
+
+    day = today + timedelta(days=user.rng.randrange(1, 15))
+    if day.weekday() == 6:
+        day += timedelta(days=1)
+    await user.send("add_lesson.start", Commands.ADD_LESSON.value)
+    await user.send("add_lesson.date", day.strftime("%Y-%m-%d"))
+    await user.tap("add_lesson.time", AddLesson.choose_time)
+
+
+async def page_weeks(user: SimulatedUser, _today: date, pages: int = 3):
+    from src.keyboards import Commands
+    from src.routers.lessons.week_schedule import WeekSchedule
+
+    await user.send("week_schedule.open", Commands.WEEK_SCHEDULE.value)
+    for _ in range(pages):
+        await user.tap("week_schedule.next", WeekSchedule.week_start, last=True)
+
+
+async def check_overlaps(user: SimulatedUser, _today: date):
+    from src.keyboards import AdminCommands
+    from src.routers.schedule.check_overlaps import CheckOverlaps
+
+    await user.send("check_overlaps.check", AdminCommands.CHECK_OVERLAPS.value)
+    await user.tap("check_overlaps.send", CheckOverlaps.send_messages)
+
+
+async def broadcast(user: SimulatedUser, _today: date):
+    from src.keyboards import AdminCommands
+
+    await user.send("notifications.start", AdminCommands.SEND_TO_EVERYONE.value)
+    await user.send("notifications.send", "Lessons are moved to the evening this week")
+
+
+STUDENT_FLOWS = (book_lesson, page_weeks)
+TEACHER_FLOWS = (check_overlaps, broadcast)
+
+
+def percentile(values: list[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, round(p / 100 * len(ordered)) - 1))]
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def summary(harness: Harness, elapsed: float) -> dict:
+    steps = {}
+    for step, latencies in sorted(harness.latencies.items()):
+        steps[step] = {
+            "updates": len(latencies),
+            "failed": harness.failed[step],
+            **{
+                f"p{p}_ms": round(percentile(latencies, p) * 1000, 3)
+                for p in (50, 95, 99)
+            },
+            "max_ms": round(max(latencies) * 1000, 3),
+        }
+    updates = sum(s["updates"] for s in steps.values())
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "updates": updates,
+        "updates_per_s": round(updates / elapsed, 1),
+        "bookings_per_s": round(
+            steps.get("add_lesson.time", {}).get("updates", 0) / elapsed, 1
+        ),
+        "steps": steps,
+        "api_calls": dict(harness.session.calls),
+    }
+
+
+async def run(args) -> dict:
+    from sqlalchemy.orm import Session
+
+    import src.bot
+    from database import dispose_engine, get_engine
+    from main import create_dispatcher
+    from src.broadcasts import TokenBucket, broadcasts, media_groups
+    from src.models import User
+
+    session = RecordingSession(args.api_latency / 1000)
+    bot = Bot(TOKEN, session=session, default=DefaultBotProperties(parse_mode="HTML"))
+    # Handlers and the broadcast engine send through the process-wide bot
+    src.bot._bot = bot
+    if args.broadcast_rate:
+        broadcasts.limiter = TokenBucket(args.broadcast_rate)
+    dp = create_dispatcher()
+    if args.concurrency:
+        dp["chat_queues"].semaphore = asyncio.Semaphore(args.concurrency)
+    harness = Harness(dp, bot, session)
+
+    with Session(get_engine()) as db:
+        people = [(u.telegram_id, u.role) for u in db.query(User)]
+    rng = random.Random(args.seed)
+    today = date.today()
+
+    async def play(telegram_id: int, role: str, seed: int):
+        user = SimulatedUser(harness, telegram_id, args.think / 1000, random.Random(seed))
+        flows = TEACHER_FLOWS if role == User.Roles.TEACHER else STUDENT_FLOWS
+        for _ in range(args.iterations):
+            await user.rng.choice(flows)(user, today)
+
+    errors = ErrorCounter()
+    logging.getLogger().addHandler(errors)
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(play(telegram_id, role, rng.random()) for telegram_id, role in people)
+    )
+    elapsed = time.perf_counter() - started
+    logging.getLogger().removeHandler(errors)
+
+    result = summary(harness, elapsed)
+    result.update(
+        users=len(people),
+        handler_errors=errors.count,
+        deepest_chat_queue=dp["chat_queues"].max_depth,
+        broadcasts_unfinished=len(broadcasts.tasks),
+    )
+    for task in [*broadcasts.tasks.values(), *media_groups.tasks]:
+        task.cancel()
+    await asyncio.gather(
+        *broadcasts.tasks.values(), *media_groups.tasks, return_exceptions=True
+    )
+    await dp.storage.close()
+    dispose_engine()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--executors", type=int, default=2)
+    parser.add_argument("--students", type=int, default=50)
+    parser.add_argument("--iterations", type=int, default=1, help="flows per user")
+    parser.add_argument("--think", type=float, default=0, help="max ms between steps")
+    parser.add_argument("--api-latency", type=float, default=0, help="ms per Bot API call")
+    parser.add_argument("--concurrency", type=int, help="override UPDATE_CONCURRENCY")
+    parser.add_argument("--broadcast-rate", type=float, help="override BROADCAST_RATE")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--verbose", action="store_true", help="keep INFO logs")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+
+    os.environ["BOT_TOKEN"] = TOKEN
+    # The bot opens its databases relative to the working directory
+    workdir = tempfile.mkdtemp()
+    os.makedirs(os.path.join(workdir, "db"))
+    os.chdir(workdir)
+    generate("db/db.sqlite", args.executors, args.students, years=1, seed=args.seed)
+    if not args.verbose:
+        logging.disable(logging.INFO)
+
+    result = asyncio.run(run(args))
+
+    print(
+        f"{result['users']} users, {result['updates']} updates in "
+        f"{result['elapsed_s']:.2f}s: {result['updates_per_s']:.1f} updates/s, "
+        f"{result['bookings_per_s']:.1f} bookings/s"
+    )
+    print(f"{'step':<24} {'updates':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'failed':>7}")
+    for step, s in result["steps"].items():
+        print(
+            f"{step:<24} {s['updates']:>8} {s['p50_ms']:>7.1f}ms {s['p95_ms']:>7.1f}ms "
+            f"{s['p99_ms']:>7.1f}ms {s['failed']:>7}"
+        )
+    print(
+        f"handler errors {result['handler_errors']}, deepest chat queue "
+        f"{result['deepest_chat_queue']}, API calls {result['api_calls']}"
+    )
+    if output:
+        with open(output, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,363 @@
+"""
+Differential test of the legacy EventRepo against a candidate engine.
+
+Generates random schedules (work hours, weekly and daily series with ended
+and cancelled occurrences, one-off lessons, breaks and vacations), a day and
+the current moment, loads them into a fresh database (in-memory SQLite, or
+emptied tables of `--url`, e.g. a local PostgreSQL) and calls every
+compared method on both implementations. With Hypothesis installed the first
+disagreement is shrunk to a minimal schedule, without it plain random
+schedules are tried. The time every implementation took is printed at the end.
+
+    PYTHONPATH=.:src python -m benchmarks.oracle --engine indexed --examples 500
+    PYTHONPATH=.:src python -m benchmarks.oracle --url postgresql+psycopg://localhost/olm_test
+"""
+
+import argparse
+import random
+import sys
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+try:
+    from hypothesis import HealthCheck, given, settings
+    from hypothesis import strategies as st
+except ImportError:
+    st = None
+
+MONDAY = date(2025, 1, 6)
+METHODS = (
+    "recurrent_events_for_day",
+    "events_for_day",
+    "day_schedule",
+    "available_time",
+    "available_weekdays",
+    "available_time_weekday",
+)
+
+
+@dataclass
+class Schedule:
+    """Everything relative to MONDAY, times in minutes since midnight."""
+
+    now: datetime
+    day: date
+    weekday: int
+    work: tuple[int, int]
+    students: int
+    # (student or None for the teacher, type, start, minutes, interval, ended after days)
+    recurrent: list[tuple] = field(default_factory=list)
+    # (series index, occurrence start, minutes)
+    cancels: list[tuple] = field(default_factory=list)
+    # (student or None for the teacher, type, start, minutes)
+    events: list[tuple] = field(default_factory=list)
+
+
+class RandomDraw:
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+
+    def integer(self, low: int, high: int) -> int:
+        return self.rng.randint(low, high)
+
+    def choice(self, options):
+        return self.rng.choice(options)
+
+
+class HypothesisDraw:
+    def __init__(self, data):
+        self.data = data
+
+    def integer(self, low: int, high: int) -> int:
+        return self.data.draw(st.integers(low, high))
+
+    def choice(self, options):
+        return self.data.draw(st.sampled_from(options))
+
+
+def draw_schedule(draw) -> Schedule:
+    from src.models import Event, RecurrentEvent
+
+    def moment(days: tuple[int, int]) -> datetime:
+        day = MONDAY + timedelta(days=draw.integer(*days))
+        return datetime.combine(day, datetime.min.time()) + timedelta(
+            minutes=15 * draw.integer(7 * 4, 22 * 4)
+        )
+
+    schedule = Schedule(
+        now=moment((0, 13)),
+        day=MONDAY + timedelta(days=draw.integer(-7, 27)),
+        weekday=draw.integer(0, 6),
+        work=(60 * draw.integer(7, 11), 60 * draw.integer(17, 22)),
+        students=draw.integer(1, 4),
+    )
+    for _ in range(draw.integer(0, 10)):
+        schedule.recurrent.append(
+            (
+                draw.choice((None, *range(schedule.students))),
+                draw.choice(
+                    (
+                        RecurrentEvent.EventTypes.LESSON,
+                        RecurrentEvent.EventTypes.LESSON,
+                        RecurrentEvent.EventTypes.WORK_BREAK,
+                        RecurrentEvent.EventTypes.WEEKEND,
+                    )
+                ),
+                moment((-35, 13)),
+                draw.choice((30, 60, 90, 24 * 60)),
+                draw.choice((1, 7, 7, 14)),
+                draw.choice((None, None, draw.integer(-14, 21))),
+            )
+        )
+    for _ in range(draw.integer(0, 6) if schedule.recurrent else 0):
+        index = draw.integer(0, len(schedule.recurrent) - 1)
+        start = schedule.recurrent[index][2] + timedelta(weeks=draw.integer(0, 5))
+        schedule.cancels.append(
+            (index, start + timedelta(minutes=15 * draw.integer(-2, 2)), draw.choice((30, 60)))
+        )
+    for _ in range(draw.integer(0, 8)):
+        schedule.events.append(
+            (
+                draw.choice((None, *range(schedule.students))),
+                draw.choice(
+                    (
+                        Event.EventTypes.LESSON,
+                        Event.EventTypes.MOVED_LESSON,
+                        Event.EventTypes.WORK_BREAK,
+                        Event.EventTypes.VACATION,
+                    )
+                ),
+                moment((-3, 27)),
+                draw.choice((30, 60, 24 * 60, 3 * 24 * 60)),
+            )
+        )
+    return schedule
+
+
+_engines = {}
+
+
+def connect(url: str):
+    """Engine of `url`, created and tried once."""
+    if url not in _engines:
+        engine = create_engine(url)
+        engine.connect().close()
+        _engines[url] = engine
+    return _engines[url]
+
+
+def load(schedule: Schedule, url: str | None = None) -> tuple[Session, int, list[int]]:
+    """Fresh database with the schedule, its executor and students."""
+    from src.models import (
+        Base,
+        CancelledRecurrentEvent,
+        Event,
+        Executor,
+        RecurrentEvent,
+        User,
+    )
+
+    if url is None:
+        engine = create_engine("sqlite://", poolclass=StaticPool)
+    else:
+        engine = connect(url)
+        Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    db = Session(engine)
+    executor = Executor(code="oracle", telegram_id=1)
+    db.add(executor)
+    db.flush()
+    teacher = User(
+        telegram_id=1, full_name="Teacher", role=User.Roles.TEACHER, executor_id=executor.id
+    )
+    students = [
+        User(telegram_id=100 + i, full_name=f"Student {i}", role=User.Roles.STUDENT,
+             executor_id=executor.id)
+        for i in range(schedule.students)
+    ]
+    db.add_all([teacher, *students])
+    db.flush()
+
+    def owner(student):
+        return teacher.id if student is None else students[student].id
+
+    start_of_day = datetime.combine(MONDAY - timedelta(weeks=8), datetime.min.time())
+    work_start, work_end = (start_of_day + timedelta(minutes=m) for m in schedule.work)
+    db.add_all(
+        [
+            RecurrentEvent(
+                executor_id=executor.id, user_id=teacher.id, interval=1,
+                event_type=RecurrentEvent.EventTypes.WORK_START,
+                start=start_of_day, end=work_start,
+            ),
+            RecurrentEvent(
+                executor_id=executor.id, user_id=teacher.id, interval=1,
+                event_type=RecurrentEvent.EventTypes.WORK_END,
+                start=work_end, end=start_of_day + timedelta(hours=23, minutes=59),
+            ),
+        ]
+    )
+    series = []
+    for student, event_type, start, minutes, interval, ended in schedule.recurrent:
+        series.append(
+            RecurrentEvent(
+                executor_id=executor.id, user_id=owner(student), event_type=event_type,
+                start=start, end=start + timedelta(minutes=minutes), interval=interval,
+                interval_end=None if ended is None else start + timedelta(days=ended),
+            )
+        )
+    db.add_all(series)
+    db.flush()
+    for index, start, minutes in schedule.cancels:
+        db.add(
+            CancelledRecurrentEvent(
+                event_id=series[index].id,
+                break_type=CancelledRecurrentEvent.CancelTypes.LESSON_CANCELED,
+                start=start, end=start + timedelta(minutes=minutes),
+            )
+        )
+    for student, event_type, start, minutes in schedule.events:
+        db.add(
+            Event(
+                executor_id=executor.id, user_id=owner(student), event_type=event_type,
+                start=start, end=start + timedelta(minutes=minutes),
+            )
+        )
+    db.commit()
+    return db, executor.id, [s.id for s in students]
+
+
+class Oracle:
+    def __init__(self, legacy: type, candidate: type, url: str | None = None):
+        self.implementations = {"legacy": legacy, "candidate": candidate}
+        self.url = url
+        # (implementation, method) -> [calls, seconds]
+        self.timings: dict[tuple[str, str], list[float]] = defaultdict(lambda: [0, 0.0])
+        self.examples = 0
+
+    def calls(self, schedule: Schedule, executor_id: int, students: list[int]):
+        yield "recurrent_events_for_day", (executor_id, schedule.day)
+        yield "events_for_day", (executor_id, schedule.day)
+        yield "day_schedule", (executor_id, schedule.day)
+        yield "day_schedule", (executor_id, schedule.day, students[0])
+        yield "available_time", (executor_id, schedule.day)
+        yield "available_weekdays", (executor_id,)
+        yield "available_time_weekday", (executor_id, schedule.weekday)
+
+    def run(self, name: str, repo, method: str, args: tuple):
+        started = time.perf_counter()
+        try:
+            result = getattr(repo, method)(*args)
+        except Exception as e:
+            result = f"raised {e!r}"
+        timing = self.timings[name, method]
+        timing[0] += 1
+        timing[1] += time.perf_counter() - started
+        return result
+
+    def differences(self, schedule: Schedule) -> list[str]:
+        from src import clock
+
+        db, executor_id, students = load(schedule, self.url)
+        problems = []
+        # Whoever goes second finds the pages cached, take turns
+        order = ("legacy", "candidate") if self.examples % 2 else ("candidate", "legacy")
+        self.examples += 1
+        try:
+            with clock.frozen(schedule.now):
+                repos = {name: cls(db) for name, cls in self.implementations.items()}
+                for method, args in self.calls(schedule, executor_id, students):
+                    results = {name: self.run(name, repos[name], method, args) for name in order}
+                    legacy, candidate = results["legacy"], results["candidate"]
+                    if legacy != candidate:
+                        problems.append(
+                            f"{method}{args}:\n  legacy    {legacy}\n  candidate {candidate}"
+                        )
+        finally:
+            db.close()
+        return problems
+
+    def report(self, out=sys.stdout):
+        out.write(f"{'method':<26} {'legacy ms/call':>15} {'candidate ms/call':>18} {'x':>6}\n")
+        for method in METHODS:
+            calls, legacy = self.timings["legacy", method]
+            _, candidate = self.timings["candidate", method]
+            if not calls:
+                continue
+            out.write(
+                f"{method:<26} {legacy / calls * 1000:>15.3f} "
+                f"{candidate / calls * 1000:>18.3f} {legacy / candidate:>6.2f}\n"
+            )
+
+
+def explain(schedule: Schedule, problems: list[str]) -> str:
+    return f"{schedule}\n" + "\n".join(problems)
+
+
+def check_with_hypothesis(oracle: Oracle, examples: int, seed: int):
+    @settings(
+        max_examples=examples,
+        deadline=None,
+        database=None,
+        derandomize=seed is not None,
+        suppress_health_check=list(HealthCheck),
+    )
+    @given(st.data())
+    def check(data):
+        schedule = draw_schedule(HypothesisDraw(data))
+        problems = oracle.differences(schedule)
+        assert not problems, explain(schedule, problems)
+
+    check()
+
+
+def check_randomly(oracle: Oracle, examples: int, seed: int):
+    rng = random.Random(seed)
+    for _ in range(examples):
+        schedule = draw_schedule(RandomDraw(rng))
+        problems = oracle.differences(schedule)
+        if problems:
+            raise AssertionError(explain(schedule, problems))
+
+
+def main():
+    from src.engines import ENGINES
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--engine", choices=sorted(ENGINES), default="indexed")
+    parser.add_argument("--baseline", choices=sorted(ENGINES), default="legacy")
+    parser.add_argument("--examples", type=int, default=200)
+    parser.add_argument("--seed", type=int, help="reproducible examples")
+    parser.add_argument(
+        "--no-hypothesis", action="store_true", help="random schedules, no shrinking"
+    )
+    parser.add_argument("--url", help="database to run on, its tables are dropped")
+    args = parser.parse_args()
+
+    if args.url:
+        # A missing driver or server fails here, not as a counterexample
+        connect(args.url)
+    oracle = Oracle(ENGINES[args.baseline], ENGINES[args.engine], args.url)
+    try:
+        if st is None or args.no_hypothesis:
+            if st is None:
+                print("hypothesis is not installed, counterexamples are not minimized")
+            check_randomly(oracle, args.examples, args.seed)
+        else:
+            check_with_hypothesis(oracle, args.examples, args.seed)
+    except AssertionError as e:
+        print(f"{args.engine} disagrees with {args.baseline}:\n{e}")
+        sys.exit(1)
+    finally:
+        oracle.report()
+    print(f"{args.engine} agrees with {args.baseline} on {args.examples} schedules")
+
+
+if __name__ == "__main__":
+    main()
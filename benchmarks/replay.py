@@ -0,0 +1,219 @@
+"""
+Replays traffic recorded with RECORD_UPDATES (src/recorder.py) against a copy
+of a database anonymized with the same RECORD_SECRET.
+
+Every update is handled with the clock frozen at the moment it was recorded,
+so what the users are sent only depends on the build. `--speed` plays the
+recording that many times faster (0: as fast as possible), `--sequential`
+handles one update after another, the only mode where updates of different
+chats that touch the same schedule always interleave the same way. Prints
+p50/p95/p99 per handler next to the production durations; `--output` also
+keeps a digest of what every chat was sent and `--compare` reports the chats
+that got different replies and how latencies moved against another build.
+
+    PYTHONPATH=.:src python -m benchmarks.replay updates.jsonl db/replay.sqlite \
+        --speed 0 --sequential --output replay.json
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.default import DefaultBotProperties
+from aiogram.types import Update
+
+from benchmarks.load import TOKEN, RecordingSession, git_commit, percentile
+
+
+class HandlerNames(BaseMiddleware):
+    """Remembers which handler took each update."""
+
+    def __init__(self):
+        self.names: dict[int, str] = {}
+
+    async def __call__(self, handler, event, data):
+        callback = data["handler"].callback
+        self.names[data["event_update"].update_id] = (
+            f"{callback.__module__.rsplit('.', 1)[-1]}.{callback.__name__}"
+        )
+        return await handler(event, data)
+
+
+def read_records(path: str) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    for record in records:
+        record["at"] = datetime.fromisoformat(record["at"])
+    return sorted(records, key=lambda r: r["at"])
+
+
+def stats(values: list[float]) -> dict:
+    return {
+        "updates": len(values),
+        **{f"p{p}_ms": round(percentile(values, p), 3) for p in (50, 95, 99)},
+    }
+
+
+async def replay(records: list[dict], speed: float, sequential: bool) -> dict:
+    import src.bot
+    from database import dispose_engine
+    from main import create_dispatcher
+    from src import clock
+    from src.broadcasts import broadcasts, media_groups
+
+    session = RecordingSession()
+    bot = Bot(TOKEN, session=session, default=DefaultBotProperties(parse_mode="HTML"))
+    src.bot._bot = bot
+    dp = create_dispatcher()
+    handlers = HandlerNames()
+    dp.message.middleware(handlers)
+    dp.callback_query.middleware(handlers)
+
+    latencies: dict[int, float] = {}
+    failed = 0
+
+    async def play(record: dict):
+        nonlocal failed
+        update = Update.model_validate(record["update"], context={"bot": bot})
+        started = time.perf_counter()
+        with clock.frozen(record["at"]):
+            try:
+                await dp.feed_update(bot, update)
+            except Exception:
+                failed += 1
+        latencies[update.update_id] = (time.perf_counter() - started) * 1000
+
+    tasks = []
+    first, started = records[0]["at"], time.perf_counter()
+    for record in records:
+        if speed:
+            due = (record["at"] - first).total_seconds() / speed
+            delay = due - (time.perf_counter() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        if sequential:
+            await play(record)
+        else:
+            tasks.append(asyncio.create_task(play(record)))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    replayed, recorded = defaultdict(list), defaultdict(list)
+    for record in records:
+        update_id = record["update"]["update_id"]
+        name = handlers.names.get(update_id, "unhandled")
+        replayed[name].append(latencies[update_id])
+        recorded[name].append(record["duration_ms"])
+    chats = {
+        str(chat_id): hashlib.sha1("\n".join(sent).encode()).hexdigest()[:12]
+        for chat_id, sent in session.transcript.items()
+    }
+
+    for task in [*broadcasts.tasks.values(), *media_groups.tasks]:
+        task.cancel()
+    await asyncio.gather(
+        *broadcasts.tasks.values(), *media_groups.tasks, return_exceptions=True
+    )
+    await dp.storage.close()
+    dispose_engine()
+    return {
+        "commit": git_commit(),
+        "updates": len(records),
+        "failed": failed,
+        "elapsed_s": round(elapsed, 3),
+        "handlers": {
+            name: {
+                **stats(replayed[name]),
+                "recorded_p50_ms": round(statistics.median(recorded[name]), 3),
+            }
+            for name in sorted(replayed)
+        },
+        "replies": hashlib.sha1(
+            json.dumps(chats, sort_keys=True).encode()
+        ).hexdigest()[:12],
+        "chats": chats,
+        "api_calls": dict(session.calls),
+    }
+
+
+def compare(old: dict, new: dict):
+    print(f"\ncompared with {old.get('commit')}:")
+    differ = sorted(
+        chat
+        for chat in old["chats"].keys() | new["chats"].keys()
+        if old["chats"].get(chat) != new["chats"].get(chat)
+    )
+    print(f"replies differ in {len(differ)} of {len(new['chats'])} chats")
+    for chat in differ[:20]:
+        print(f"  chat {chat}")
+    for name, result in new["handlers"].items():
+        before = old["handlers"].get(name)
+        if before is None:
+            continue
+        ratio = result["p50_ms"] / before["p50_ms"] if before["p50_ms"] else 0
+        print(
+            f"{name:<40} p50 {before['p50_ms']:>8.1f} -> {result['p50_ms']:>8.1f} ms"
+            f"  x{ratio:.2f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("recording", help="JSONL written with RECORD_UPDATES")
+    parser.add_argument("database", help="anonymized copy, see src/recorder.py")
+    parser.add_argument("--speed", type=float, default=1.0)
+    parser.add_argument("--sequential", action="store_true")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON results of another build")
+    parser.add_argument("--verbose", action="store_true", help="keep INFO logs")
+    args = parser.parse_args()
+    if os.environ.get("PYTHONHASHSEED") != "0":
+        # Overlap reports iterate sets of strings, their order follows the hash seed
+        os.environ["PYTHONHASHSEED"] = "0"
+        os.execv(sys.executable, [sys.executable, "-m", "benchmarks.replay", *sys.argv[1:]])
+    records = read_records(args.recording)
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = os.path.abspath(args.compare) if args.compare else None
+
+    os.environ["BOT_TOKEN"] = TOKEN
+    # Replays write to the database, they get their own copy
+    workdir = tempfile.mkdtemp()
+    os.makedirs(os.path.join(workdir, "db"))
+    shutil.copy(args.database, os.path.join(workdir, "db", "db.sqlite"))
+    os.chdir(workdir)
+    if not args.verbose:
+        logging.disable(logging.INFO)
+
+    result = asyncio.run(replay(records, args.speed, args.sequential))
+
+    print(
+        f"{result['updates']} updates in {result['elapsed_s']:.2f}s, "
+        f"{result['failed']} failed, replies {result['replies']}"
+    )
+    print(f"{'handler':<40} {'updates':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'prod p50':>9}")
+    for name, s in result["handlers"].items():
+        print(
+            f"{name:<40} {s['updates']:>8} {s['p50_ms']:>7.1f}ms {s['p95_ms']:>7.1f}ms "
+            f"{s['p99_ms']:>7.1f}ms {s['recorded_p50_ms']:>7.1f}ms"
+        )
+    if output:
+        with open(output, "w") as f:
+            json.dump(result, f, indent=2)
+    if baseline:
+        with open(baseline) as f:
+            compare(json.load(f), result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Messages/second of the legacy per-call `ClientSession` against the shared bot.
+
+The fake server speaks plain HTTP on localhost, so the numbers only show the
+connection churn; against api.telegram.org every new connection also pays
+a TLS handshake.
+
+    PYTHONPATH=.:src python benchmarks/send_message.py --messages 2000
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+import aiohttp
+
+from benchmarks.fake_api import FakeTelegramAPI
+
+TOKEN = "42:benchmark"
+
+
+async def legacy_send(base_url: str, telegram_id: int, text: str) -> None:
+    """The pre-pooling implementation: one session (and connection) per message."""
+    url = f"{base_url}/bot{TOKEN}/sendMessage?chat_id={telegram_id}&text={text}&parse_mode=HTML"
+    async with aiohttp.ClientSession() as session, session.get(url) as resp:
+        await resp.text()
+
+
+async def run(name: str, send, messages: int, concurrency: int, api: FakeTelegramAPI):
+    semaphore = asyncio.Semaphore(concurrency)
+    before = api.connections
+
+    async def one(i: int):
+        async with semaphore:
+            await send(1000 + i % 50, f"message {i}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(messages)))
+    elapsed = time.perf_counter() - started
+    print(
+        f"{name:<8} {messages / elapsed:>10.1f} msg/s "
+        f"{elapsed:>7.2f}s {api.connections - before:>6} connections"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--port", type=int, default=8081)
+    args = parser.parse_args()
+
+    api = FakeTelegramAPI(port=args.port)
+    await api.start()
+    os.environ["BOT_TOKEN"] = TOKEN
+    os.environ["TELEGRAM_API_URL"] = api.base_url
+
+    from src.bot import close_bot
+    from src.utils import send_message
+
+    try:
+        await run(
+            "legacy",
+            lambda tg_id, text: legacy_send(api.base_url, tg_id, text),
+            args.messages,
+            args.concurrency,
+            api,
+        )
+        await run("pooled", send_message, args.messages, args.concurrency, api)
+    finally:
+        await close_bot()
+        await api.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
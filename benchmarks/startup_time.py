@@ -0,0 +1,115 @@
+"""
+Startup budget of the bot and scheduler entry points.
+
+Prints the `-X importtime` summary of both entry points and the wall-clock
+from spawning `src/main.py` until it answers a queued update through the fake
+API. Exits with status 1 when a budget is exceeded, so it can guard CI.
+Most of the import time is aiogram.types (pydantic models), the budgets are
+there to catch the bot starting to do work at import time again.
+
+    PYTHONPATH=.:src python benchmarks/startup_time.py --import-budget 5
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.fake_api import FakeTelegramAPI
+
+ROOT = Path(__file__).resolve().parent.parent
+SRC = ROOT / "src"
+TOKEN = "42:benchmark"
+UPDATE = Path(__file__).resolve().parent / "updates" / "cancel.json"
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def environment(**extra: str) -> dict[str, str]:
+    env = dict(os.environ, PYTHONPATH=f"{ROOT}{os.pathsep}{SRC}", **extra)
+    env.setdefault("BOT_TOKEN", TOKEN)
+    return env
+
+
+def import_times(module: str, workdir: str) -> tuple[float, list[tuple[str, float]]]:
+    """Total import seconds of `module` and what its direct imports cost."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=workdir,
+        env=environment(),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    total, packages = 0.0, []
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match is None:
+            continue
+        _self, cumulative, indent, name = match.groups()
+        seconds = int(cumulative) / 1e6
+        if not indent:
+            total += seconds
+        elif len(indent) == 2:
+            packages.append((name, seconds))
+    packages.sort(key=lambda p: p[1], reverse=True)
+    return total, packages
+
+
+async def first_update(workdir: str, port: int, timeout: float) -> float:
+    """Seconds from spawning the bot until its reply to a queued update arrives."""
+    api = FakeTelegramAPI(port=port)
+    await api.start()
+    api.updates.put_nowait(json.loads(UPDATE.read_text()))
+    started = time.perf_counter()
+    process = await asyncio.create_subprocess_exec(
+        sys.executable,
+        str(SRC / "main.py"),
+        cwd=workdir,
+        env=environment(TELEGRAM_API_URL=api.base_url, BOT_MODE="polling"),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        return await asyncio.wait_for(api.wait_for("sendMessage"), timeout) - started
+    finally:
+        process.terminate()
+        await process.wait()
+        await api.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--import-budget", type=float, default=5.0)
+    parser.add_argument("--first-update-budget", type=float, default=8.0)
+    parser.add_argument("--top", type=int, default=8)
+    parser.add_argument("--port", type=int, default=8081)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.makedirs(os.path.join(workdir, "db"))
+    failed = False
+    for module in ("main", "scheduler"):
+        total, packages = import_times(module, workdir)
+        print(f"import {module}: {total:.3f}s")
+        for name, seconds in packages[: args.top]:
+            print(f"    {name:<40} {seconds:.3f}s")
+        if total > args.import_budget:
+            print(f"    over the {args.import_budget}s budget")
+            failed = True
+
+    elapsed = asyncio.run(first_update(workdir, args.port, args.first_update_budget * 5))
+    print(f"first update handled: {elapsed:.3f}s")
+    if elapsed > args.first_update_budget:
+        print(f"    over the {args.first_update_budget}s budget")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,126 @@
+"""
+Update-to-reply latency of webhook delivery against long polling.
+
+A recorded `/cancel` update (no database access in the handler) is delivered
+either by POSTing it to the local webhook, as Telegram would, or by queueing
+it in the fake getUpdates. Latency is measured until the bot's sendMessage
+reaches the fake API.
+
+    PYTHONPATH=.:src python benchmarks/webhook_latency.py --updates 200
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import aiohttp
+from aiohttp import web
+
+from benchmarks.fake_api import FakeTelegramAPI
+
+TOKEN = "42:benchmark"
+SECRET = "benchmark-secret"
+UPDATE = Path(__file__).resolve().parent / "updates" / "cancel.json"
+
+
+def make_update(template: dict, update_id: int) -> dict:
+    update = json.loads(json.dumps(template))
+    update["update_id"] = update_id
+    update["message"]["message_id"] = update_id
+    return update
+
+
+def report(name: str, latencies: list[float]) -> None:
+    ms = sorted(x * 1000 for x in latencies)
+    p95 = ms[int(len(ms) * 0.95) - 1]
+    print(
+        f"{name:<8} p50 {statistics.median(ms):>7.2f} ms  "
+        f"p95 {p95:>7.2f} ms  max {ms[-1]:>7.2f} ms"
+    )
+
+
+async def bench_webhook(
+    dp, bot, api: FakeTelegramAPI, template: dict, count: int, port: int
+):
+    from core.config import WebhookConfig
+    from webhook import create_app
+
+    config = WebhookConfig(url=f"http://127.0.0.1:{port}", secret=SECRET, port=port)
+    runner = web.AppRunner(create_app(dp, bot, config), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    latencies = []
+    try:
+        async with aiohttp.ClientSession() as session:
+            headers = {"X-Telegram-Bot-Api-Secret-Token": SECRET}
+            for i in range(count):
+                started = time.perf_counter()
+                async with session.post(
+                    config.url + config.path,
+                    json=make_update(template, i + 1),
+                    headers=headers,
+                ) as resp:
+                    resp.raise_for_status()
+                latencies.append(await api.wait_for("sendMessage") - started)
+    finally:
+        await runner.cleanup()
+    return latencies
+
+
+async def bench_polling(dp, bot, api: FakeTelegramAPI, template: dict, count: int):
+    polling = asyncio.create_task(
+        dp.start_polling(bot, handle_signals=False, close_bot_session=False)
+    )
+    latencies = []
+    try:
+        await api.wait_for("getUpdates")
+        for i in range(count):
+            started = time.perf_counter()
+            api.updates.put_nowait(make_update(template, 10_000 + i))
+            latencies.append(await api.wait_for("sendMessage") - started)
+    finally:
+        await dp.stop_polling()
+        await polling
+    return latencies
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--updates", type=int, default=100)
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--webhook-port", type=int, default=8082)
+    args = parser.parse_args()
+
+    api = FakeTelegramAPI(port=args.port)
+    await api.start()
+    os.environ["BOT_TOKEN"] = TOKEN
+    os.environ["TELEGRAM_API_URL"] = api.base_url
+    # The dispatcher opens its databases relative to the working directory
+    workdir = tempfile.mkdtemp()
+    os.makedirs(os.path.join(workdir, "db"))
+    os.chdir(workdir)
+
+    from main import create_dispatcher
+    from src.bot import close_bot, get_bot
+
+    template = json.loads(UPDATE.read_text())
+    bot, dp = get_bot(), create_dispatcher()
+    try:
+        webhook = await bench_webhook(
+            dp, bot, api, template, args.updates, args.webhook_port
+        )
+        polling = await bench_polling(dp, bot, api, template, args.updates)
+    finally:
+        await close_bot()
+        await api.stop()
+    report("webhook", webhook)
+    report("polling", polling)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
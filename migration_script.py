@@ -1,6 +1,34 @@
+import argparse
 import sqlite3
+import time
+from collections.abc import Callable
 from datetime import datetime, date, timedelta
 
+# Rows fetched from the source and inserted with one executemany
+BATCH_SIZE = 5000
+# Rows written per transaction, a failed migration keeps the committed ones
+# and a rerun continues after the highest id already in the destination
+TRANSACTION_ROWS = 50_000
+# Checksums add up hash() of the rows: False and 0 hash alike, as SQLite stores
+# them, and it runs in C. String hashes change between processes, a checksum
+# only compares what was written with what was read back in the same run
+CHECKSUM_MODULO = 2**64
+
+# Bulk load: nothing is fsynced and the rollback journal stays in memory.
+# An error rolls the open transaction back and a rerun resumes, a crash of the
+# process or the machine leaves a destination to delete and migrate again
+DEST_PRAGMAS = (
+    "PRAGMA synchronous = OFF",
+    "PRAGMA journal_mode = MEMORY",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -65536",
+    "PRAGMA foreign_keys = OFF",
+)
+
+
+class MigrationError(Exception):
+    pass
+
 
 def find_closest_weekday(weekday: int) -> date:
     jan1 = date(2025, 1, 1)
@@ -9,23 +37,29 @@ def find_closest_weekday(weekday: int) -> date:
 
 
 class DatabaseMigrator:
-    def __init__(self, source_path: str, dest_path: str):
+    def __init__(self, source_path: str, dest_path: str, batch_size: int = BATCH_SIZE):
         """Initialize migrator with source and destination DB paths"""
         self.source_path = source_path
         self.dest_path = dest_path
+        self.batch_size = batch_size
 
         # Will be initialized in connect()
         self.source_conn = None
         self.dest_conn = None
         self.source_cur = None
         self.dest_cur = None
+        # table -> rows migrated and verified, seconds it took
+        self.report: dict[str, dict] = {}
 
     def connect(self):
         """Establish connections to both databases"""
-        self.source_conn = sqlite3.connect(self.source_path)
-        self.dest_conn = sqlite3.connect(self.dest_path)
+        self.source_conn = sqlite3.connect(f"file:{self.source_path}?mode=ro", uri=True)
+        # Transactions are opened and committed explicitly, per batch
+        self.dest_conn = sqlite3.connect(self.dest_path, isolation_level=None)
         self.source_cur = self.source_conn.cursor()
         self.dest_cur = self.dest_conn.cursor()
+        for pragma in DEST_PRAGMAS:
+            self.dest_cur.execute(pragma)
 
     def disconnect(self):
         """Close database connections"""
@@ -49,15 +83,88 @@ class DatabaseMigrator:
         # Build CREATE TABLE statement
         columns_def = []
         for name, type_def in dest_columns.items():
-            columns_def.append(f"{name} {type_def}")
+            columns_def.append(f'"{name}" {type_def}')
+        if primary_key:
+            columns_def.append(f'PRIMARY KEY ("{primary_key}")')
+        # A destination created by the bot (alembic) keeps its own definition
+        self.dest_cur.execute(f"CREATE TABLE IF NOT EXISTS {table_name} ({', '.join(columns_def)})")
 
         # Prepare parameterized insert statement
-        column_names = list(dest_columns.keys())
+        column_names = [f'"{name}"' for name in dest_columns]
         placeholders = ", ".join(["?"] * len(column_names))
         insert_sql = f"INSERT INTO {table_name} ({', '.join(column_names)}) VALUES ({placeholders})"
 
         return insert_sql
 
+    def _table_state(self, table_name: str, dest_columns: dict[str, str]) -> tuple[int, int]:
+        """Row count and order independent checksum of the destination table."""
+        columns = ", ".join(f'"{name}"' for name in dest_columns)
+        rows = checksum = 0
+        cursor = self.dest_conn.execute(f"SELECT {columns} FROM {table_name}")
+        while batch := cursor.fetchmany(self.batch_size):
+            rows += len(batch)
+            checksum = (checksum + sum(map(hash, batch))) % CHECKSUM_MODULO
+        return rows, checksum
+
+    def _migrate_table(
+        self,
+        table_name: str,
+        dest_columns: dict[str, str],
+        source_query: str,
+        transform: Callable[[tuple], tuple],
+        primary_key: str = None,
+    ):
+        """
+        Stream `source_query` into `table_name` in batches and verify the result.
+
+        The source rows are read in `id` order and only past the highest `id`
+        already in the destination, so a migration that failed halfway is
+        resumed by running it again. Rows of the earlier run are not verified
+        again, their checksums can't be compared across processes.
+        """
+        insert_sql = self._prepare_table_migration(table_name, dest_columns, primary_key)
+        resume_after = self.dest_conn.execute(
+            f"SELECT COALESCE(MAX(id), -1) FROM {table_name}"
+        ).fetchone()[0]
+        source_query = f"SELECT * FROM ({source_query}) WHERE id > ? ORDER BY id"
+        total = self.source_conn.execute(
+            f"SELECT COUNT(*) FROM ({source_query})", (resume_after,)
+        ).fetchone()[0]
+        if resume_after >= 0:
+            print(f"{table_name}: resuming after id {resume_after}")
+        rows_before, checksum_before = self._table_state(table_name, dest_columns)
+
+        started = time.perf_counter()
+        migrated = expected_checksum = in_transaction = 0
+        self.source_cur.execute(source_query, (resume_after,))
+        self.dest_cur.execute("BEGIN")
+        while batch := self.source_cur.fetchmany(self.batch_size):
+            rows = [transform(row) for row in batch]
+            self.dest_cur.executemany(insert_sql, rows)
+            expected_checksum = (expected_checksum + sum(map(hash, rows))) % CHECKSUM_MODULO
+            migrated += len(rows)
+            in_transaction += len(rows)
+            if in_transaction >= TRANSACTION_ROWS:
+                self.dest_cur.execute("COMMIT")
+                self.dest_cur.execute("BEGIN")
+                in_transaction = 0
+            print(f"\r{table_name}: {migrated}/{total} rows", end="", flush=True)
+        self.dest_cur.execute("COMMIT")
+        elapsed = time.perf_counter() - started
+        print(f"\r{table_name}: {migrated}/{total} rows in {elapsed:.2f}s")
+
+        rows_after, checksum_after = self._table_state(table_name, dest_columns)
+        checksum = (checksum_after - checksum_before) % CHECKSUM_MODULO
+        if migrated != total or rows_after - rows_before != total:
+            raise MigrationError(
+                f"{table_name}: {total} source rows, {rows_after - rows_before} written"
+            )
+        if checksum != expected_checksum:
+            raise MigrationError(
+                f"{table_name}: checksum {checksum:016x}, expected {expected_checksum:016x}"
+            )
+        self.report[table_name] = {"rows": total, "seconds": round(elapsed, 3)}
+
     def migrate_users(self):
         dest_schema = {
             "telegram_id": "INTEGER UNIQUE",
@@ -67,11 +174,10 @@ class DatabaseMigrator:
             "executor_id": "INTEGER references executors",
             "id": "INTEGER NOT NULL",
         }
-        insert_sql = self._prepare_table_migration(table_name="users", dest_columns=dest_schema, primary_key="id")
 
-        self.source_cur.execute("SELECT id, telegram_id, name, teacher_id, telegram_username FROM user_account")
-        for id, telegram_id, name, teacher_id, telegram_username in self.source_cur.fetchall():
-            transformed_row = (
+        def transform(row):
+            id, telegram_id, name, teacher_id, telegram_username = row
+            return (
                 telegram_id,
                 telegram_username,
                 name,
@@ -79,7 +185,14 @@ class DatabaseMigrator:
                 teacher_id,
                 id,
             )
-            self.dest_cur.execute(insert_sql, transformed_row)
+
+        self._migrate_table(
+            "users",
+            dest_schema,
+            "SELECT id, telegram_id, name, teacher_id, telegram_username FROM user_account",
+            transform,
+            primary_key="id",
+        )
 
     def migrate_lessons(self):
         """Migrate lessons table - implement your logic here"""
@@ -94,11 +207,10 @@ class DatabaseMigrator:
             "end": "DATETIME",
             "id": "INTEGER NOT NULL",
         }
-        insert_sql = self._prepare_table_migration(table_name="events", dest_columns=dest_schema, primary_key="id")
 
-        self.source_cur.execute("SELECT id, user_id, date, end_time, status, start_time FROM lesson")
-        for id, user_id, date, end_time, status, start_time in self.source_cur.fetchall():
-            transformed_row = (
+        def transform_lesson(row):
+            id, user_id, date, end_time, status, start_time = row
+            return (
                 False,
                 None,
                 False,
@@ -109,7 +221,14 @@ class DatabaseMigrator:
                 date + " " + end_time,
                 id,
             )
-            self.dest_cur.execute(insert_sql, transformed_row)
+
+        self._migrate_table(
+            "events",
+            dest_schema,
+            "SELECT id, user_id, date, end_time, status, start_time FROM lesson",
+            transform_lesson,
+            primary_key="id",
+        )
 
         # scheduled lessons
         dest_schema = {
@@ -122,12 +241,11 @@ class DatabaseMigrator:
             "end": "DATETIME",
             "id": "INTEGER NOT NULL",
         }
-        insert_sql = self._prepare_table_migration(table_name="recurrent_events", dest_columns=dest_schema, primary_key="id")
 
-        self.source_cur.execute("SELECT id, user_id, weekday, start_time, end_time FROM scheduled_lesson")
-        for id, user_id, weekday, start_time, end_time in self.source_cur.fetchall():
+        def transform_scheduled(row):
+            id, user_id, weekday, start_time, end_time = row
             weekday_date = find_closest_weekday(weekday)
-            transformed_row = (
+            return (
                 7,
                 None,
                 user_id,
@@ -137,7 +255,14 @@ class DatabaseMigrator:
                 str(weekday_date) + " " + end_time,
                 id,
             )
-            self.dest_cur.execute(insert_sql, transformed_row)
+
+        self._migrate_table(
+            "recurrent_events",
+            dest_schema,
+            "SELECT id, user_id, weekday, start_time, end_time FROM scheduled_lesson",
+            transform_scheduled,
+            primary_key="id",
+        )
 
     def migrate_all(self):
         """Execute all migrations in proper order"""
@@ -147,25 +272,29 @@ class DatabaseMigrator:
             # Execute migrations in logical order
             self.migrate_users()
             self.migrate_lessons()
-            self.dest_conn.commit()
 
             print("Migration completed successfully!")
+            for table, result in self.report.items():
+                print(f"{table:<18} {result['rows']:>9} rows {result['seconds']:>8.2f}s, counts and checksums match")
         except Exception as e:
-            print(f"Migration failed: {e!s}")
-            if self.dest_conn:
+            print(f"\nMigration failed: {e!s}")
+            if self.dest_conn and self.dest_conn.in_transaction:
                 self.dest_conn.rollback()
             raise e
         finally:
             self.disconnect()
 
-def migrate_db(source_path: str, dest_path: str):
+def migrate_db(source_path: str, dest_path: str, batch_size: int = BATCH_SIZE):
     """Main migration function"""
-    migrator = DatabaseMigrator(source_path, dest_path)
+    migrator = DatabaseMigrator(source_path, dest_path, batch_size)
     migrator.migrate_all()
+    return migrator.report
 
 if __name__ == "__main__":
-    # Example usage
-    source_db = "prod2.sqlite"
-    dest_db = "new_database.sqlite"
+    parser = argparse.ArgumentParser(description="Migrate the legacy database.")
+    parser.add_argument("source", nargs="?", default="prod2.sqlite")
+    parser.add_argument("dest", nargs="?", default="new_database.sqlite")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
 
-    migrate_db(source_db, dest_db)
+    migrate_db(args.source, args.dest, args.batch_size)
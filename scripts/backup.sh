@@ -2,15 +2,11 @@
 
 set -e
 
-BACKUP_DIR="backups"
-DB_FILE="db/db.sqlite"
+cd "$(dirname "$0")/.."
 
-mkdir -p $BACKUP_DIR
+# Online backup through SQLite, safe while the bot and the scheduler write.
+# Compressed, stored as a delta when possible and verified, see src/backup.py
+python3 src/backup.py create
 
-TIMESTAMP=$(date +"%Y-%m-%d_%H-%M-%S")
-
-cp $DB_FILE $BACKUP_DIR/"${TIMESTAMP}"_db.sqlite
-
-echo "Backup created: ${TIMESTAMP}_db.sqlite"
-
-find backups -type f -mtime +30 -delete
+# Plain copies made by earlier versions of this script
+find backups -name "*_db.sqlite" -type f -mtime +30 -delete
@@ -0,0 +1,69 @@
+import asyncio
+import time
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+from core import logs
+from logger import logger
+from middlewares import UpdateTrackerMiddleware
+
+# getUpdates returns at most 100 updates
+BATCH_SIZE = 100
+
+
+def tap_key(update: Update):
+    """Same button of the same message pressed by the same user."""
+    query = update.callback_query
+    if query is None:
+        return None
+    message_id = query.message.message_id if query.message else query.inline_message_id
+    return query.from_user.id, message_id, query.data
+
+
+async def catch_up(bot: Bot, dp: Dispatcher, tracker: UpdateTrackerMiddleware):
+    """
+    Handle the updates that arrived while the bot was down, before polling starts.
+
+    The backlog is read a batch at a time, reading the next batch confirms the
+    previous one, so a crash in the middle loses nothing: the handled updates of
+    an unconfirmed batch come again and the tracker skips them. A batch is fed
+    to the dispatcher at once: chats run in parallel, each chat keeps its order.
+    Repeated taps on one button are handled once.
+    """
+    logger.info(logs.CATCH_UP_START)
+    started = time.monotonic()
+    # Telegram keeps every unconfirmed update, without an offset the first batch
+    # starts at the oldest one. An offset from the saved update_id would confirm
+    # the whole backlog unread once Telegram has restarted its ids lower
+    offset = None
+    allowed_updates = dp.resolve_used_update_types()
+    taps = set()
+    handled = skipped = 0
+    while True:
+        batch = await bot.get_updates(
+            offset=offset, limit=BATCH_SIZE, timeout=0, allowed_updates=allowed_updates
+        )
+        if not batch:
+            break
+        updates = []
+        for update in batch:
+            key = tap_key(update)
+            if key is not None and key in taps:
+                skipped += 1
+                continue
+            if key is not None:
+                taps.add(key)
+            updates.append(update)
+
+        results = await asyncio.gather(
+            *(dp.feed_update(bot, u) for u in updates), return_exceptions=True
+        )
+        for update, result in zip(updates, results):
+            if isinstance(result, Exception):
+                logger.error(f"Update {update.update_id} failed: {result!r}")
+        offset = batch[-1].update_id + 1
+        tracker.mark_handled(bot.id, batch[-1].update_id)
+        handled += len(updates)
+        logger.info(logs.CATCH_UP_PROGRESS, handled, skipped)
+    logger.info(logs.CATCH_UP_DONE, time.monotonic() - started, handled, skipped)
@@ -0,0 +1,300 @@
+"""
+Online, compressed and verified backups of the bot database.
+
+A snapshot is taken with SQLite's backup API a few pages at a time, so the bot
+and the scheduler keep writing while it runs. The first backup of a chain
+stores the whole database, later ones only the pages that changed since the
+previous backup, until the chain is BACKUP_FULL_DAYS old. Files are compressed
+with zstd when `zstandard` is installed and with gzip otherwise. Every new file
+is checked by restoring its chain into a scratch database, comparing checksums
+and running `PRAGMA integrity_check` before it is moved into place. Chains
+older than BACKUP_KEEP_DAYS are deleted. Backups are named after the UTC
+moment they were taken, by the scheduler job and by hand alike.
+
+The scheduler runs it as a job, by hand (the standard library and
+src/logger.py, runs outside the containers too):
+
+    python3 src/backup.py create
+    python3 src/backup.py list
+    python3 src/backup.py restore db/restored.sqlite --at 2025-01-06_03-00-00
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+
+from logger import logger
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DB_FILE = "db/db.sqlite"
+BACKUP_DIR = os.environ.get("BACKUP_DIR", "backups")
+BACKUP_KEEP_DAYS = int(os.environ.get("BACKUP_KEEP_DAYS", 30))
+BACKUP_FULL_DAYS = int(os.environ.get("BACKUP_FULL_DAYS", 7))
+# Pages copied per step of the backup API, writers get the database in between
+BACKUP_STEP_PAGES = 256
+BACKUP_STEP_SLEEP = 0.005
+NAME_FORMAT = "%Y-%m-%d_%H-%M-%S"
+EXTENSIONS = (".zst", ".gz")
+
+
+class BackupError(Exception):
+    pass
+
+
+def _open(path: Path, mode: str):
+    if path.suffix == ".zst":
+        if zstandard is None:
+            raise BackupError(f"{path.name} needs the zstandard package")
+        return zstandard.open(path, mode)
+    return gzip.open(path, mode, compresslevel=6)
+
+
+def _digest(path: Path) -> str:
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def _page_size(path: Path) -> int:
+    with sqlite3.connect(path) as db:
+        return db.execute("PRAGMA page_size").fetchone()[0]
+
+
+def utc_now() -> datetime:
+    """Naive UTC, the clock of backup names wherever they are made."""
+    return datetime.now(UTC).replace(tzinfo=None)
+
+
+def _timestamp(path: Path) -> datetime:
+    return datetime.strptime(path.name.split("_full")[0].split("_delta")[0], NAME_FORMAT)
+
+
+def snapshot(source: str, target: Path):
+    """Consistent copy of a live database through the online backup API."""
+    src = sqlite3.connect(f"file:{source}?mode=ro", uri=True)
+    dst = sqlite3.connect(target)
+    try:
+        src.backup(dst, pages=BACKUP_STEP_PAGES, sleep=BACKUP_STEP_SLEEP)
+    finally:
+        dst.close()
+        src.close()
+
+
+def check_integrity(path: Path):
+    with sqlite3.connect(path) as db:
+        result = db.execute("PRAGMA integrity_check").fetchall()
+    if result != [("ok",)]:
+        raise BackupError(f"integrity_check of {path}: {result[:5]}")
+
+
+def _read_header(f) -> dict:
+    return json.loads(f.readline())
+
+
+def write_full(database: Path, target: Path) -> dict:
+    page_size = _page_size(database)
+    header = {
+        "kind": "full",
+        "page_size": page_size,
+        "pages": database.stat().st_size // page_size,
+        "sha256": _digest(database),
+    }
+    with open(database, "rb") as src, _open(target, "wb") as out:
+        out.write(json.dumps(header).encode() + b"\n")
+        for block in iter(lambda: src.read(1 << 20), b""):
+            out.write(block)
+    return header
+
+
+def write_delta(base: Path, database: Path, target: Path) -> dict:
+    """Pages of `database` that differ from `base`, with the page number of each."""
+    page_size = _page_size(database)
+    header = {
+        "kind": "delta",
+        "page_size": page_size,
+        "pages": database.stat().st_size // page_size,
+        "base": _digest(base),
+        "sha256": _digest(database),
+        "changed": 0,
+    }
+    changed = []
+    with open(base, "rb") as old, open(database, "rb") as new:
+        for number in range(header["pages"]):
+            page = new.read(page_size)
+            if old.read(page_size) != page:
+                changed.append(number)
+    header["changed"] = len(changed)
+    with open(database, "rb") as new, _open(target, "wb") as out:
+        out.write(json.dumps(header).encode() + b"\n")
+        for number in changed:
+            new.seek(number * page_size)
+            out.write(number.to_bytes(4, "big") + new.read(page_size))
+    return header
+
+
+def apply(path: Path, target: Path) -> dict:
+    """Restore a full backup into `target` or apply a delta on top of it."""
+    with _open(path, "rb") as f:
+        header = _read_header(f)
+        if header["kind"] == "full":
+            with open(target, "wb") as out:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    out.write(block)
+        else:
+            if _digest(target) != header["base"]:
+                raise BackupError(f"{path.name} does not follow the previous backup")
+            size = header["page_size"]
+            with open(target, "r+b") as out:
+                for _ in range(header["changed"]):
+                    number = int.from_bytes(f.read(4), "big")
+                    out.seek(number * size)
+                    out.write(f.read(size))
+                out.truncate(header["pages"] * size)
+    if _digest(target) != header["sha256"]:
+        raise BackupError(f"{path.name} restores to a different database")
+    return header
+
+
+def backups(directory: str = BACKUP_DIR) -> list[Path]:
+    root = Path(directory)
+    if not root.is_dir():
+        return []
+    return sorted(
+        p for p in root.iterdir()
+        if p.suffix in EXTENSIONS and ("_full." in p.name or "_delta." in p.name)
+    )
+
+
+def chains(directory: str = BACKUP_DIR) -> list[list[Path]]:
+    """Backups grouped by the full one they start from, oldest first."""
+    result = []
+    for path in backups(directory):
+        if "_full." in path.name or not result:
+            result.append([])
+        result[-1].append(path)
+    return result
+
+
+def restore(target: str, directory: str = BACKUP_DIR, at: datetime | None = None) -> Path:
+    """Database as of the last backup not later than `at`, verified."""
+    candidates = [
+        chain[: i + 1]
+        for chain in chains(directory)
+        if "_full." in chain[0].name
+        for i, path in enumerate(chain)
+        if at is None or _timestamp(path) <= at
+    ]
+    if not candidates:
+        raise BackupError(f"No backups in {directory}")
+    chain = candidates[-1]
+    for path in chain:
+        apply(path, Path(target))
+    check_integrity(Path(target))
+    return chain[-1]
+
+
+def prune(directory: str = BACKUP_DIR, now: datetime | None = None):
+    """Delete the chains whose newest backup is older than BACKUP_KEEP_DAYS."""
+    limit = (now or utc_now()) - timedelta(days=BACKUP_KEEP_DAYS)
+    for chain in chains(directory)[:-1]:
+        if _timestamp(chain[-1]) < limit:
+            for path in chain:
+                path.unlink()
+            logger.info(f"Deleted backups {chain[0].name} .. {chain[-1].name}")
+
+
+def create_backup(
+    source: str = DB_FILE, directory: str = BACKUP_DIR, now: datetime | None = None
+) -> Path:
+    """Snapshot `source`, store it as a full backup or a delta and verify it."""
+    if not os.path.exists(source):
+        raise BackupError(f"{source} does not exist")
+    now = now or utc_now()
+    root = Path(directory)
+    root.mkdir(parents=True, exist_ok=True)
+    extension = ".zst" if zstandard is not None else ".gz"
+    existing = chains(directory)
+    chain = existing[-1] if existing else []
+    # Chains are read in name order, a clock set back must not reorder them
+    if chain and now <= _timestamp(chain[-1]):
+        logger.warning(f"{chain[-1].name} is newer than {now}, naming the backup after it")
+        now = _timestamp(chain[-1]) + timedelta(seconds=1)
+    full = (
+        not chain
+        or "_full." not in chain[0].name
+        or now - _timestamp(chain[0]) >= timedelta(days=BACKUP_FULL_DAYS)
+        or (chain[0].suffix == ".zst" and zstandard is None)
+    )
+    # Scratch files next to the backups, /tmp may be a small tmpfs
+    with tempfile.TemporaryDirectory(dir=root, prefix=".backup-") as scratch:
+        current, restored = Path(scratch, "current.sqlite"), Path(scratch, "restored.sqlite")
+        snapshot(source, current)
+        if not full:
+            try:
+                for path in chain:
+                    apply(path, restored)
+            except BackupError:
+                logger.exception(f"Could not restore {chain[-1].name}, starting a new chain")
+                full = True
+            else:
+                full = _page_size(restored) != _page_size(current)
+        kind = "full" if full else "delta"
+        target = root / f"{now.strftime(NAME_FORMAT)}_{kind}.sqlite{extension}"
+        written = Path(scratch, target.name)
+        if full:
+            header = write_full(current, written)
+        else:
+            header = write_delta(restored, current, written)
+        # Verify what was written, not what was meant to be
+        apply(written, restored)
+        check_integrity(restored)
+        os.replace(written, target)
+    logger.info(
+        f"Backup {target.name}: {target.stat().st_size} bytes, "
+        f"{header.get('changed', header['pages'])} of {header['pages']} pages"
+    )
+    prune(directory, now)
+    return target
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backups of the bot database.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    create = commands.add_parser("create", help="back up the database now")
+    create.add_argument("--source", default=DB_FILE)
+    commands.add_parser("list", help="backups by chain")
+    restore_parser = commands.add_parser("restore", help="restore into a new file")
+    restore_parser.add_argument("target")
+    restore_parser.add_argument(
+        "--at", help=f"latest backup not after, {NAME_FORMAT} in UTC"
+    )
+    parser.add_argument("--dir", default=BACKUP_DIR)
+    args = parser.parse_args()
+
+    if args.command == "create":
+        print(create_backup(args.source, args.dir))
+    elif args.command == "list":
+        for chain in chains(args.dir):
+            size = sum(p.stat().st_size for p in chain)
+            print(f"{chain[0].name}  +{len(chain) - 1} deltas  {size} bytes")
+    else:
+        if os.path.exists(args.target):
+            parser.error(f"{args.target} exists, restore into a new file")
+        at = datetime.strptime(args.at, NAME_FORMAT) if args.at else None
+        print(f"{args.target} restored from {restore(args.target, args.dir, at).name}")
+
+
+if __name__ == "__main__":
+    main()
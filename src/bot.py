@@ -0,0 +1,37 @@
+import os
+
+from aiogram import Bot
+from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import PRODUCTION, TelegramAPIServer
+
+from src.core.base import getenv
+from src.core.config import HTTP_POOL_SIZE
+from src.metrics import RequestMetricsMiddleware
+from src.tracing import RequestTracingMiddleware
+
+_bot: Bot | None = None
+
+
+def get_bot() -> Bot:
+    """Process-wide bot, every outbound Telegram call goes through its pooled session."""
+    global _bot
+    if _bot is None:
+        api_url = os.environ.get("TELEGRAM_API_URL")
+        api = TelegramAPIServer.from_base(api_url) if api_url else PRODUCTION
+        _bot = Bot(
+            token=getenv("BOT_TOKEN"),
+            session=AiohttpSession(api=api, limit=HTTP_POOL_SIZE),
+            default=DefaultBotProperties(parse_mode="HTML"),
+        )
+        _bot.session.middleware(RequestMetricsMiddleware())
+        _bot.session.middleware(RequestTracingMiddleware())
+    return _bot
+
+
+async def close_bot() -> None:
+    """Close the pooled session on shutdown."""
+    global _bot
+    if _bot is not None:
+        await _bot.session.close()
+        _bot = None
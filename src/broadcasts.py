@@ -0,0 +1,300 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+
+from aiogram.exceptions import (
+    TelegramAPIError,
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramRetryAfter,
+)
+from aiogram.types import ContentType, Message
+from sqlalchemy.orm import Session
+
+from logger import logger
+from src.bot import get_bot
+from src.core import logs
+from src.core.config import (
+    BROADCAST_ATTEMPTS,
+    BROADCAST_CONCURRENCY,
+    BROADCAST_PROGRESS_INTERVAL,
+    BROADCAST_RATE,
+    MEDIA_GROUP_DELAY,
+    MEDIA_GROUP_MAX_GROUPS,
+    MEDIA_GROUP_MAX_ITEMS,
+)
+from src.messages import replies
+from src.models import Broadcast, BroadcastRecipient, User
+from src.shards import engine_for, shard_engines
+
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second with bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+COPYABLE_TYPES = (
+    ContentType.TEXT,
+    ContentType.PHOTO,
+    ContentType.VIDEO,
+    ContentType.DOCUMENT,
+    ContentType.AUDIO,
+    ContentType.VOICE,
+    ContentType.ANIMATION,
+    ContentType.VIDEO_NOTE,
+    ContentType.STICKER,
+)
+
+
+def payload_from_messages(messages: list[Message]):
+    """Reference the teacher's message (or album) so a broadcast survives a restart."""
+    if any(m.content_type not in COPYABLE_TYPES for m in messages):
+        return None
+    return {
+        "from_chat_id": messages[0].chat.id,
+        "message_ids": sorted(m.message_id for m in messages),
+    }
+
+
+async def deliver(telegram_id: int, payload: dict):
+    """Copy the original messages, an album is a single copyMessages call."""
+    bot = get_bot()
+    if len(payload["message_ids"]) == 1:
+        await bot.copy_message(
+            telegram_id, payload["from_chat_id"], payload["message_ids"][0]
+        )
+    else:
+        await bot.copy_messages(
+            telegram_id, payload["from_chat_id"], payload["message_ids"]
+        )
+
+
+class MediaGroupAggregator:
+    """
+    Collects the parts of an album, Telegram sends each one as a separate update.
+
+    Every group has one timer that is pushed back by each new part and flushes the
+    group after `delay` seconds of silence, so a group whose last part never
+    arrives is still flushed. At most `max_groups` groups are kept, the oldest
+    one is flushed early when a new group does not fit.
+    """
+
+    def __init__(
+        self,
+        delay: float = MEDIA_GROUP_DELAY,
+        max_groups: int = MEDIA_GROUP_MAX_GROUPS,
+        max_items: int = MEDIA_GROUP_MAX_ITEMS,
+    ):
+        self.delay = delay
+        self.max_groups = max_groups
+        self.max_items = max_items
+        self.groups: OrderedDict[str, list[Message]] = OrderedDict()
+        self.callbacks: dict[str, Callable[[list[Message]], Awaitable]] = {}
+        self.timers: dict[str, asyncio.TimerHandle] = {}
+        self.tasks: set[asyncio.Task] = set()
+
+    def add(
+        self, message: Message, on_flush: Callable[[list[Message]], Awaitable]
+    ):
+        group_id = message.media_group_id
+        if group_id not in self.groups:
+            if len(self.groups) >= self.max_groups:
+                self.flush(next(iter(self.groups)))
+            self.groups[group_id] = []
+            self.callbacks[group_id] = on_flush
+        group = self.groups[group_id]
+        if len(group) < self.max_items:
+            group.append(message)
+
+        if group_id in self.timers:
+            self.timers[group_id].cancel()
+        loop = asyncio.get_running_loop()
+        self.timers[group_id] = loop.call_later(self.delay, self.flush, group_id)
+
+    def flush(self, group_id: str):
+        messages = self.groups.pop(group_id, None)
+        on_flush = self.callbacks.pop(group_id, None)
+        timer = self.timers.pop(group_id, None)
+        if timer is not None:
+            timer.cancel()
+        if not messages:
+            return
+        messages.sort(key=lambda m: m.message_id)
+        task = asyncio.create_task(on_flush(messages))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+
+class BroadcastEngine:
+    """Sends broadcasts in the background, recipient state lives in the database."""
+
+    def __init__(
+        self, rate: float = BROADCAST_RATE, concurrency: int = BROADCAST_CONCURRENCY
+    ):
+        self.limiter = TokenBucket(rate)
+        self.concurrency = concurrency
+        self.tasks: dict[int, asyncio.Task] = {}
+        # Recipients of running broadcasts that were not handled yet
+        self.pending: dict[int, int] = {}
+
+    def create(
+        self,
+        db: Session,
+        teacher: User,
+        payload: dict,
+        students: list[User],
+        status_message: Message,
+    ):
+        broadcast = Broadcast(
+            executor_id=teacher.executor_id,
+            author=teacher.username if teacher.username else teacher.full_name,
+            payload=json.dumps(payload, ensure_ascii=False),
+            status_chat_id=status_message.chat.id,
+            status_message_id=status_message.message_id,
+        )
+        broadcast.recipients = [
+            BroadcastRecipient(
+                telegram_id=s.telegram_id,
+                username=s.username if s.username else s.full_name,
+            )
+            for s in students
+        ]
+        db.add(broadcast)
+        db.commit()
+        return broadcast
+
+    def start(self, broadcast_id: int, executor_id: int | None = None):
+        if broadcast_id in self.tasks:
+            return self.tasks[broadcast_id]
+        task = asyncio.create_task(self.run(broadcast_id, executor_id))
+        self.tasks[broadcast_id] = task
+        task.add_done_callback(lambda _: self.tasks.pop(broadcast_id, None))
+        return task
+
+    def resume(self):
+        """Restart broadcasts interrupted by a shutdown."""
+        unfinished = []
+        for engine in shard_engines():
+            with Session(engine) as db:
+                unfinished += db.query(Broadcast.id, Broadcast.executor_id).filter(
+                    Broadcast.finished.is_(False)
+                )
+        if unfinished:
+            logger.info(logs.BROADCAST_RESUME, len(unfinished))
+        for broadcast_id, executor_id in unfinished:
+            self.start(broadcast_id, executor_id)
+
+    async def run(self, broadcast_id: int, executor_id: int | None = None):
+        with Session(engine_for(executor_id), expire_on_commit=False) as db:
+            broadcast = db.get(Broadcast, broadcast_id)
+            payload = json.loads(broadcast.payload)
+            pending = [
+                r
+                for r in broadcast.recipients
+                if r.status == BroadcastRecipient.Statuses.PENDING
+            ]
+            logger.info(logs.BROADCAST_START, broadcast_id, len(pending))
+            self.pending[broadcast_id] = len(pending)
+            semaphore = asyncio.Semaphore(self.concurrency)
+            last_progress = time.monotonic()
+
+            async def send_one(recipient: BroadcastRecipient):
+                nonlocal last_progress
+                async with semaphore:
+                    await self.send(recipient, payload)
+                db.commit()
+                self.pending[broadcast_id] -= 1
+                if (
+                    time.monotonic() - last_progress
+                    >= BROADCAST_PROGRESS_INTERVAL.total_seconds()
+                ):
+                    last_progress = time.monotonic()
+                    await self.report(broadcast)
+
+            try:
+                await asyncio.gather(*(send_one(r) for r in pending))
+            finally:
+                self.pending.pop(broadcast_id, None)
+            broadcast.finished = True
+            db.commit()
+            await self.report(broadcast)
+            sent, failed = self.counts(broadcast)
+            logger.info(logs.BROADCAST_DONE, broadcast_id, sent, len(failed))
+
+    async def send(self, recipient: BroadcastRecipient, payload: dict):
+        while recipient.attempts < BROADCAST_ATTEMPTS:
+            await self.limiter.acquire()
+            recipient.attempts += 1
+            try:
+                await deliver(recipient.telegram_id, payload)
+            except TelegramRetryAfter as e:
+                recipient.attempts -= 1
+                await asyncio.sleep(e.retry_after)
+                continue
+            except (TelegramForbiddenError, TelegramBadRequest) as e:
+                # Blocked the bot or chat not found, retrying will not help
+                recipient.error = str(e)
+                break
+            except (TelegramAPIError, OSError, asyncio.TimeoutError) as e:
+                recipient.error = str(e)
+                await asyncio.sleep(recipient.attempts)
+                continue
+            recipient.status = BroadcastRecipient.Statuses.SENT
+            recipient.error = None
+            return
+        recipient.status = BroadcastRecipient.Statuses.FAILED
+        logger.warning(
+            f"Failed to send broadcast to {recipient.username}: {recipient.error}"
+        )
+
+    @staticmethod
+    def counts(broadcast: Broadcast):
+        sent, failed = 0, []
+        for r in broadcast.recipients:
+            if r.status == BroadcastRecipient.Statuses.SENT:
+                sent += 1
+            elif r.status == BroadcastRecipient.Statuses.FAILED:
+                failed.append(r.username)
+        return sent, failed
+
+    async def report(self, broadcast: Broadcast):
+        """Edit the single status message the teacher got when the broadcast started."""
+        sent, failed = self.counts(broadcast)
+        if broadcast.finished:
+            text = replies.BROADCAST_DONE % sent
+            if failed:
+                text += "\n" + replies.BROADCAST_ERRORS % ", ".join(failed)
+        else:
+            text = replies.BROADCAST_PROGRESS % (sent, len(broadcast.recipients))
+        await self.limiter.acquire()
+        try:
+            await get_bot().edit_message_text(
+                text,
+                chat_id=broadcast.status_chat_id,
+                message_id=broadcast.status_message_id,
+            )
+        except TelegramAPIError as e:
+            logger.warning(f"Could not update broadcast {broadcast.id} status: {e}")
+
+
+broadcasts = BroadcastEngine()
+media_groups = MediaGroupAggregator()
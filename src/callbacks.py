@@ -0,0 +1,125 @@
+"""
+Compact callback data and dispatch on it.
+
+A callback path such as `move_lesson/recur/new/choose_time/` is sent as `~`,
+a 4 character code and the argument: 10 bytes for a time instead of 39 out
+of Telegram's 64. Codes are hashes of the paths, they stay the same across
+deploys and buttons sent by an older version keep working; buttons with the
+full path are understood too.
+
+Handlers match with `Callback(path)` instead of `F.data.startswith(path)`:
+the data of an update is decoded once into its path, every filter after that
+is a dictionary lookup. `index_callbacks` gives each router a root filter with
+the scenes of its handlers, the dispatcher skips the other routers at once.
+"""
+
+import base64
+import functools
+import hashlib
+
+from aiogram import Router
+from aiogram.filters import Filter
+from aiogram.types import CallbackQuery
+
+MARKER = "~"
+CODE_SIZE = 4
+MAX_DATA_BYTES = 64
+
+# code -> path and back, filled when the routers are imported
+_paths: dict[str, str] = {}
+_codes: dict[str, str] = {}
+# Longest first, for data that carries the full path
+_by_length: list[str] = []
+
+
+def _code(path: str) -> str:
+    digest = hashlib.blake2b(path.encode(), digest_size=3).digest()
+    return base64.urlsafe_b64encode(digest).decode()
+
+
+def register(path: str) -> str:
+    """Give a callback path its code, the same path twice is fine."""
+    if path in _codes:
+        return path
+    code = _code(path)
+    if code in _paths:
+        raise ValueError(f"{path} and {_paths[code]} have the same code {code}")
+    _paths[code] = path
+    _codes[path] = code
+    _by_length.append(path)
+    _by_length.sort(key=len, reverse=True)
+    decode.cache_clear()
+    return path
+
+
+def scene(path: str) -> str:
+    return path.split("/", 1)[0]
+
+
+def encode(data: str) -> str:
+    """Short form of `path + argument` for a registered path."""
+    for path in _by_length:
+        if data.startswith(path):
+            data = MARKER + _codes[path] + data[len(path) :]
+            break
+    if len(data.encode()) > MAX_DATA_BYTES:
+        raise ValueError(f"Callback data over {MAX_DATA_BYTES} bytes: {data}")
+    return data
+
+
+@functools.lru_cache(maxsize=4096)
+def decode(data: str) -> tuple[str | None, str]:
+    """Path and argument of callback data, None for an unknown path."""
+    if data.startswith(MARKER):
+        path = _paths.get(data[1 : 1 + CODE_SIZE])
+        if path is not None:
+            return path, data[1 + CODE_SIZE :]
+        return None, data
+    for path in _by_length:
+        if data.startswith(path):
+            return path, data[len(path) :]
+    return None, data
+
+
+def expand(data: str) -> str:
+    """Callback data with the full path, as the handlers built it."""
+    path, arg = decode(data)
+    return data if path is None else path + arg
+
+
+class Callback(Filter):
+    """Callback query for `path`, replaces `F.data.startswith(path)`."""
+
+    def __init__(self, path: str):
+        self.path = register(path)
+
+    async def __call__(self, callback: CallbackQuery) -> bool:
+        return callback.data is not None and decode(callback.data)[0] == self.path
+
+
+class Scenes(Filter):
+    """Root filter of a router: the callback belongs to one of its scenes."""
+
+    def __init__(self, scenes: set[str]):
+        self.scenes = frozenset(scenes)
+
+    async def __call__(self, callback: CallbackQuery) -> bool:
+        if callback.data is None:
+            return False
+        path = decode(callback.data)[0]
+        return path is not None and scene(path) in self.scenes
+
+
+def index_callbacks(router: Router) -> Router:
+    """Skip the router's callback handlers for callbacks of other scenes."""
+    observer = router.callback_query
+    paths = []
+    for handler in observer.handlers:
+        found = [f.callback.path for f in handler.filters or () if isinstance(f.callback, Callback)]
+        if not found:
+            # A handler for any callback, the router keeps getting all of them
+            return router
+        paths += found
+    if paths:
+        observer.filter(Scenes({scene(path) for path in paths}))
+    return router
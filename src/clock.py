@@ -0,0 +1,35 @@
+"""
+The current time of the bot.
+
+Handlers, repositories and jobs ask `clock.now()` instead of `datetime.now()`,
+so a replay of recorded updates can pin every update to the moment it was
+recorded at and two builds see exactly the same days.
+"""
+
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, tzinfo
+
+# Aware moment the current task pretends it is
+_frozen: ContextVar[datetime | None] = ContextVar("frozen_now", default=None)
+
+
+def now(tz: tzinfo | None = None) -> datetime:
+    """Naive current time in `tz`, the server's local time by default."""
+    moment = _frozen.get()
+    if moment is None:
+        return datetime.now(tz).replace(tzinfo=None)
+    return moment.astimezone(tz).replace(tzinfo=None)
+
+
+@contextmanager
+def frozen(moment: datetime) -> Iterator[None]:
+    """`now()` returns `moment` in this task and the tasks it starts."""
+    if moment.tzinfo is None:
+        moment = moment.astimezone()
+    token = _frozen.set(moment)
+    try:
+        yield
+    finally:
+        _frozen.reset(token)
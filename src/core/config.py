@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import os
 from dataclasses import dataclass
 from datetime import time, timedelta
 
@@ -14,19 +15,37 @@ class TelegramBotConfig:
     token: str
 
 
+@dataclass
+class WebhookConfig:
+    url: str
+    secret: str
+    path: str = "/webhook"
+    host: str = "0.0.0.0"
+    port: int = 8080
+
+
 @dataclass
 class Config:
     tg_bot: TelegramBotConfig
+    webhook: WebhookConfig | None = None
 
 
 def load_config() -> Config:
     """Parse a `.env` file and load the variables into environment variables."""
     load_dotenv()
 
-    return Config(tg_bot=TelegramBotConfig(token=getenv("BOT_TOKEN")))
+    webhook = None
+    if os.environ.get("BOT_MODE", "polling") == "webhook":
+        webhook = WebhookConfig(
+            url=getenv("WEBHOOK_URL"),
+            secret=getenv("WEBHOOK_SECRET"),
+            path=os.environ.get("WEBHOOK_PATH", "/webhook"),
+            host=os.environ.get("WEBAPP_HOST", "0.0.0.0"),
+            port=int(os.environ.get("WEBAPP_PORT", 8080)),
+        )
+    return Config(tg_bot=TelegramBotConfig(token=getenv("BOT_TOKEN")), webhook=webhook)
 
 
-BOT_TOKEN = getenv("BOT_TOKEN")
 DATE_FORMAT = "%d.%m.%Y"
 DATE_FORMAT_HR = "%d.%m"
 TIME_FORMAT = "%H.%M"
@@ -58,8 +77,52 @@ DATE_FMT = "%Y.%m.%d"
 SHORT_DATE_FMT = "%d.%m"
 DATETIME_FMT = "%Y.%m.%d %H:%M"
 SHORT_DATETIME_FMT = "%d.%m %H:%M"
-DB_DATETIME = "%Y-%m-%d %H:%M:%S.%f"
 
 SLOT_SIZE = timedelta(minutes=15)
 LESSON_SIZE = timedelta(hours=1)
 MAX_LESSONS_PER_DAY = 6
+
+HTTP_POOL_SIZE = 100
+# Updates handled at once, updates from one chat are always handled in order
+UPDATE_CONCURRENCY = 20
+CHAT_QUEUE_WARN_DEPTH = 10
+# Redelivered updates are at most this far below the last handled update_id,
+# an update further below follows Telegram's random restart of the ids
+UPDATE_WINDOW = 10_000
+
+# Local only by default, docker-compose.yml listens on every interface
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
+BOT_METRICS_PORT = 9101
+SCHEDULER_METRICS_PORT = 9102
+
+
+def metrics_port(default: int) -> int | None:
+    """METRICS_PORT overrides the port of the process, 0 turns metrics off."""
+    port = int(os.environ.get("METRICS_PORT", default))
+    return port or None
+
+
+FSM_DB = "db/fsm.sqlite"
+# Unfinished dialogs older than this are forgotten
+FSM_TTL = timedelta(days=2)
+FSM_PURGE_INTERVAL = timedelta(hours=1)
+# Chats whose FSM records stay in memory, the least recently used go first
+FSM_CACHE_SIZE = 10_000
+
+# Telegram allows ~30 messages per second across chats
+BROADCAST_RATE = 25
+BROADCAST_CONCURRENCY = 10
+BROADCAST_ATTEMPTS = 3
+BROADCAST_PROGRESS_INTERVAL = timedelta(seconds=3)
+MEDIA_GROUP_DELAY = 1.0  # seconds without new album parts
+MEDIA_GROUP_MAX_GROUPS = 100
+MEDIA_GROUP_MAX_ITEMS = 10
+NOTIFICATIONS_CONCURRENCY = 10
+NOTIFICATION_TIME = time(hour=8, minute=15)
+# Notifications missed during downtime are still sent if no later than this
+NOTIFICATION_CATCH_UP = timedelta(hours=3)
+JOB_RUNS_KEEP = timedelta(days=30)
+REMINDER_BEFORE = timedelta(minutes=60)
+REMINDER_HORIZON = timedelta(hours=48)
+# How often the reminder service looks for lessons changed by the bot
+REMINDER_POLL_INTERVAL = timedelta(seconds=30)
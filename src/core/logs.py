@@ -1,7 +1,28 @@
 START = "Starting bot"
 STOP = "Bot stopped"
 DB_CONNECTING = "Connecting to database"
+STARTUP_REPORT = "%s started in %.3fs: %s"
+FIRST_UPDATE = "First update handled %.3fs after start"
+CHAT_QUEUE_DEEP = "Chat %s has %s updates waiting"
+CALLBACK_NOT_ANSWERED = "Callback query %s was not answered: %s"
+UPDATE_ID_RESET = "Update ids went back from %s to %s, counting from the new one"
+CATCH_UP_START = "Catching up on updates received while the bot was down"
+CATCH_UP_PROGRESS = "Catch-up: %s updates handled, %s repeated taps skipped"
+CATCH_UP_DONE = "Catch-up finished in %.1fs: %s updates handled, %s repeated taps skipped"
 
 SCHEDULER_START = "Scheduler started"
 NOTIFICATIONS_START = "Sending notifications"
 NOTIFICATIONS_SENT = "Notifications sent to %s"
+MESSAGE_NOT_SENT = "Message to %s not sent: %s"
+NOTIFICATION_FAILED = "Notification to %s not sent, retrying next minute: %s"
+NOTIFICATION_BLOCKED = "Notification to %s dropped, the bot is blocked: %s"
+JOB_FAILED = "Job %s (%s) failed"
+
+BROADCAST_START = "Broadcast %s started, %s recipients pending"
+BROADCAST_DONE = "Broadcast %s finished: %s sent, %s failed"
+BROADCAST_RESUME = "Resuming %s unfinished broadcasts"
+
+REMINDERS_START = "Reminder service started"
+REMINDERS_REBUILT = "Rebuilt reminders for %s executor days"
+REMINDER_FAILED = "Reminder %s failed, retrying: %s"
+REMINDER_BLOCKED = "Reminder to %s dropped, the bot is blocked: %s"
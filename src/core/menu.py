@@ -4,4 +4,5 @@ ALL_COMMANDS = [
     BotCommand(command="start", description="Приветственное сообщение, запуск бота"),
     BotCommand(command="help", description="Помощь"),
     BotCommand(command="cancel", description="Отмена"),
+    BotCommand(command="notification_time", description="Время напоминаний"),
 ]
@@ -1,9 +1,75 @@
-from sqlalchemy import create_engine
+import os
+
+from sqlalchemy import Engine, create_engine, make_url
 
 from core import logs
 from logger import logger
 from models import Base
+from src.metrics import track_queries
+
+COMBINED_DB = "db/db.sqlite"
+# e.g. postgresql+psycopg://olm:secret@db/olm, needs the driver installed
+DATABASE_URL = os.environ.get("DATABASE_URL", f"sqlite:///{COMBINED_DB}")
+# Connections kept open to a database server, SQLite uses its own pool
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+DB_POOL_RECYCLE = 1800
+# With a directory every executor gets its own file there, see src/shards.py
+SHARDS_DIR = os.environ.get("DB_SHARDS_DIR", "")
+CATALOG_DB = "catalog.sqlite"
+
+_engines: dict[str, Engine] = {}
+
+
+def open_engine(url: str) -> Engine:
+    """Engine of a database URL, created on first use."""
+    engine = _engines.get(url)
+    if engine is None:
+        if make_url(url).get_backend_name() == "sqlite":
+            engine = create_engine(url)
+        else:
+            engine = create_engine(
+                url,
+                pool_size=DB_POOL_SIZE,
+                max_overflow=DB_MAX_OVERFLOW,
+                pool_pre_ping=True,
+                pool_recycle=DB_POOL_RECYCLE,
+            )
+        _engines[url] = engine
+        track_queries(engine)
+    return engine
+
+
+def is_sqlite(engine: Engine) -> bool:
+    return engine.dialect.name == "sqlite"
+
+
+def get_engine() -> Engine:
+    """
+    DATABASE_URL, or the catalog of a sharded SQLite database.
+
+    Engine is created on first use, importing this module has no side effects.
+    """
+    if SHARDS_DIR:
+        return open_engine(f"sqlite:///{os.path.join(SHARDS_DIR, CATALOG_DB)}")
+    return open_engine(DATABASE_URL)
+
+
+def init_db():
+    """Create missing tables, a startup phase of the bot and the scheduler."""
+    logger.info(logs.DB_CONNECTING)
+    if SHARDS_DIR:
+        if make_url(DATABASE_URL).get_backend_name() != "sqlite":
+            raise RuntimeError("DB_SHARDS_DIR splits SQLite files, unset it with DATABASE_URL")
+        from src.shards import init_catalog
+
+        init_catalog()
+    else:
+        Base.metadata.create_all(get_engine())
+
 
-logger.info(logs.DB_CONNECTING)
-engine = create_engine("sqlite:///db/db.sqlite")
-Base.metadata.create_all(engine)
+def dispose_engine():
+    """Close the pools, the next `get_engine()` connects again (benchmarks, tests)."""
+    for engine in _engines.values():
+        engine.dispose()
+    _engines.clear()
@@ -0,0 +1,84 @@
+"""
+Candidate schedule engines, drop-in replacements for `EventRepo`.
+
+A candidate has to return exactly what the legacy repository returns;
+benchmarks/oracle.py compares them on generated schedules before one is
+used anywhere.
+"""
+
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import date, datetime
+
+from src.repositories import EventRepo
+
+
+class IndexedEventRepo(EventRepo):
+    """
+    Groups the cancellations by series once per call.
+
+    The legacy `recurrent_events_for_day` scans every cancellation for every
+    series, and `available_weekdays` loads the series once per weekday.
+    """
+
+    def __init__(self, db):
+        super().__init__(db)
+        self._recurrent: dict[int, tuple] = {}
+
+    def _parsed_recurrent(self, executor_id: int):
+        if executor_id in self._recurrent:
+            return self._recurrent[executor_id]
+        events, cancels = self.recurrent_events(executor_id)
+        cancelled = defaultdict(list)
+        for event_id, _break_type, start, end in cancels:
+            cancelled[event_id].append((start, end))
+        series = [
+            (
+                start,
+                end,
+                user_id,
+                event_type,
+                interval,
+                interval_end.date() if interval_end else None,
+                event_id,
+            )
+            for start, end, user_id, event_type, interval, interval_end, event_id in events
+        ]
+        return series, cancelled
+
+    @contextmanager
+    def _reuse_recurrent(self, executor_id: int):
+        """Load the series once for a method that asks for several days."""
+        self._recurrent[executor_id] = self._parsed_recurrent(executor_id)
+        try:
+            yield
+        finally:
+            del self._recurrent[executor_id]
+
+    def recurrent_events_for_day(self, executor_id: int, day: date):
+        series, cancelled = self._parsed_recurrent(executor_id)
+        result = []
+        for start, end, user_id, event_type, interval, interval_end, event_id in series:
+            if interval_end and interval_end < day:
+                continue
+            if interval <= 0 or (day - start.date()).days % interval:
+                continue
+            event_start = datetime.combine(day, start.time())
+            event_end = event_start + (end - start)
+            if any(
+                event_start < c_end and event_end > c_start
+                for c_start, c_end in cancelled.get(event_id, ())
+            ):
+                continue
+            result.append((event_start, event_end, user_id, event_type, False))
+        return result
+
+    def available_weekdays(self, executor_id: int):
+        with self._reuse_recurrent(executor_id):
+            return super().available_weekdays(executor_id)
+
+
+ENGINES = {
+    "legacy": EventRepo,
+    "indexed": IndexedEventRepo,
+}
@@ -8,12 +8,13 @@ from aiogram.utils.keyboard import InlineKeyboardBuilder, ReplyKeyboardBuilder
 from core.config import (
     CHANGE_DELTA,
     DATE_FMT,
-    DB_DATETIME,
     MAX_BUTTON_ROWS,
     TIME_FMT,
     WEEKDAY_MAP,
     SHORT_DATE_FMT,
 )
+from src import clock
+from src.callbacks import encode
 from src.models import Event, RecurrentEvent, User
 
 
@@ -51,10 +52,10 @@ class Keyboards:
         builder = InlineKeyboardBuilder()
         if isinstance(buttons, dict):
             for callback_data, text in buttons.items():
-                builder.button(text=text, callback_data=callback_data)
+                builder.button(text=text, callback_data=encode(callback_data))
         else:
             for text, callback_data in buttons:
-                builder.button(text=text, callback_data=callback_data)
+                builder.button(text=text, callback_data=encode(callback_data))
         if adjust is None:
             adjust = ceil(len(buttons) / MAX_BUTTON_ROWS)
         builder.adjust(1 if not adjust else adjust, repeat=True)
@@ -116,10 +117,10 @@ class Keyboards:
     @classmethod
     def choose_lesson(cls, lessons: list[tuple], callback: str):
         buttons = {}
-        now = datetime.now()
+        now = clock.now()
         threshold = now + CHANGE_DELTA
         for lesson in lessons:
-            lesson_datetime = datetime.strptime(lesson[0], DB_DATETIME)
+            lesson_datetime = lesson[0]
             if len(lesson) == 6 and threshold > lesson_datetime:
                 continue
             lesson_date = datetime.strftime(lesson_datetime, SHORT_DATE_FMT)
@@ -187,9 +188,7 @@ class Keyboards:
         events_types = [e.event_type for e in events]
         if RecurrentEvent.EventTypes.WORK_START in events_types:
             start = [
-                datetime.strptime(e.end, DB_DATETIME)
-                for e in events
-                if e.event_type == RecurrentEvent.EventTypes.WORK_START
+                e.end for e in events if e.event_type == RecurrentEvent.EventTypes.WORK_START
             ][0]
             buttons[callback + "delete_start"] = (
                 f"Удалить начало в {datetime.strftime(start, TIME_FMT)}"
@@ -198,9 +197,7 @@ class Keyboards:
             buttons[callback + "add_start"] = "Добавить начало"
         if RecurrentEvent.EventTypes.WORK_END in events_types:
             end = [
-                datetime.strptime(e.start, DB_DATETIME)
-                for e in events
-                if e.event_type == RecurrentEvent.EventTypes.WORK_END
+                e.start for e in events if e.event_type == RecurrentEvent.EventTypes.WORK_END
             ][0]
             buttons[callback + "delete_end"] = (
                 f"Удалить конец в {datetime.strftime(end, TIME_FMT)}"
@@ -209,11 +206,7 @@ class Keyboards:
             buttons[callback + "add_end"] = "Добавить конец"
 
         for weekend in weekends:
-            if not isinstance(weekend.start, datetime):
-                start = datetime.strptime(weekend.start, DB_DATETIME)
-            else:
-                start = weekend.start
-            weekday = WEEKDAY_MAP[start.weekday()]["long"]
+            weekday = WEEKDAY_MAP[weekend.start.weekday()]["long"]
             buttons[callback2 + f"delete_weekend/{weekend.id}"] = (
                 f"Удалить выходной в {weekday}"
             )
@@ -225,17 +218,7 @@ class Keyboards:
     def vacations(cls, events: list, callback: str):
         buttons = {}
         for e in events:
-            start = (
-                datetime.strptime(e.start, DB_DATETIME)
-                if isinstance(e.start, str)
-                else e.start
-            )
-            end = (
-                datetime.strptime(e.end, DB_DATETIME)
-                if isinstance(e.end, str)
-                else e.end
-            )
-            event = f"{datetime.strftime(start, DATE_FMT)} - {datetime.strftime(end, DATE_FMT)}"
+            event = f"{datetime.strftime(e.start, DATE_FMT)} - {datetime.strftime(e.end, DATE_FMT)}"
             buttons[callback + f"delete_vacation/{e.id}"] = f"Удалить каникулы {event}"
         buttons[callback + "add_vacation"] = "Добавить каникулы"
         return cls.inline_keyboard(buttons)
@@ -268,8 +251,7 @@ class Keyboards:
     def work_breaks(cls, events: list, add_callback: str, remove_callback: str):
         buttons = {}
         for event in events:
-            start = datetime.strptime(event.start, DB_DATETIME)
-            end = datetime.strptime(event.end, DB_DATETIME)
+            start, end = event.start, event.end
             duration = (
                 datetime.strftime(start, TIME_FMT)
                 + " - "
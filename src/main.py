@@ -1,37 +1,148 @@
 import asyncio
 
 from aiogram import Bot, Dispatcher
-from aiogram.client.default import DefaultBotProperties
 
+from backlog import catch_up
 from core import logs
-from core.config import Config, load_config
+from core.config import BOT_METRICS_PORT, METRICS_HOST, load_config, metrics_port
 from core.menu import ALL_COMMANDS
+from database import init_db
 from errors import add_errors
 from logger import logger
-from middlewares import LoggingMiddleware
-from routers import all_routers
+from middlewares import (
+    CallbackAnswerMiddleware,
+    ChatQueueMiddleware,
+    LoggingMiddleware,
+    MetricsMiddleware,
+    UpdateTrackerMiddleware,
+)
+from routers import load_routers
+from src.bot import close_bot, get_bot
+from src.broadcasts import broadcasts, media_groups
+from src.callbacks import index_callbacks
+from src.metrics import registry, start_metrics_server
+from src.querywatch import QUERY_WATCH, QueryWatchMiddleware, watch_repository
+from src.recorder import RECORD_UPDATES, UpdateRecorderMiddleware
+from src.repositories import EventRepo, UserRepo
+from src.tracing import TracingMiddleware, setup_tracing
+from src.reminders import track_schedule_changes
+from src.shadow import shadow_repository
+from src.storage import SQLiteStorage
+from startup import FirstUpdateMiddleware, StartupReport
+from webhook import run_webhook
 
 
-async def main():
-    """Start bot."""
-    logger.info(logs.START)
-    config: Config = load_config()
-    bot: Bot = Bot(
-        token=config.tg_bot.token, default=DefaultBotProperties(parse_mode="HTML")
-    )
-    dp: Dispatcher = Dispatcher()
+def create_dispatcher() -> Dispatcher:
+    storage = SQLiteStorage()
+    storage.purge()
+    # FSM is read in an outer middleware, registered behind the chat queues below
+    dp: Dispatcher = Dispatcher(storage=storage, disable_fsm=True)
+    if RECORD_UPDATES:
+        # Before the tracker, replays see duplicates and stale updates too
+        dp.update.outer_middleware(UpdateRecorderMiddleware())
+    # The tracker goes before the queues so updates waiting in chat queues count as in flight
+    dp["update_tracker"] = tracker = UpdateTrackerMiddleware(storage)
+    dp.update.outer_middleware(tracker)
+    # Buttons stop spinning right away, not after the updates queued before them
+    dp.update.outer_middleware(CallbackAnswerMiddleware())
+    dp["chat_queues"] = chat_queues = ChatQueueMiddleware()
+    dp.update.outer_middleware(chat_queues)
+    # Behind the queues a second fast update of a chat sees the state the first one left
+    dp.update.outer_middleware(dp.fsm)
 
     dp = add_errors(dp)
-    for router in all_routers:
-        dp.include_router(router)
+    for router in load_routers():
+        dp.include_router(index_callbacks(router))
 
     dp.message.middleware(LoggingMiddleware())
     dp.callback_query.middleware(LoggingMiddleware())
+    dp.message.middleware(TracingMiddleware())
+    dp.callback_query.middleware(TracingMiddleware())
+    dp.message.middleware(MetricsMiddleware())
+    dp.callback_query.middleware(MetricsMiddleware())
+    if QUERY_WATCH:
+        watch_repository(EventRepo)
+        watch_repository(UserRepo)
+        dp.message.middleware(QueryWatchMiddleware())
+        dp.callback_query.middleware(QueryWatchMiddleware())
+    shadow_repository(EventRepo)
+    return dp
+
+
+def register_metrics(dp: Dispatcher):
+    """Queue depths and cache counters, read on every scrape."""
+    storage, chat_queues = dp.storage, dp["chat_queues"]
+    registry.gauge(
+        "olm_chat_queue_updates",
+        "Updates in chat queues",
+        lambda: {
+            ("waiting",): chat_queues.stats()["waiting"],
+            ("running",): chat_queues.stats()["running"],
+        },
+        ("state",),
+    )
+    registry.gauge(
+        "olm_chat_queue_deepest",
+        "Updates queued for the busiest chat",
+        lambda: chat_queues.stats()["deepest"],
+    )
+    registry.gauge(
+        "olm_broadcast_pending",
+        "Recipients of running broadcasts not handled yet",
+        lambda: sum(broadcasts.pending.values()),
+    )
+    registry.gauge(
+        "olm_media_groups_pending",
+        "Albums still being collected",
+        lambda: len(media_groups.groups),
+    )
+    registry.gauge(
+        "olm_fsm_cache_reads_total",
+        "FSM storage reads by cache result",
+        lambda: {("hit",): storage.hits, ("miss",): storage.misses},
+        ("result",),
+        kind="counter",
+    )
+
+
+async def main():
+    """Start bot."""
+    report = StartupReport("Bot")
+    report.mark("imports")
+    logger.info(logs.START)
+    config = load_config()
+    init_db()
+    setup_tracing("bot", EventRepo, UserRepo)
+    track_schedule_changes()
+    report.mark("database")
+    bot: Bot = get_bot()
+    dp = create_dispatcher()
+    FirstUpdateMiddleware(report, dp)
+    register_metrics(dp)
+    report.mark("dispatcher")
 
     await bot.set_my_commands(ALL_COMMANDS)
+    report.mark("bot commands")
 
-    await bot.delete_webhook(drop_pending_updates=True)
-    await dp.start_polling(bot)
+    port = metrics_port(BOT_METRICS_PORT)
+    metrics_server = await start_metrics_server(METRICS_HOST, port) if port else None
+    broadcasts.resume()
+    purging = asyncio.create_task(dp.storage.purge_periodically())
+    try:
+        if config.webhook is not None:
+            report.log()
+            await run_webhook(dp, bot, config.webhook)
+        else:
+            await bot.delete_webhook()
+            await catch_up(bot, dp, dp["update_tracker"])
+            report.mark("catch-up")
+            report.log()
+            await dp.start_polling(bot)
+    finally:
+        purging.cancel()
+        if metrics_server is not None:
+            await metrics_server.cleanup()
+        await close_bot()
 
 
 if __name__ == "__main__":
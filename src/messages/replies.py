@@ -20,6 +20,7 @@ HELP_MESSAGE = """
 
 Уведомления:
 Каждый день утром по МСК бот присылает напоминание о предстоящих занятиях.
+Время напоминания можно изменить командой /notification_time
 Команда `Помощь` обновляет клавиатуру с кнопками и выводит это сообщение.
 """
 GREETINGS = "你好, %s!"
@@ -91,6 +92,15 @@ USER_DELETED = "Пользователь удален"
 SEND_NOTIFICATION = "Отправьте сообщение, которое хотите разослать всем ученикам"
 MEDIA_GROUP_UNSUPPORTED = "MEDIA_GROUP_UNSUPPORTED"
 UNSUPPORTED_MEDIA_TYPE = "UNSUPPORTED_MEDIA_TYPE"
+CHOOSE_NOTIFICATION_TIME = f"Во сколько присылать утреннее напоминание о занятиях? Формат {html.code('ЧЧ ММ')}"
+WRONG_TIME_FMT = f"Неверный формат времени, введите в формате {html.code('ЧЧ ММ')}"
+NOTIFICATION_TIME_SET = "Напоминания будут приходить в %s по МСК"
+BROADCAST_PROGRESS = "Рассылка: отправлено %s из %s"
+BROADCAST_DONE = "Сообщение отправлено %s ученикам."
+BROADCAST_ERRORS = "Не удалось отправить сообщение ученикам:\n%s"
+
+REMINDER = "Урок начнётся через %s минут, в %s"
+REMINDER_TEACHER = "Урок у %s начнётся через %s минут, в %s"
 
 # LESSONS_ARE_COMING = "🔔 Скоро уроки!\n"
 # LESSON_IS_COMING_TEACHER = "Урок у %s в %s"
@@ -0,0 +1,255 @@
+import time
+from bisect import bisect_left
+from collections.abc import Callable
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramAPIError
+from aiohttp import web
+from sqlalchemy import Engine, event
+
+from logger import logger
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = labels
+
+    def samples(self):
+        raise NotImplementedError
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        lines += [f"{name}{labels} {value}" for name, labels, value in self.samples()]
+        return lines
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name, documentation, labels=()):
+        super().__init__(name, documentation, labels)
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in self.values.items():
+            yield self.name, _labels(self.label_names, labels), value
+
+
+class Gauge(Metric):
+    """Value read on every scrape from `func`, a number or {label values: number}."""
+
+    type = "gauge"
+
+    def __init__(self, name, documentation, func: Callable, labels=(), kind="gauge"):
+        super().__init__(name, documentation, labels)
+        self.func = func
+        self.type = kind
+
+    def samples(self):
+        values = self.func()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for labels, value in values.items():
+            yield self.name, _labels(self.label_names, labels), value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+        # label values -> [bucket counts..., sum, count]
+        self.values: dict[tuple, list[float]] = {}
+
+    def observe(self, value: float, *labels):
+        series = self.values.get(labels)
+        if series is None:
+            series = self.values[labels] = [0] * (len(self.buckets) + 2)
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[index] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def samples(self):
+        for labels, series in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = _labels(self.label_names, labels, f'le="{bound}"')
+                yield f"{self.name}_bucket", le, cumulative
+            le = _labels(self.label_names, labels, 'le="+Inf"')
+            yield f"{self.name}_bucket", le, series[-1]
+            yield f"{self.name}_sum", _labels(self.label_names, labels), series[-2]
+            yield f"{self.name}_count", _labels(self.label_names, labels), series[-1]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def gauge(self, name: str, documentation: str, func: Callable, labels=(), kind="gauge"):
+        return self.register(Gauge(name, documentation, func, labels, kind))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            try:
+                lines += metric.render()
+            except Exception:
+                logger.exception(f"Could not collect metric {metric.name}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+HANDLER_SECONDS = registry.register(
+    Histogram(
+        "olm_handler_seconds", "Time spent in a handler", ("scene", "handler")
+    )
+)
+UPDATE_DB_STATEMENTS = registry.register(
+    Histogram(
+        "olm_update_db_statements",
+        "SQL statements executed while handling one update",
+        ("scene", "handler"),
+        COUNT_BUCKETS,
+    )
+)
+UPDATE_DB_SECONDS = registry.register(
+    Histogram(
+        "olm_update_db_seconds",
+        "Time spent in SQL while handling one update",
+        ("scene", "handler"),
+    )
+)
+DB_STATEMENTS = registry.register(
+    Counter("olm_db_statements_total", "SQL statements executed")
+)
+DB_SECONDS = registry.register(
+    Counter("olm_db_seconds_total", "Time spent executing SQL statements")
+)
+TELEGRAM_SECONDS = registry.register(
+    Histogram(
+        "olm_telegram_request_seconds", "Latency of Telegram Bot API calls", ("method",)
+    )
+)
+TELEGRAM_ERRORS = registry.register(
+    Counter(
+        "olm_telegram_errors_total", "Failed Telegram Bot API calls", ("method", "error")
+    )
+)
+JOB_SECONDS = registry.register(
+    Histogram("olm_job_seconds", "Duration of scheduler jobs", ("job", "status"))
+)
+ENGINE_SECONDS = registry.register(
+    Histogram(
+        "olm_engine_seconds",
+        "Schedule queries by engine, the served one and its shadow",
+        ("method", "engine"),
+    )
+)
+SHADOW_RESULTS = registry.register(
+    Counter(
+        "olm_shadow_results_total",
+        "Shadow engine runs: match, diverged, stale, error or dropped",
+        ("method", "result"),
+    )
+)
+
+
+@dataclass
+class QueryStats:
+    statements: int = 0
+    seconds: float = 0.0
+
+
+# Statements of the update (or job) the current task is handling
+current_queries: ContextVar[QueryStats | None] = ContextVar(
+    "current_queries", default=None
+)
+
+
+def _before_cursor_execute(conn, _cursor, _statement, _parameters, _context, _many):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, _cursor, _statement, _parameters, _context, _many):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    DB_STATEMENTS.inc()
+    DB_SECONDS.inc(amount=elapsed)
+    stats = current_queries.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.seconds += elapsed
+
+
+def track_queries(engine: Engine):
+    """Count statements and their time through engine events."""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class RequestMetricsMiddleware(BaseRequestMiddleware):
+    """Latency and errors of every outbound Telegram call."""
+
+    async def __call__(self, make_request, bot: Bot, method):
+        name = method.__api_method__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except (TelegramAPIError, OSError, TimeoutError) as e:
+            TELEGRAM_ERRORS.inc(name, type(e).__name__)
+            raise
+        finally:
+            TELEGRAM_SECONDS.observe(time.perf_counter() - started, name)
+
+
+async def metrics(_request: web.Request) -> web.Response:
+    return web.Response(
+        text=registry.render(), content_type="text/plain", charset="utf-8"
+    )
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """Serve GET /metrics in the Prometheus text format."""
+    app = web.Application()
+    app.router.add_get("/metrics", metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Metrics served on {host}:{port}/metrics")
+    return runner
@@ -1,18 +1,34 @@
 from __future__ import annotations
 
+import asyncio
+import time
+from collections import deque
 from collections.abc import Awaitable, Callable
 from typing import Any
 
 from aiogram import BaseMiddleware
-from aiogram.types import CallbackQuery, Message
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.exceptions import TelegramAPIError
+from aiogram.types import CallbackQuery, Message, Update
 from sqlalchemy.orm import Session
 
-from database import engine
+from core import logs
+from core.config import CHAT_QUEUE_WARN_DEPTH, UPDATE_CONCURRENCY, UPDATE_WINDOW
+from database import get_engine
 from logger import logger
+from src.metrics import (
+    HANDLER_SECONDS,
+    UPDATE_DB_SECONDS,
+    UPDATE_DB_STATEMENTS,
+    QueryStats,
+    current_queries,
+)
+from src.shards import adopt, route
+from src.storage import SQLiteStorage
 
 
 class DatabaseMiddleware(BaseMiddleware):
-    """Throws a session class to handler."""
+    """Throws a session class to handler, on the shard of the user with DB_SHARDS_DIR."""
 
     async def __call__(
         self,
@@ -21,9 +37,15 @@ class DatabaseMiddleware(BaseMiddleware):
         data: dict[str, Any],
     ) -> Any:  # noqa: ANN401
         """Calls every update."""
+        telegram_id = event.from_user.id if event.from_user else None
+        engine = route(telegram_id) if telegram_id else get_engine()
         with Session(bind=engine) as session:
             data["db"] = session
-            return await handler(event, data)
+            result = await handler(event, data)
+        # Registration happens in the catalog, the user may have joined a teacher
+        if telegram_id and engine is get_engine():
+            adopt(telegram_id)
+        return result
 
 
 class LoggingMiddleware(BaseMiddleware):
@@ -43,3 +65,219 @@ class LoggingMiddleware(BaseMiddleware):
         else:
             logger.warning(f"Called {handler.__name__} without user")
         return await handler(event, data)
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """Handler latency and SQL statements per update, by scene and handler."""
+
+    async def __call__(
+        self,
+        handler: Callable[[Message | CallbackQuery, dict[str, Any]], Awaitable[Any]],
+        event: Message | CallbackQuery,
+        data: dict[str, Any],
+    ) -> Any:  # noqa: ANN401
+        """Calls every update."""
+        callback = data["handler"].callback
+        # Routers live in one module per scene, e.g. src.routers.lessons.add_lesson
+        labels = (callback.__module__.rsplit(".", 1)[-1], callback.__name__)
+        queries = QueryStats()
+        token = current_queries.set(queries)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - started, *labels)
+            UPDATE_DB_STATEMENTS.observe(queries.statements, *labels)
+            UPDATE_DB_SECONDS.observe(queries.seconds, *labels)
+            current_queries.reset(token)
+
+
+class CallbackAnswerMiddleware(BaseMiddleware):
+    """
+    Answers callback queries as soon as they arrive, the button stops spinning.
+
+    Registered as an outer update middleware before the chat queues: the answer
+    is sent in the background while the update waits for its chat, handlers
+    reply by editing or sending messages and never answer the query themselves.
+    """
+
+    def __init__(self) -> None:
+        self.answers: set[asyncio.Task] = set()
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: dict[str, Any],
+    ) -> Any:  # noqa: ANN401
+        """Calls every update."""
+        if event.callback_query is not None:
+            query_id = event.callback_query.id
+            answer = asyncio.create_task(self._answer(data["bot"], query_id))
+            self.answers.add(answer)
+            answer.add_done_callback(self.answers.discard)
+        return await handler(event, data)
+
+    @staticmethod
+    async def _answer(bot, callback_query_id: str) -> None:
+        try:
+            await bot.answer_callback_query(callback_query_id)
+        except TelegramAPIError as e:
+            # Queries older than 15 seconds can't be answered, e.g. after a restart
+            logger.info(logs.CALLBACK_NOT_ANSWERED, callback_query_id, e)
+
+
+class ChatQueueMiddleware(BaseMiddleware):
+    """
+    Handles updates of different chats concurrently, updates of one chat in order.
+
+    Registered as an outer update middleware. Polling and the webhook start a
+    task per update and every task waits here in the queue of its chat, so two
+    fast taps of one user never race their FSM transitions. One worker per busy
+    chat drains its queue, at most `concurrency` updates are handled at once.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = UPDATE_CONCURRENCY,
+        warn_depth: int = CHAT_QUEUE_WARN_DEPTH,
+    ) -> None:
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.warn_depth = warn_depth
+        self.queues: dict[int, deque] = {}
+        self.workers: set[asyncio.Task] = set()
+        self.running = 0
+        self.max_depth = 0
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: dict[str, Any],
+    ) -> Any:  # noqa: ANN401
+        """Queues the update behind the ones from the same chat."""
+        chat = data.get("event_chat")
+        if chat is None:
+            return await self._handle(handler, event, data)
+
+        future = asyncio.get_running_loop().create_future()
+        queue = self.queues.get(chat.id)
+        if queue is None:
+            queue = self.queues[chat.id] = deque()
+            worker = asyncio.create_task(self._work(chat.id, queue))
+            self.workers.add(worker)
+            worker.add_done_callback(self.workers.discard)
+        queue.append((handler, event, data, future))
+
+        self.max_depth = max(self.max_depth, len(queue))
+        if len(queue) == self.warn_depth:
+            logger.warning(logs.CHAT_QUEUE_DEEP, chat.id, len(queue))
+        return await future
+
+    async def _handle(self, handler, event, data):
+        async with self.semaphore:
+            self.running += 1
+            try:
+                return await handler(event, data)
+            finally:
+                self.running -= 1
+
+    async def _work(self, chat_id: int, queue: deque) -> None:
+        try:
+            while queue:
+                handler, event, data, future = queue[0]
+                try:
+                    result = await self._handle(handler, event, data)
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    if not future.done():
+                        future.set_result(result)
+                queue.popleft()
+        finally:
+            # Cancelled (shutdown) or worse: the updates left are cancelled for
+            # their callers, the next update of the chat starts a new worker
+            for *_, future in queue:
+                future.cancel()
+            if self.queues.get(chat_id) is queue:
+                del self.queues[chat_id]
+
+    def stats(self) -> dict[str, int]:
+        """Queue depths for monitoring, the waiting count includes running updates."""
+        depths = [len(q) for q in self.queues.values()]
+        return {
+            "chats": len(depths),
+            "waiting": sum(depths),
+            "running": self.running,
+            "deepest": max(depths, default=0),
+            "max_depth": self.max_depth,
+        }
+
+
+class UpdateTrackerMiddleware(BaseMiddleware):
+    """
+    Persists how far updates were handled and skips updates delivered twice.
+
+    Telegram redelivers updates that were not confirmed before a restart. The
+    saved `update_id` is the one every earlier update was handled up to, with
+    concurrent handling it trails the newest update until the older ones finish.
+    Only ids at most `window` below it count as handled: after a week without
+    updates Telegram picks the next id at random, an id far below the saved one
+    starts the count again instead of being skipped.
+    """
+
+    def __init__(self, storage: SQLiteStorage, window: int = UPDATE_WINDOW) -> None:
+        self.storage = storage
+        self.window = window
+        self.handled: dict[int, int] = {}
+        self.newest: dict[int, int] = {}
+        self.in_flight: dict[int, set[int]] = {}
+
+    def last_update_id(self, bot_id: int) -> int:
+        if bot_id not in self.handled:
+            self.handled[bot_id] = self.storage.last_update_id(bot_id)
+            self.newest[bot_id] = self.handled[bot_id]
+            self.in_flight[bot_id] = set()
+        return self.handled[bot_id]
+
+    def mark_handled(self, bot_id: int, update_id: int) -> None:
+        if update_id > self.last_update_id(bot_id):
+            self.handled[bot_id] = update_id
+            self.storage.save_update_id(bot_id, update_id)
+
+    def seen(self, bot_id: int, update_id: int) -> bool:
+        """The update is being handled or was handled, a jump back resets the count."""
+        handled = self.last_update_id(bot_id)
+        if update_id in self.in_flight[bot_id]:
+            return True
+        if update_id > handled:
+            return False
+        if handled - update_id < self.window:
+            return True
+        logger.warning(logs.UPDATE_ID_RESET, handled, update_id)
+        self.handled[bot_id] = self.newest[bot_id] = update_id - 1
+        self.storage.save_update_id(bot_id, update_id - 1)
+        return False
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: dict[str, Any],
+    ) -> Any:  # noqa: ANN401
+        """Calls every update."""
+        bot_id = data["bot"].id
+        if self.seen(bot_id, event.update_id):
+            return UNHANDLED
+
+        in_flight = self.in_flight[bot_id]
+        in_flight.add(event.update_id)
+        self.newest[bot_id] = max(self.newest[bot_id], event.update_id)
+        try:
+            return await handler(event, data)
+        finally:
+            in_flight.discard(event.update_id)
+            self.mark_handled(
+                bot_id, min(in_flight) - 1 if in_flight else self.newest[bot_id]
+            )
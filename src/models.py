@@ -1,9 +1,21 @@
 from datetime import datetime, timedelta
 
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    Column,
+    Date,
+    DateTime,
+    ForeignKey,
+    Integer,
+    String,
+    Time,
+    UniqueConstraint,
+)
 from sqlalchemy.ext.declarative import declared_attr
 from sqlalchemy.orm import declarative_base, relationship
 
+from src import clock
 from src.core.config import DATE_FMT, DATETIME_FMT, TIME_FMT, WEEKDAY_MAP
 
 Base = declarative_base()
@@ -19,12 +31,12 @@ class Executor(Model, Base):
     __tablename__ = "executors"
     code = Column(String, unique=True)
     user = relationship("User", backref="executor")
-    telegram_id = Column(Integer, unique=True)
+    telegram_id = Column(BigInteger, unique=True)
 
 
 class User(Model, Base):
     __tablename__ = "users"
-    telegram_id = Column(Integer, unique=True)
+    telegram_id = Column(BigInteger, unique=True)
     username = Column(String)
     full_name = Column(String)
     role = Column(String)
@@ -172,4 +184,59 @@ class EventHistory(Model, Base):
     scene = Column(String)
     event_type = Column(String)
     event_value = Column(String)
-    created_at = Column(DateTime, default=datetime.now)
+    created_at = Column(DateTime, default=clock.now)
+
+
+class Broadcast(Model, Base):
+    __tablename__ = "broadcasts"
+    executor_id = Column(Integer, ForeignKey("executors.id"), nullable=False)
+    author = Column(String)
+    payload = Column(String)  # json, see broadcasts.payload_from_messages
+    status_chat_id = Column(BigInteger)
+    status_message_id = Column(Integer, nullable=True, default=None)
+    finished = Column(Boolean, default=False)
+    created_at = Column(DateTime, default=clock.now)
+    recipients = relationship("BroadcastRecipient", back_populates="broadcast")
+
+
+class BroadcastRecipient(Model, Base):
+    __tablename__ = "broadcast_recipients"
+    broadcast_id = Column(Integer, ForeignKey("broadcasts.id"), index=True)
+    broadcast = relationship(Broadcast, back_populates="recipients")
+    telegram_id = Column(BigInteger)
+    username = Column(String)
+    status = Column(String, default="pending")
+    attempts = Column(Integer, default=0)
+    error = Column(String, nullable=True, default=None)
+
+    class Statuses:
+        PENDING = "pending"
+        SENT = "sent"
+        FAILED = "failed"
+
+
+class JobRun(Model, Base):
+    """A scheduler run, the unique key makes each scheduled run happen once."""
+
+    __tablename__ = "job_runs"
+    __table_args__ = (UniqueConstraint("job", "key"),)
+    job = Column(String, nullable=False)
+    key = Column(String, nullable=False)
+    started_at = Column(DateTime, default=clock.now)
+    finished_at = Column(DateTime, nullable=True, default=None)
+
+
+class NotificationSetting(Model, Base):
+    __tablename__ = "notification_settings"
+    user_id = Column(Integer, ForeignKey("users.id"), unique=True)
+    user = relationship(User)
+    time = Column(Time, nullable=False)
+
+
+class ScheduleChange(Model, Base):
+    """Written by the bot when lessons change, the reminder service rebuilds from it."""
+
+    __tablename__ = "schedule_changes"
+    executor_id = Column(Integer, ForeignKey("executors.id"))
+    day = Column(Date, nullable=True, default=None)  # None means every day
+    created_at = Column(DateTime, default=clock.now)
@@ -0,0 +1,209 @@
+"""
+N+1 query detector for development and tests.
+
+Statements are fingerprinted (literals and parameters replaced with `?`, IN
+lists collapsed) and counted per update or per repository call. A shape that
+repeats `threshold` times is reported with a short stack summary of where the
+statements came from. Turned on with `QUERY_WATCH=1` in the bot, in tests
+through the `query_budget` fixture:
+
+    # conftest.py
+    pytest_plugins = ["src.querywatch"]
+
+    def test_day_schedule(query_budget, db):
+        with query_budget("EventRepo.day_schedule"):
+            EventRepo(db).day_schedule(1, date(2025, 1, 6))
+"""
+
+import functools
+import os
+import re
+import traceback
+from collections import Counter
+from collections.abc import Callable
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from aiogram import BaseMiddleware
+from sqlalchemy import Engine, event
+
+from logger import logger
+
+QUERY_WATCH = os.environ.get("QUERY_WATCH", "") not in ("", "0")
+REPEAT_THRESHOLD = int(os.environ.get("QUERY_WATCH_THRESHOLD", 5))
+STACK_DEPTH = 4
+
+# Statements an EventRepo method may run for one executor with lessons,
+# asserted on a benchmarks.dataset database by tests/test_query_budgets.py
+EVENT_REPO_BUDGETS = {
+    "EventRepo.day_schedule": 10,
+    "EventRepo.events_for_day": 3,
+    "EventRepo.recurrent_events_for_day": 2,
+    "EventRepo.available_weekdays": 16,
+    # events_for_day, recurrent_events_for_day, vacations and work hours
+    "EventRepo.available_time": 9,
+    "EventRepo.available_time_weekday": 5,
+    "EventRepo.all_user_lessons": 2,
+    "EventRepo.work_hours": 1,
+    "EventRepo.weekends": 1,
+    "EventRepo.available_work_weekdays": 1,
+    "EventRepo.vacations": 1,
+    "EventRepo.vacations_day": 1,
+    "EventRepo.users_on_vacation": 1,
+    "EventRepo.work_breaks": 1,
+    "EventRepo.overlaps": 3,
+}
+# Known loops, the number of repeats they are allowed
+KNOWN_REPEATS = {
+    # recurrent_events_for_day for each day of the week
+    "EventRepo.available_weekdays": 7,
+}
+
+_SRC = str(Path(__file__).resolve().parent)
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|:\w+|%\(\w+\)s")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACES = re.compile(r"\s+")
+
+
+def fingerprint(statement: str) -> str:
+    """Shape of a statement: the same query with other values has the same one."""
+    shape = _LITERALS.sub("?", statement)
+    shape = _IN_LIST.sub("(?)", shape)
+    return _SPACES.sub(" ", shape).strip().lower()
+
+
+def stack_summary(depth: int = STACK_DEPTH) -> str:
+    """Innermost frames of the project that led to the statement."""
+    frames = [
+        f
+        for f in traceback.extract_stack()
+        if f.filename.startswith(_SRC) and f.filename != __file__
+    ]
+    return " <- ".join(
+        f"{Path(f.filename).name}:{f.lineno} {f.name}" for f in reversed(frames[-depth:])
+    )
+
+
+class QueryLog:
+    def __init__(self, name: str):
+        self.name = name
+        self.shapes: Counter[str] = Counter()
+        self.stacks: dict[str, str] = {}
+
+    @property
+    def statements(self) -> int:
+        return sum(self.shapes.values())
+
+    def add(self, statement: str):
+        shape = fingerprint(statement)
+        self.shapes[shape] += 1
+        if shape not in self.stacks:
+            self.stacks[shape] = stack_summary()
+
+    def repeated(self, threshold: int = REPEAT_THRESHOLD) -> list[tuple[str, int, str]]:
+        return [
+            (shape, count, self.stacks[shape])
+            for shape, count in self.shapes.most_common()
+            if count >= threshold
+        ]
+
+    def report(self, threshold: int = REPEAT_THRESHOLD):
+        for shape, count, stack in self.repeated(threshold):
+            logger.warning(
+                f"N+1 in {self.name}: {count}x {shape[:200]} (first from {stack})"
+            )
+
+
+# Logs of the update and the repository calls the current task is in
+_active: ContextVar[tuple[QueryLog, ...]] = ContextVar("query_logs", default=())
+
+
+def _record(_conn, _cursor, statement, _parameters, _context, _many):
+    for log in _active.get():
+        log.add(statement)
+
+
+def install():
+    """Record statements of every engine, including ones created later."""
+    if not event.contains(Engine, "before_cursor_execute", _record):
+        event.listen(Engine, "before_cursor_execute", _record)
+
+
+@contextmanager
+def watch(name: str):
+    install()
+    log = QueryLog(name)
+    token = _active.set((*_active.get(), log))
+    try:
+        yield log
+    finally:
+        _active.reset(token)
+
+
+def watch_repository(cls: type) -> type:
+    """Report N+1 patterns of every public method, outermost repository call only."""
+
+    def wrap(method: Callable, name: str):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            if any(log.name.startswith(cls.__name__ + ".") for log in _active.get()):
+                return method(*args, **kwargs)
+            with watch(name) as log:
+                result = method(*args, **kwargs)
+            log.report()
+            return result
+
+        return wrapper
+
+    for attr, value in list(vars(cls).items()):
+        if not attr.startswith("_") and callable(value):
+            setattr(cls, attr, wrap(value, f"{cls.__name__}.{attr}"))
+    return cls
+
+
+class QueryWatchMiddleware(BaseMiddleware):
+    """Reports statement shapes repeated while handling one update."""
+
+    async def __call__(self, handler, event, data):
+        callback = data["handler"].callback
+        with watch(f"{callback.__module__}.{callback.__name__}") as log:
+            try:
+                return await handler(event, data)
+            finally:
+                log.report()
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@contextmanager
+def query_budget_check(name: str, budget: int | None = None, threshold: int | None = None):
+    """Fail when the block runs more statements than budgeted or an N+1 pattern."""
+    budget = EVENT_REPO_BUDGETS[name] if budget is None else budget
+    if threshold is None:
+        threshold = max(REPEAT_THRESHOLD, KNOWN_REPEATS.get(name, 0) + 1)
+    with watch(name) as log:
+        yield log
+    problems = []
+    if log.statements > budget:
+        problems.append(f"{log.statements} statements, budget {budget}")
+    problems += [
+        f"{count}x {shape} (from {stack})" for shape, count, stack in log.repeated(threshold)
+    ]
+    if problems:
+        raise QueryBudgetExceeded(f"{name}: " + "; ".join(problems))
+
+
+try:
+    import pytest
+except ImportError:
+    pytest = None
+
+if pytest is not None:
+
+    @pytest.fixture
+    def query_budget():
+        """`with query_budget("EventRepo.<method>"):` asserts the method's budget."""
+        return query_budget_check
@@ -0,0 +1,163 @@
+"""
+Records real traffic for replays, see benchmarks/replay.py.
+
+With `RECORD_UPDATES=<path>` every update is appended to a JSONL file with
+the moment it arrived and how long it took. Telegram ids are replaced by a
+keyed hash (`RECORD_SECRET`), names are masked and free text keeps only its
+shape; keyboard buttons, commands, dates and callback data stay as they are
+so the replay takes the same paths. The database copy to replay against is
+anonymized with the same secret:
+
+    RECORD_SECRET=... python -m src.recorder db/db.sqlite db/replay.sqlite
+"""
+
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import re
+import sqlite3
+import time
+from datetime import UTC, datetime
+
+from aiogram import BaseMiddleware
+
+from logger import logger
+from src.core.base import getenv
+from src.keyboards import AdminCommands, Commands
+
+RECORD_UPDATES = os.environ.get("RECORD_UPDATES", "")
+
+NAME_KEYS = ("first_name", "last_name", "username", "title", "full_name")
+TEXT_KEYS = ("text", "caption")
+DROPPED_KEYS = ("contact", "location", "venue", "phone_number", "bio")
+CHAT_TYPES = ("private", "group", "supergroup", "channel")
+KEPT_TEXTS = frozenset(c.value for c in (*Commands, *AdminCommands))
+_LETTERS = re.compile(r"[^\W\d_]")
+_HISTORY_TG_ID = re.compile(r"\btg_id: (\d+)")
+
+
+def anonymous_id(telegram_id: int, secret: str) -> int:
+    """Stable stand-in for a Telegram id, the same in updates and the database."""
+    digest = hmac.new(secret.encode(), str(telegram_id).encode(), hashlib.sha256)
+    return 10**9 + int.from_bytes(digest.digest()[:6]) % 10**9
+
+
+def mask_text(text: str) -> str:
+    """Letters become `x`, digits and punctuation stay, so dates still parse."""
+    if text in KEPT_TEXTS or text.startswith("/"):
+        return text
+    return _LETTERS.sub("x", text)
+
+
+def anonymize(data, secret: str):
+    """Copy of an update as a dict without names, ids or free text."""
+    if isinstance(data, list):
+        return [anonymize(item, secret) for item in data]
+    if not isinstance(data, dict):
+        return data
+    # Users and chats are the dicts with an `is_bot` or chat `type` field
+    person = "is_bot" in data or data.get("type") in CHAT_TYPES
+    result = {}
+    for key, value in data.items():
+        if key in DROPPED_KEYS:
+            continue
+        if person and key == "id":
+            result[key] = anonymous_id(value, secret)
+        elif key in NAME_KEYS and isinstance(value, str):
+            result[key] = "x" * len(value)
+        elif key in TEXT_KEYS and isinstance(value, str):
+            result[key] = mask_text(value)
+        else:
+            result[key] = anonymize(value, secret)
+    return result
+
+
+class UpdateRecorderMiddleware(BaseMiddleware):
+    """Outer update middleware appending anonymized updates with their timing."""
+
+    def __init__(self, path: str = RECORD_UPDATES, secret: str | None = None):
+        self.path = path
+        self.secret = secret or getenv("RECORD_SECRET")
+        self.file = open(path, "a", encoding="utf-8")  # noqa: SIM115
+        logger.info(f"Recording updates to {path}")
+
+    async def __call__(self, handler, event, data):
+        at = datetime.now(UTC)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            record = {
+                "at": at.isoformat(),
+                "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+                "update": anonymize(
+                    event.model_dump(mode="json", exclude_none=True, by_alias=True),
+                    self.secret,
+                ),
+            }
+            self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def anonymize_payload(payload: str, secret: str) -> str:
+    """Broadcast payloads reference the teacher's chat, see payload_from_messages."""
+    data = json.loads(payload)
+    data["from_chat_id"] = anonymous_id(data["from_chat_id"], secret)
+    return json.dumps(data)
+
+
+def anonymize_history(value: str, secret: str) -> str:
+    """`register` rows start with the Telegram id, see UserRepo.register."""
+    value = _HISTORY_TG_ID.sub(
+        lambda m: f"tg_id: {anonymous_id(int(m[1]), secret)}", value
+    )
+    return mask_text(value)
+
+
+def anonymize_database(source: str, target: str, secret: str):
+    """Copy of the bot database with the ids and names the recordings use."""
+    original, db = sqlite3.connect(source), sqlite3.connect(target)
+    original.backup(db)
+    original.close()
+    db.create_function("anon_id", 1, lambda i: i and anonymous_id(i, secret))
+    db.create_function("mask", 1, lambda s: s and "x" * len(s))
+    db.create_function("anon_history", 1, lambda s: s and anonymize_history(s, secret))
+    db.create_function("anon_payload", 1, lambda s: s and anonymize_payload(s, secret))
+    with db:
+        db.execute("UPDATE executors SET telegram_id = anon_id(telegram_id)")
+        db.execute(
+            "UPDATE users SET telegram_id = anon_id(telegram_id), "
+            "username = mask(username), full_name = mask(full_name)"
+        )
+        db.execute(
+            "UPDATE broadcasts SET status_chat_id = anon_id(status_chat_id), "
+            "author = mask(author), payload = anon_payload(payload)"
+        )
+        db.execute(
+            "UPDATE broadcast_recipients SET telegram_id = anon_id(telegram_id), "
+            "username = mask(username), error = NULL"
+        )
+        db.execute(
+            "UPDATE event_history SET author = mask(author), "
+            "event_value = anon_history(event_value)"
+        )
+    db.execute("VACUUM")
+    db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Anonymized copy of the database.")
+    parser.add_argument("source")
+    parser.add_argument("target")
+    args = parser.parse_args()
+    anonymize_database(args.source, args.target, getenv("RECORD_SECRET"))
+    print(f"{args.target} written")
+
+
+if __name__ == "__main__":
+    main()
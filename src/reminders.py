@@ -0,0 +1,255 @@
+import asyncio
+import heapq
+import itertools
+from dataclasses import dataclass, field, replace
+from datetime import date, datetime, timedelta
+
+from aiogram.exceptions import TelegramForbiddenError
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session
+
+from database import get_engine
+from logger import logger
+from src.bot import get_bot
+from src.core import logs
+from src.core.config import (
+    REMINDER_BEFORE,
+    REMINDER_HORIZON,
+    REMINDER_POLL_INTERVAL,
+    TIME_FMT,
+)
+from src.messages import replies
+from src.models import (
+    CancelledRecurrentEvent,
+    Event,
+    Executor,
+    RecurrentEvent,
+    ScheduleChange,
+    User,
+)
+from src.repositories import EventRepo, JobRunRepo
+from src.shards import shard_engines
+from src.utils import local_now
+
+REMINDERS_JOB = "reminders"
+
+
+def _as_date(value):
+    return value.date() if isinstance(value, datetime) else None
+
+
+def _changed_days(session: Session):
+    changes = set()
+    for obj in itertools.chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Event):
+            if obj.event_type == Event.EventTypes.VACATION:
+                changes.add((obj.executor_id, None))
+                continue
+            starts = [obj.start]
+            if obj not in session.new:
+                starts += inspect(obj).attrs.start.history.deleted
+            changes.update((obj.executor_id, _as_date(s)) for s in starts)
+        elif isinstance(obj, RecurrentEvent):
+            changes.add((obj.executor_id, None))
+        elif isinstance(obj, CancelledRecurrentEvent):
+            with session.no_autoflush:
+                recurrent = session.get(RecurrentEvent, obj.event_id)
+            if recurrent is not None:
+                changes.add((recurrent.executor_id, _as_date(obj.start)))
+    return changes
+
+
+def _record_schedule_changes(session: Session, _flush_context, _instances):
+    for executor_id, day in _changed_days(session):
+        if executor_id is not None:
+            session.add(ScheduleChange(executor_id=executor_id, day=day))
+
+
+def track_schedule_changes():
+    """Make every flush that touches lessons leave a `schedule_changes` row."""
+    if not event.contains(Session, "before_flush", _record_schedule_changes):
+        event.listen(Session, "before_flush", _record_schedule_changes)
+
+
+@dataclass(order=True)
+class Reminder:
+    remind_at: datetime
+    seq: int
+    executor_id: int = field(compare=False)
+    day: date = field(compare=False)
+    version: int = field(compare=False)
+    lesson_start: datetime = field(compare=False)
+    telegram_id: int = field(compare=False)
+    text: str = field(compare=False)
+
+    @property
+    def key(self):
+        return f"{self.telegram_id}:{self.lesson_start.isoformat(timespec='minutes')}"
+
+
+class ReminderService:
+    """
+    Sends "lesson starts soon" reminders to students and teachers.
+
+    Upcoming occurrences within the horizon are kept in a min-heap ordered by
+    reminder time and the service sleeps until the earliest one. Every
+    (executor, day) has a version: a schedule change rebuilds only the affected
+    days and bumps their version, stale heap entries are dropped when popped.
+    """
+
+    def __init__(
+        self,
+        before: timedelta = REMINDER_BEFORE,
+        horizon: timedelta = REMINDER_HORIZON,
+        poll_interval: timedelta = REMINDER_POLL_INTERVAL,
+    ):
+        self.before = before
+        self.horizon = horizon
+        self.poll_interval = poll_interval
+        self.heap: list[Reminder] = []
+        self.versions: dict[tuple[int, date], int] = {}
+        # Newest change seen, per database
+        self.last_change_id: dict[str, int] = {}
+        self._seq = itertools.count()
+
+    def build_day(self, db: Session, executor_id: int, day: date):
+        version = self.versions.get((executor_id, day), 0) + 1
+        self.versions[(executor_id, day)] = version
+        executor = db.get(Executor, executor_id)
+        roster = {
+            u.id: u for u in db.query(User).filter(User.executor_id == executor_id)
+        }
+        if executor is None or executor.telegram_id not in {
+            u.telegram_id for u in roster.values()
+        }:
+            return
+        minutes = int(self.before.total_seconds() // 60)
+        for start, _end, user_id, event_type, *_ in EventRepo(db).day_schedule(
+            executor_id, day
+        ):
+            if event_type not in EventRepo.LESSON_TYPES:
+                continue
+            student = roster.get(user_id)
+            if student is None:
+                continue
+            name = student.username if student.username else student.full_name
+            start_str = datetime.strftime(start, TIME_FMT)
+            recipients = (
+                (student.telegram_id, replies.REMINDER % (minutes, start_str)),
+                (
+                    executor.telegram_id,
+                    replies.REMINDER_TEACHER % (name, minutes, start_str),
+                ),
+            )
+            for telegram_id, text in recipients:
+                reminder = Reminder(
+                    start - self.before,
+                    next(self._seq),
+                    executor_id,
+                    day,
+                    version,
+                    start,
+                    telegram_id,
+                    text,
+                )
+                heapq.heappush(self.heap, reminder)
+
+    def days(self, now: datetime):
+        last = (now + self.horizon).date()
+        day = now.date()
+        while day <= last:
+            yield day
+            day += timedelta(days=1)
+
+    def extend(self, db: Session, now: datetime):
+        """Build days entering the horizon, forget the ones that left it."""
+        days = set(self.days(now))
+        for key in [k for k in self.versions if k[1] not in days]:
+            del self.versions[key]
+        for (executor_id,) in db.query(Executor.id):
+            for day in days:
+                if (executor_id, day) not in self.versions:
+                    self.build_day(db, executor_id, day)
+
+    def poll_changes(self, db: Session, now: datetime):
+        database = str(db.get_bind().url)
+        changes = list(
+            db.query(ScheduleChange).filter(
+                ScheduleChange.id > self.last_change_id.get(database, 0)
+            )
+        )
+        if not changes:
+            return
+        self.last_change_id[database] = max(c.id for c in changes)
+        days = set(self.days(now))
+        affected = set()
+        for change in changes:
+            if change.day is None:
+                affected.update((change.executor_id, d) for d in days)
+            elif change.day in days:
+                affected.add((change.executor_id, change.day))
+        for executor_id, day in affected:
+            self.build_day(db, executor_id, day)
+        logger.info(logs.REMINDERS_REBUILT, len(affected))
+
+    async def send_due(self, now: datetime):
+        while self.heap and self.heap[0].remind_at <= now:
+            reminder = heapq.heappop(self.heap)
+            version = self.versions.get((reminder.executor_id, reminder.day))
+            if version != reminder.version or reminder.lesson_start <= now:
+                continue
+            try:
+                await self.send(reminder)
+            except Exception as e:
+                # Tried again after the poll interval, until the lesson starts
+                logger.warning(logs.REMINDER_FAILED, reminder.key, e)
+                heapq.heappush(
+                    self.heap,
+                    replace(
+                        reminder, remind_at=now + self.poll_interval, seq=next(self._seq)
+                    ),
+                )
+
+    @staticmethod
+    async def send(reminder: Reminder):
+        with Session(get_engine()) as db:
+            if not JobRunRepo(db).claim(REMINDERS_JOB, reminder.key):
+                return
+        try:
+            await get_bot().send_message(reminder.telegram_id, reminder.text)
+        except TelegramForbiddenError as e:
+            # Blocked the bot, retrying will not help
+            logger.warning(logs.REMINDER_BLOCKED, reminder.telegram_id, e)
+        except Exception:
+            with Session(get_engine()) as db:
+                JobRunRepo(db).release(REMINDERS_JOB, reminder.key)
+            raise
+        with Session(get_engine()) as db:
+            JobRunRepo(db).finish(REMINDERS_JOB, reminder.key)
+
+    async def start(self):
+        logger.info(logs.REMINDERS_START)
+        for engine in shard_engines():
+            with Session(engine) as db:
+                self.last_change_id[str(engine.url)] = (
+                    db.query(func.max(ScheduleChange.id)).scalar() or 0
+                )
+        current_day = None
+        while True:
+            now = local_now()
+            new_day = now.date() != current_day
+            current_day = now.date()
+            for engine in shard_engines():
+                with Session(engine) as db:
+                    if new_day:
+                        self.extend(db, now)
+                    self.poll_changes(db, now)
+            await self.send_due(now)
+
+            wake_up = now + self.poll_interval
+            if self.heap:
+                wake_up = min(wake_up, self.heap[0].remind_at)
+            await asyncio.sleep(max((wake_up - local_now()).total_seconds(), 0))
+
+
+reminders = ReminderService()
@@ -1,11 +1,12 @@
 from datetime import date, datetime, time, timedelta
 
-from sqlalchemy import bindparam, text
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
+from src import clock
 from src.core.config import (
     CHANGE_DELTA,
-    DB_DATETIME,
     LESSON_SIZE,
     MAX_LESSONS_PER_DAY,
     SLOT_SIZE,
@@ -17,9 +18,12 @@ from src.models import (
     Event,
     EventHistory,
     Executor,
+    JobRun,
+    NotificationSetting,
     RecurrentEvent,
     User,
 )
+from src.shards import forget
 
 HISTORY_MAP = {
     "help": "запросил помощь",
@@ -30,6 +34,7 @@ HISTORY_MAP = {
     "added_vacation": "добавил каникулы",
     "recur_lesson_deleted": "разово отменил урок",
     "recur_lesson_moved": "разово перенёс урок",
+    "notification_time": "изменил время напоминаний на",
 }
 
 
@@ -95,12 +100,17 @@ class UserRepo(Repo):
         )
         events = self.db.query(Event).filter(Event.user_id == user_id)
         username = user.username if user.username else user.full_name
+        telegram_id = user.telegram_id
         history = self.db.query(EventHistory).filter(EventHistory.author == username)
         event_breaks = self.db.query(CancelledRecurrentEvent).filter(
             CancelledRecurrentEvent.event_id.in_([re.id for re in recur_events])
         )
+        settings = self.db.query(NotificationSetting).filter(
+            NotificationSetting.user_id == user_id
+        )
         for e in (
             list(event_breaks)
+            + list(settings)
             + list(history)
             + list(recur_events)
             + list(events)
@@ -108,6 +118,7 @@ class UserRepo(Repo):
         ):
             self.db.delete(e)
         self.db.commit()
+        forget(telegram_id)
 
     def executor_telegram_id(self, user: User):
         executor = self.db.get(Executor, user.executor_id)
@@ -120,6 +131,18 @@ class UserRepo(Repo):
         )
         return executor, exec_user
 
+    def set_notification_time(self, user: User, notification_time: time):
+        setting = (
+            self.db.query(NotificationSetting)
+            .filter(NotificationSetting.user_id == user.id)
+            .first()
+        )
+        if setting is None:
+            setting = NotificationSetting(user_id=user.id)
+        setting.time = notification_time
+        self.db.add(setting)
+        self.db.commit()
+
 
 class EventHistoryRepo(Repo):
     def create(self, author: str, scene: str, event_type: str, event_value: str):
@@ -134,17 +157,53 @@ class EventHistoryRepo(Repo):
 
     def user_history(self, username: str):
         events = self.db.execute(
-            text("""
-                select created_at, scene, event_type, event_value from event_history
-                where author = :author
-                order by created_at desc
-                limit 10
-            """),
-            {"author": username},
+            select(
+                EventHistory.created_at,
+                EventHistory.scene,
+                EventHistory.event_type,
+                EventHistory.event_value,
+            )
+            .where(EventHistory.author == username)
+            .order_by(EventHistory.created_at.desc())
+            .limit(10)
         )
         return list(events)
 
 
+class JobRunRepo(Repo):
+    def claim(self, job: str, key: str):
+        """Insert the run record first, a second claim of the same run fails."""
+        self.db.add(JobRun(job=job, key=key))
+        try:
+            self.db.commit()
+        except IntegrityError:
+            self.db.rollback()
+            return False
+        return True
+
+    def finish(self, job: str, key: str):
+        run = (
+            self.db.query(JobRun).filter(JobRun.job == job, JobRun.key == key).one()
+        )
+        run.finished_at = clock.now()
+        self.db.commit()
+
+    def release(self, job: str, key: str):
+        self.db.query(JobRun).filter(JobRun.job == job, JobRun.key == key).delete()
+        self.db.commit()
+
+    def release_unfinished(self):
+        """Runs interrupted by a shutdown are retried by the catch-up."""
+        self.db.query(JobRun).filter(JobRun.finished_at.is_(None)).delete()
+        self.db.commit()
+
+    def keys(self, job: str, prefix: str):
+        query = self.db.query(JobRun.key).filter(
+            JobRun.job == job, JobRun.key.like(f"{prefix}%")
+        )
+        return {key for (key,) in query}
+
+
 class EventRepo(Repo):
     LESSON_TYPES = (
         Event.EventTypes.LESSON,
@@ -156,7 +215,7 @@ class EventRepo(Repo):
     def _will_overlap(
         recurrent_start, recurrent_end, interval_days, simple_start, simple_end
     ):
-        now = datetime.now()
+        now = clock.now()
         if simple_start < now:
             return False
         occurrence_start = recurrent_start
@@ -172,39 +231,53 @@ class EventRepo(Repo):
         return False
 
     def _events_executor(self, executor_id: int):
-        today = datetime.now().date()
+        today = datetime.combine(clock.now().date(), time())
         return list(
             self.db.execute(
-                text("""
-                        select start, end, user_id, event_type, is_reschedule, id from events
-                        where executor_id = :executor_id and start >= :today and cancelled is false
-                        order by start
-                """),
-                {"executor_id": executor_id, "today": today},
+                select(
+                    Event.start,
+                    Event.end,
+                    Event.user_id,
+                    Event.event_type,
+                    Event.is_reschedule,
+                    Event.id,
+                )
+                .where(
+                    Event.executor_id == executor_id,
+                    Event.start >= today,
+                    Event.cancelled.is_(False),
+                )
+                .order_by(Event.start)
             ),
         )
 
     def _recurrent_events_executor(self, executor_id: int):
         return list(
             self.db.execute(
-                text("""
-                        select start, end, user_id, event_type, interval, interval_end, id from recurrent_events
-                        where executor_id = :executor_id
-                        order by start
-                """),
-                {"executor_id": executor_id},
+                select(
+                    RecurrentEvent.start,
+                    RecurrentEvent.end,
+                    RecurrentEvent.user_id,
+                    RecurrentEvent.event_type,
+                    RecurrentEvent.interval,
+                    RecurrentEvent.interval_end,
+                    RecurrentEvent.id,
+                )
+                .where(RecurrentEvent.executor_id == executor_id)
+                .order_by(RecurrentEvent.start)
             ),
         )
 
     def recurrent_events_cancels(self, events: list[tuple]):
         if events:
             event_ids = [e[-1] for e in events]
-            stmt = text("""
-                SELECT event_id, break_type, start, end 
-                FROM event_breaks
-                WHERE event_id IN :event_ids
-            """).bindparams(bindparam("event_ids", expanding=True))
-            return list(self.db.execute(stmt, {"event_ids": event_ids}))
+            stmt = select(
+                CancelledRecurrentEvent.event_id,
+                CancelledRecurrentEvent.break_type,
+                CancelledRecurrentEvent.start,
+                CancelledRecurrentEvent.end,
+            ).where(CancelledRecurrentEvent.event_id.in_(event_ids))
+            return list(self.db.execute(stmt))
         return []
 
     def recurrent_events(self, executor_id: int):
@@ -219,9 +292,6 @@ class EventRepo(Repo):
             start_dt, end_dt, user_id, event_type, interval, interval_end, event_id = (
                 event
             )
-            start_dt = datetime.strptime(start_dt, DB_DATETIME)
-            end_dt = datetime.strptime(end_dt, DB_DATETIME)
-
             # Skip if event recurrence has ended before our target date
             if interval_end and interval_end.date() < day:
                 continue
@@ -240,8 +310,6 @@ class EventRepo(Repo):
                 is_cancelled = False
                 for cancel in cancels:
                     c_event_id, break_type, c_start, c_end = cancel
-                    c_start = datetime.strptime(c_start, DB_DATETIME)
-                    c_end = datetime.strptime(c_end, DB_DATETIME)
 
                     # Skip if cancellation is for a different event
                     if c_event_id != event_id:
@@ -264,34 +332,30 @@ class EventRepo(Repo):
         day_start = datetime.combine(day, start)
         day_end = datetime.combine(day, end) + timedelta(minutes=1)
         events = self.db.execute(
-            text("""
-            select start, end, user_id, event_type, is_reschedule from events
-            where executor_id = :executor_id and start >= :day_start and end <= :day_end and cancelled is false
-            order by start desc
-        """),
-            {"executor_id": executor_id, "day_start": day_start, "day_end": day_end},
+            select(
+                Event.start, Event.end, Event.user_id, Event.event_type, Event.is_reschedule
+            )
+            .where(
+                Event.executor_id == executor_id,
+                Event.start >= day_start,
+                Event.end <= day_end,
+                Event.cancelled.is_(False),
+            )
+            .order_by(Event.start.desc())
         )
-        result = []
-        for e in events:
-            start_dt = datetime.strptime(e[0], DB_DATETIME)
-            end_dt = datetime.strptime(e[1], DB_DATETIME)
-            result.append((start_dt, end_dt, *e[2:]))
-        return result
+        return [tuple(e) for e in events]
 
     def get_users_with_vacations(self, events: list, day: date):
         user_ids = [e[2] for e in events]
-        query = text("""
-                    select start, end, user_id from events
-                    where user_id in :user_ids and event_type = :event_type and start <= :today and end >= :today
-                """).bindparams(bindparam("user_ids", expanding=True))
+        today = datetime.combine(day, clock.now().time())
         vacations = list(
             self.db.execute(
-                query,
-                {
-                    "user_ids": user_ids,
-                    "event_type": Event.EventTypes.VACATION,
-                    "today": datetime.combine(day, datetime.now().time()),
-                },
+                select(Event.start, Event.end, Event.user_id).where(
+                    Event.user_id.in_(user_ids),
+                    Event.event_type == Event.EventTypes.VACATION,
+                    Event.start <= today,
+                    Event.end >= today,
+                )
             ),
         )
         return [v[2] for v in vacations]
@@ -314,7 +378,7 @@ class EventRepo(Repo):
         return events
 
     def available_weekdays(self, executor_id: int):
-        start_of_week = datetime.now().date() - timedelta(days=datetime.now().weekday())
+        start_of_week = clock.now().date() - timedelta(days=clock.now().weekday())
         result = []
         start_t, end_t = (
             self.get_work_start(executor_id)[0],
@@ -327,7 +391,7 @@ class EventRepo(Repo):
         )
         for i in range(7):
             current_day = start_of_week + timedelta(days=i)
-            if current_day < datetime.now().date():
+            if current_day < clock.now().date():
                 current_day += timedelta(days=7)
             events = self.recurrent_events_for_day(executor_id, current_day)
             lessons = [e for e in events if e[3] in lesson_types]
@@ -365,7 +429,7 @@ class EventRepo(Repo):
         )
         start = datetime.combine(day, start)
         end = datetime.combine(day, end)
-        now = datetime.now()
+        now = clock.now()
         result = []
         for slot in self._get_available_slots(start, end, SLOT_SIZE, events):
             if day == now.date() and now + CHANGE_DELTA > slot[0]:
@@ -388,9 +452,6 @@ class EventRepo(Repo):
             start_dt, end_dt, user_id, event_type, interval, interval_end, event_id = (
                 event
             )
-            start_dt = datetime.strptime(start_dt, DB_DATETIME)
-            end_dt = datetime.strptime(end_dt, DB_DATETIME)
-
             # Skip if event recurrence has ended before our reference date
             if interval_end and interval_end.date() < reference_date:
                 continue
@@ -406,7 +467,7 @@ class EventRepo(Repo):
         return result
 
     def available_time_weekday(self, executor_id: int, weekday: int):
-        start_of_week = datetime.now().date() - timedelta(days=datetime.now().weekday())
+        start_of_week = clock.now().date() - timedelta(days=clock.now().weekday())
         current_day = start_of_week + timedelta(days=weekday)
 
         # mb use recurrent_events_for_weekday_without_cancels here
@@ -418,13 +479,12 @@ class EventRepo(Repo):
         )
         start = datetime.combine(current_day, start)
         end = datetime.combine(current_day, end)
-        now = datetime.now()
+        now = clock.now()
 
         # Collect one-time lessons with their full time range (start, end) per weekday
         simple_lessons = {}
         for s in self._events_executor(executor_id):
-            start_t = datetime.strptime(s[0], DB_DATETIME)
-            end_t = datetime.strptime(s[1], DB_DATETIME)
+            start_t, end_t = s[0], s[1]
             weekday_t = start_t.weekday()
             if s[3] in self.LESSON_TYPES and start_t > now:
                 if weekday_t not in simple_lessons:
@@ -470,16 +530,7 @@ class EventRepo(Repo):
         def is_occupied(slot):
             slot_start, slot_end = slot
             for occupied in events:
-                occupied_start = (
-                    datetime.strptime(occupied[0], DB_DATETIME)
-                    if isinstance(occupied[0], str)
-                    else occupied[0]
-                )
-                occupied_end = (
-                    datetime.strptime(occupied[1], DB_DATETIME)
-                    if isinstance(occupied[1], str)
-                    else occupied[1]
-                )
+                occupied_start, occupied_end = occupied[0], occupied[1]
                 if not (slot_end <= occupied_start or slot_start >= occupied_end):
                     return True  # The slot is occupied
             return False  # The slot is available
@@ -570,20 +621,16 @@ class EventRepo(Repo):
     def available_work_weekdays(self, executor_id: int):
         weekends = []
         for weekend in self.weekends(executor_id):
-            if not isinstance(weekend.start, datetime):
-                start = datetime.strptime(weekend.start, DB_DATETIME)
-            else:
-                start = weekend.start
-            weekends.append(start.weekday())
+            weekends.append(weekend.start.weekday())
         return [i for i in range(7) if i not in weekends]
 
     def vacations(self, user_id: int):
         events = self.db.execute(
-            text("""
-                select start, end, id from events
-                where user_id = :user_id and event_type = :vacation and cancelled is false
-            """),
-            {"user_id": user_id, "vacation": Event.EventTypes.VACATION},
+            select(Event.start, Event.end, Event.id).where(
+                Event.user_id == user_id,
+                Event.event_type == Event.EventTypes.VACATION,
+                Event.cancelled.is_(False),
+            )
         )
         return list(events)
 
@@ -592,12 +639,27 @@ class EventRepo(Repo):
         if not events:
             return False
         for event in events:
-            start = datetime.strptime(event.start, DB_DATETIME)
-            end = datetime.strptime(event.end, DB_DATETIME)
-            if start.date() <= day <= end.date():
+            if event.start.date() <= day <= event.end.date():
                 return True
         return False
 
+    def users_on_vacation(self, user_ids: list[int], day: date):
+        """Same check as `vacations_day`, for many users in one query."""
+        if not user_ids:
+            return set()
+        events = self.db.execute(
+            select(Event.start, Event.end, Event.user_id).where(
+                Event.user_id.in_(user_ids),
+                Event.event_type == Event.EventTypes.VACATION,
+                Event.cancelled.is_(False),
+            )
+        )
+        result = set()
+        for event in events:
+            if event.start.date() <= day <= event.end.date():
+                result.add(event.user_id)
+        return result
+
     def work_breaks(self, executor_id: int):
         events = self._recurrent_events_executor(executor_id)
         if events:
@@ -622,14 +684,10 @@ class EventRepo(Repo):
 
         weekdays = {}
         for re in rec_events:
-            dt = datetime.strptime(re.start, DB_DATETIME)
-            weekday = dt.weekday()
+            weekday = re.start.weekday()
             if weekday not in weekdays:
                 weekdays[weekday] = []
-            start, end = (
-                datetime.strptime(re.start, DB_DATETIME),
-                datetime.strptime(re.end, DB_DATETIME),
-            )
+            start, end = re.start, re.end
             if re.id in cancel_map:
                 cancel = cancel_map[re.id][0]  # len 7
                 weekdays[weekday].append(
@@ -649,14 +707,10 @@ class EventRepo(Repo):
                 )  # len 5
 
         for event in events:
-            dt = datetime.strptime(event.start, DB_DATETIME)
-            weekday = dt.weekday()
+            weekday = event.start.weekday()
             if weekday not in weekdays:
                 weekdays[weekday] = []
-            start, end = (
-                datetime.strptime(event.start, DB_DATETIME),
-                datetime.strptime(event.end, DB_DATETIME),
-            )
+            start, end = event.start, event.end
             # len 6
             weekdays[weekday].append(
                 (
@@ -682,12 +736,12 @@ class EventRepo(Repo):
                     if len(event1) == 7:
                         if len(event2) == 6:
                             e2_start, e2_end = (
-                                datetime.combine(event2[4], event2[0]),
-                                datetime.combine(event2[4], event2[1]),
+                                datetime.combine(event2[5], event2[0]),
+                                datetime.combine(event2[5], event2[1]),
                             )
                             c_start, c_end = (
-                                datetime.combine(event2[4], event1[0]),
-                                datetime.combine(event2[4], event1[1]),
+                                datetime.combine(event2[5], event1[0]),
+                                datetime.combine(event2[5], event1[1]),
                             )
                             if (
                                 c_start <= e2_start <= c_end
@@ -700,6 +754,30 @@ class EventRepo(Repo):
 
         return overlaps
 
+    def _overlaps_recurrent(self, overlaps: list[tuple]) -> dict[int, RecurrentEvent]:
+        # One-off events (len 6) carry an Event id, not a RecurrentEvent id
+        re_ids = [ov[3] for overlap in overlaps for ov in overlap if len(ov) != 6]
+        return {
+            re.id: re
+            for re in self.db.query(RecurrentEvent).filter(
+                RecurrentEvent.id.in_(re_ids)
+            )
+        }
+
+    @staticmethod
+    def _overlap_weekday(ov: tuple, rec_map: dict[int, RecurrentEvent]) -> str:
+        day = ov[5] if len(ov) == 6 else rec_map[ov[3]].start
+        return WEEKDAY_MAP[day.weekday()]["long"]
+
+    @staticmethod
+    def _overlap_time(
+        ov: tuple, rec_map: dict[int, RecurrentEvent], at_end: bool
+    ) -> str:
+        if len(ov) == 6:
+            return ov[1 if at_end else 0].strftime(TIME_FMT)
+        event = rec_map[ov[3]]
+        return datetime.strftime(event.end if at_end else event.start, TIME_FMT)
+
     def overlaps_text(self, overlaps: list[tuple]):
         texts = []
         user_overlap_map = {}
@@ -714,15 +792,7 @@ class EventRepo(Repo):
             for u in users_affected
             if u.role == User.Roles.STUDENT
         }
-        re_ids = [e[0][3] for e in overlaps if len(e) != 6] + [
-            e[1][3] for e in overlaps if len(e) != 6
-        ]
-        rec_map = {
-            re.id: re
-            for re in self.db.query(RecurrentEvent).filter(
-                RecurrentEvent.id.in_(re_ids)
-            )
-        }
+        rec_map = self._overlaps_recurrent(overlaps)
 
         for overlap in overlaps:
             ov1, ov2 = overlap[0], overlap[1]
@@ -735,36 +805,28 @@ class EventRepo(Repo):
             if len(ov2t.split(":")) == 3:
                 ov2t = ov2t[:-3]
             if ov1[4] == RecurrentEvent.EventTypes.WORK_BREAK:
-                weekday = rec_map[ov1[3]].start.weekday()
-                weekday = WEEKDAY_MAP[weekday]["long"]
+                weekday = self._overlap_weekday(ov1, rec_map)
                 row_text = f"{ov2[4]} в {ov2t} у {users_map[ov2[2]]} стоит в перерыв ({weekday})"
             elif ov2[4] == RecurrentEvent.EventTypes.WORK_BREAK:
-                weekday = rec_map[ov2[3]].start.weekday()
-                weekday = WEEKDAY_MAP[weekday]["long"]
+                weekday = self._overlap_weekday(ov2, rec_map)
                 row_text = f"{ov1[4]} в {ov1t} у {users_map[ov1[2]]} стоит в перерыв ({weekday})"
             elif ov1[4] == RecurrentEvent.EventTypes.WEEKEND:
-                weekday = rec_map[ov1[3]].start.weekday()
-                weekday = WEEKDAY_MAP[weekday]["long"]
+                weekday = self._overlap_weekday(ov1, rec_map)
                 row_text = f"{ov2[4]} в {ov2t} у {users_map[ov2[2]]} стоит в выходной ({weekday})"
             elif ov2[4] == RecurrentEvent.EventTypes.WEEKEND:
-                weekday = rec_map[ov2[3]].start.weekday()
-                weekday = WEEKDAY_MAP[weekday]["long"]
+                weekday = self._overlap_weekday(ov2, rec_map)
                 row_text = f"{ov1[4]} в {ov1t} у {users_map[ov1[2]]} стоит в выходной ({weekday})"
             elif ov1[4] == RecurrentEvent.EventTypes.WORK_START:
-                work_start = rec_map[ov1[3]].end
-                work_start = datetime.strftime(work_start, TIME_FMT)
+                work_start = self._overlap_time(ov1, rec_map, at_end=True)
                 row_text = f"{ov2[4]} в {ov2t} у {users_map[ov2[2]]} стоит до начала работы учителя ({work_start})"
             elif ov2[4] == RecurrentEvent.EventTypes.WORK_START:
-                work_start = rec_map[ov2[3]].end
-                work_start = datetime.strftime(work_start, TIME_FMT)
+                work_start = self._overlap_time(ov2, rec_map, at_end=True)
                 row_text = f"{ov1[4]} в {ov1t} у {users_map[ov1[2]]} стоит до начала работы учителя ({work_start})"
             elif ov1[4] == RecurrentEvent.EventTypes.WORK_END:
-                work_end = rec_map[ov2[3]].start
-                work_end = datetime.strftime(work_end, TIME_FMT)
+                work_end = self._overlap_time(ov1, rec_map, at_end=False)
                 row_text = f"{ov2[4]} в {ov2t} у {users_map[ov2[2]]} стоит после конца работы учителя ({work_end})"
             elif ov2[4] == RecurrentEvent.EventTypes.WORK_END:
-                work_end = rec_map[ov2[3]].start
-                work_end = datetime.strftime(work_end, TIME_FMT)
+                work_end = self._overlap_time(ov2, rec_map, at_end=False)
                 row_text = f"{ov1[4]} в {ov1t} у {users_map[ov1[2]]} стоит после конца работы учителя ({work_end})"
             elif (
                 ov1[4] == Event.EventTypes.VACATION
@@ -790,15 +852,7 @@ class EventRepo(Repo):
             for u in users_affected
             if u.role == User.Roles.STUDENT
         }
-        re_ids = [e[0][3] for e in overlaps if len(e) != 6] + [
-            e[1][3] for e in overlaps if len(e) != 6
-        ]
-        rec_map = {
-            re.id: re
-            for re in self.db.query(RecurrentEvent).filter(
-                RecurrentEvent.id.in_(re_ids)
-            )
-        }
+        rec_map = self._overlaps_recurrent(overlaps)
         messages = {}
         for overlap in overlaps:
             ov1, ov2 = overlap[0], overlap[1]
@@ -811,56 +865,52 @@ class EventRepo(Repo):
             if len(ov2t.split(":")) == 3:
                 ov2t = ov2t[:-3]
             if ov1[4] == RecurrentEvent.EventTypes.WORK_BREAK:
-                weekday = rec_map[ov1[3]].start.weekday()
-                weekday = WEEKDAY_MAP[weekday]["long"]
+                weekday = self._overlap_weekday(ov1, rec_map)
                 row_text = f"{ov2[4]} в {ov2t} стоит в перерыв ({weekday})"
-                user_tg = users_map[ov2[2]][1]
+                student = ov2[2]
             elif ov2[4] == RecurrentEvent.EventTypes.WORK_BREAK:
-                weekday = rec_map[ov2[3]].start.weekday()
-                weekday = WEEKDAY_MAP[weekday]["long"]
+                weekday = self._overlap_weekday(ov2, rec_map)
                 row_text = f"{ov1[4]} в {ov1t} стоит в перерыв ({weekday})"
-                user_tg = users_map[ov1[2]][1]
+                student = ov1[2]
             elif ov1[4] == RecurrentEvent.EventTypes.WEEKEND:
-                weekday = rec_map[ov1[3]].start.weekday()
-                weekday = WEEKDAY_MAP[weekday]["long"]
+                weekday = self._overlap_weekday(ov1, rec_map)
                 row_text = f"{ov2[4]} в {ov2t} стоит в выходной ({weekday})"
-                user_tg = users_map[ov2[2]][1]
+                student = ov2[2]
             elif ov2[4] == RecurrentEvent.EventTypes.WEEKEND:
-                weekday = rec_map[ov2[3]].start.weekday()
-                weekday = WEEKDAY_MAP[weekday]["long"]
+                weekday = self._overlap_weekday(ov2, rec_map)
                 row_text = f"{ov1[4]} в {ov1t} стоит в выходной ({weekday})"
-                user_tg = users_map[ov1[2]][1]
+                student = ov1[2]
             elif ov1[4] == RecurrentEvent.EventTypes.WORK_START:
-                work_start = rec_map[ov1[3]].end
-                work_start = datetime.strftime(work_start, TIME_FMT)
+                work_start = self._overlap_time(ov1, rec_map, at_end=True)
                 row_text = (
                     f"{ov2[4]} в {ov2t} стоит до начала работы учителя ({work_start})"
                 )
-                user_tg = users_map[ov2[2]][1]
+                student = ov2[2]
             elif ov2[4] == RecurrentEvent.EventTypes.WORK_START:
-                work_start = rec_map[ov2[3]].end
-                work_start = datetime.strftime(work_start, TIME_FMT)
+                work_start = self._overlap_time(ov2, rec_map, at_end=True)
                 row_text = (
                     f"{ov1[4]} в {ov1t} стоит до начала работы учителя ({work_start})"
                 )
-                user_tg = users_map[ov1[2]][1]
+                student = ov1[2]
             elif ov1[4] == RecurrentEvent.EventTypes.WORK_END:
-                work_end = rec_map[ov2[3]].start
-                work_end = datetime.strftime(work_end, TIME_FMT)
+                work_end = self._overlap_time(ov1, rec_map, at_end=False)
                 row_text = (
                     f"{ov2[4]} в {ov2t} стоит после конца работы учителя ({work_end})"
                 )
-                user_tg = users_map[ov2[2]][1]
+                student = ov2[2]
             elif ov2[4] == RecurrentEvent.EventTypes.WORK_END:
-                work_end = rec_map[ov2[3]].start
-                work_end = datetime.strftime(work_end, TIME_FMT)
+                work_end = self._overlap_time(ov2, rec_map, at_end=False)
                 row_text = (
                     f"{ov1[4]} в {ov1t} стоит после конца работы учителя ({work_end})"
                 )
-                user_tg = users_map[ov1[2]][1]
+                student = ov1[2]
             else:
                 continue
 
+            # E.g. a one-off break over a weekend, no student to tell
+            if student not in users_map:
+                continue
+            user_tg = users_map[student][1]
             if user_tg not in messages:
                 messages[user_tg] = []
             messages[user_tg].append(row_text)
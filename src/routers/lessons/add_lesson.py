@@ -7,6 +7,8 @@ from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import CallbackQuery, Message
 from sqlalchemy.orm import Session
 
+from src import clock
+from src.callbacks import Callback
 from src.core import config
 from src.core.config import TIME_FMT
 from src.keyboards import Commands, Keyboards
@@ -19,6 +21,7 @@ from src.utils import (
     find_lesson_blocks,
     get_callback_arg,
     parse_date,
+    respond,
     send_message,
     telegram_checks,
 )
@@ -61,7 +64,7 @@ async def choose_date(message: Message, state: FSMContext, db: Session) -> None:
     await state.update_data(day=date)
 
     day = date.date()
-    today = datetime.now().date()
+    today = clock.now().date()
     if today > day:
         await state.set_state(AddLesson.choose_date)
         await message.answer(replies.CHOOSE_FUTURE_DATE)
@@ -80,9 +83,9 @@ async def choose_date(message: Message, state: FSMContext, db: Session) -> None:
         await state.clear()
 
 
-@router.callback_query(F.data.startswith(AddLesson.choose_time))
+@router.callback_query(Callback(AddLesson.choose_time))
 async def choose_time(callback: CallbackQuery, state: FSMContext, db: Session) -> None:
-    message = telegram_checks(callback)
+    telegram_checks(callback)
     state_data = await state.get_data()
     user = UserRepo(db).get_by_telegram_id(state_data["user_id"], True)
 
@@ -101,7 +104,7 @@ async def choose_time(callback: CallbackQuery, state: FSMContext, db: Session) -
     )
     db.add(lesson)
     db.commit()
-    await message.answer(replies.LESSON_ADDED)
+    await respond(callback, replies.LESSON_ADDED)
     username = user.username if user.username else user.full_name
     EventHistoryRepo(db).create(username, AddLesson.scene, "added_lesson", str(lesson))
     executor, exec_user = UserRepo(db).users_executor(user)
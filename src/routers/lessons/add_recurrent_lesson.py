@@ -7,6 +7,8 @@ from aiogram.fsm.state import StatesGroup
 from aiogram.types import CallbackQuery, Message
 from sqlalchemy.orm import Session
 
+from src import clock
+from src.callbacks import Callback
 from src.core.config import LESSON_SIZE, TIME_FMT
 from src.keyboards import Commands, Keyboards
 from src.messages import replies
@@ -17,6 +19,7 @@ from src.utils import (
     find_before_block_slot,
     find_lesson_blocks,
     get_callback_arg,
+    respond,
     send_message,
     telegram_checks,
 )
@@ -48,22 +51,23 @@ async def add_lesson_handler(message: Message, state: FSMContext, db: Session) -
     )
 
 
-@router.callback_query(F.data.startswith(AddRecurrentLesson.choose_weekday))
+@router.callback_query(Callback(AddRecurrentLesson.choose_weekday))
 async def choose_weekday(
     callback: CallbackQuery, state: FSMContext, db: Session
 ) -> None:
-    message = telegram_checks(callback)
+    telegram_checks(callback)
     state_data = await state.get_data()
     user = UserRepo(db).get_by_telegram_id(state_data["user_id"], True)
 
     weekday = int(get_callback_arg(callback.data, AddRecurrentLesson.choose_weekday))
     available_time = EventRepo(db).available_time_weekday(user.executor_id, weekday)
     if not available_time:
-        await message.answer(replies.NO_TIME)
+        await respond(callback, replies.NO_TIME)
         await state.clear()
         return
     await state.update_data(weekday=weekday)
-    await message.answer(
+    await respond(
+        callback,
         replies.CHOOSE_TIME,
         reply_markup=Keyboards.choose_time(
             available_time, AddRecurrentLesson.choose_time
@@ -71,13 +75,13 @@ async def choose_weekday(
     )
 
 
-@router.callback_query(F.data.startswith(AddRecurrentLesson.choose_time))
+@router.callback_query(Callback(AddRecurrentLesson.choose_time))
 async def choose_time(callback: CallbackQuery, state: FSMContext, db: Session) -> None:
-    message = telegram_checks(callback)
+    telegram_checks(callback)
     state_data = await state.get_data()
     user = UserRepo(db).get_by_telegram_id(state_data["user_id"], True)
 
-    now = datetime.now()
+    now = clock.now()
     time = datetime.strptime(
         get_callback_arg(callback.data, AddRecurrentLesson.choose_time), "%H:%M"
     ).time()
@@ -97,7 +101,7 @@ async def choose_time(callback: CallbackQuery, state: FSMContext, db: Session) -
     db.add(lesson)
     db.commit()
     username = user.username if user.username else user.full_name
-    await message.answer(replies.LESSON_ADDED)
+    await respond(callback, replies.LESSON_ADDED)
     EventHistoryRepo(db).create(
         username, AddRecurrentLesson.scene, "added_lesson", str(lesson)
     )
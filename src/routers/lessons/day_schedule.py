@@ -1,5 +1,3 @@
-from datetime import datetime
-
 from aiogram import F, Router
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
@@ -7,6 +5,7 @@ from aiogram.fsm.state import StatesGroup
 from aiogram.types import Message
 from sqlalchemy.orm import Session
 
+from src import clock
 from src.keyboards import Commands
 from src.messages import replies
 from src.middlewares import DatabaseMiddleware
@@ -33,7 +32,7 @@ async def add_lesson_handler(message: Message, state: FSMContext, db: Session) -
 
     lessons = EventRepo(db).day_schedule(
         user.executor_id,
-        datetime.now().date(),
+        clock.now().date(),
         None if user.role == User.Roles.TEACHER else user.id,
     )
     users_map = {
@@ -7,6 +7,8 @@ from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import CallbackQuery, Message
 from sqlalchemy.orm import Session
 
+from src import clock
+from src.callbacks import Callback
 from src.core import config
 from src.core.config import DATE_FMT, DATETIME_FMT, LESSON_SIZE, TIME_FMT, WEEKDAY_MAP
 from src.keyboards import Commands, Keyboards
@@ -19,6 +21,7 @@ from src.utils import (
     find_lesson_blocks,
     get_callback_arg,
     parse_date,
+    respond,
     send_message,
     telegram_checks,
 )
@@ -62,28 +65,29 @@ async def move_lesson_handler(message: Message, state: FSMContext, db: Session)
         await message.answer(replies.NO_LESSONS)
 
 
-@router.callback_query(F.data.startswith(MoveLesson.choose_lesson))
+@router.callback_query(Callback(MoveLesson.choose_lesson))
 async def choose_lesson(
     callback: CallbackQuery, state: FSMContext, db: Session
 ) -> None:
-    message = telegram_checks(callback)
+    telegram_checks(callback)
     state_data = await state.get_data()
     UserRepo(db).get_by_telegram_id(state_data["user_id"], True)
 
     await state.update_data(
         lesson=get_callback_arg(callback.data, MoveLesson.choose_lesson)
     )
-    await message.answer(
+    await respond(
+        callback,
         replies.MOVE_OR_DELETE,
         reply_markup=Keyboards.move_or_delete(MoveLesson.move_or_delete),
     )
 
 
-@router.callback_query(F.data.startswith(MoveLesson.move_or_delete))
+@router.callback_query(Callback(MoveLesson.move_or_delete))
 async def move_or_delete(
     callback: CallbackQuery, state: FSMContext, db: Session
 ) -> None:
-    message = telegram_checks(callback)
+    telegram_checks(callback)
     state_data = await state.get_data()
     user = UserRepo(db).get_by_telegram_id(state_data["user_id"], True)
 
@@ -94,28 +98,30 @@ async def move_or_delete(
         EventHistoryRepo(db).create(
             username, MoveLesson.scene, "deleted_one_lesson", str(lesson)
         )
-        await message.answer(replies.LESSON_DELETED)
+        await respond(callback, replies.LESSON_DELETED)
         executor_tg = UserRepo(db).executor_telegram_id(user)
         await send_message(executor_tg, f"{username} отменил(а) {lesson}")
         await state.clear()
         return
     if action == "delete" and state_data["lesson"].startswith("re"):
         await state.update_data(action=action)
-        await message.answer(
+        await respond(
+            callback,
             replies.DELETE_ONCE_OR_FOREVER,
             reply_markup=Keyboards.once_or_forever(MoveLesson.once_or_forever),
         )
     elif action == "move" and state_data["lesson"].startswith("e"):
         await state.set_state(MoveLesson.type_date)
-        await message.answer(replies.CHOOSE_LESSON_DATE)
+        await respond(callback, replies.CHOOSE_LESSON_DATE)
     elif action == "move" and state_data["lesson"].startswith("re"):
         await state.update_data(action=action)
-        await message.answer(
+        await respond(
+            callback,
             replies.MOVE_ONCE_OR_FOREVER,
             reply_markup=Keyboards.once_or_forever(MoveLesson.once_or_forever),
         )
     else:
-        await message.answer(replies.UNKNOWN_ACTION_ERR)
+        await respond(callback, replies.UNKNOWN_ACTION_ERR)
         await state.clear()
 
 
@@ -134,7 +140,7 @@ async def type_date(message: Message, state: FSMContext, db: Session) -> None:
         await state.set_state(MoveLesson.type_date)
         return
     day = day.date()
-    today = datetime.now().date()
+    today = clock.now().date()
     if today > day:
         await message.answer(replies.CHOOSE_FUTURE_DATE)
         if len(message.text) <= 7:
@@ -154,9 +160,9 @@ async def type_date(message: Message, state: FSMContext, db: Session) -> None:
         await state.clear()
 
 
-@router.callback_query(F.data.startswith(MoveLesson.choose_time))
+@router.callback_query(Callback(MoveLesson.choose_time))
 async def choose_time(callback: CallbackQuery, state: FSMContext, db: Session) -> None:
-    message = telegram_checks(callback)
+    telegram_checks(callback)
     state_data = await state.get_data()
     user = UserRepo(db).get_by_telegram_id(state_data["user_id"], True)
 
@@ -176,7 +182,7 @@ async def choose_time(callback: CallbackQuery, state: FSMContext, db: Session) -
     )
     db.add(new_lesson)
     db.commit()
-    await message.answer(replies.LESSON_MOVED)
+    await respond(callback, replies.LESSON_MOVED)
     username = user.username if user.username else user.full_name
     EventHistoryRepo(db).create(
         username,
@@ -237,28 +243,28 @@ async def choose_time(callback: CallbackQuery, state: FSMContext, db: Session) -
 # ---- RECURRENT LESSON ---- #
 
 
-@router.callback_query(F.data.startswith(MoveLesson.once_or_forever))
+@router.callback_query(Callback(MoveLesson.once_or_forever))
 async def once_or_forever(
     callback: CallbackQuery, state: FSMContext, db: Session
 ) -> None:
-    message = telegram_checks(callback)
+    telegram_checks(callback)
     state_data = await state.get_data()
     user = UserRepo(db).get_by_telegram_id(state_data["user_id"], True)
 
     mode = get_callback_arg(callback.data, MoveLesson.once_or_forever)
     if mode == "once" and state_data["action"] == "delete":
         await state.set_state(MoveLesson.type_recur_date)
-        await message.answer(replies.CHOOSE_CURRENT_LESSON_DATE)
+        await respond(callback, replies.CHOOSE_CURRENT_LESSON_DATE)
     elif mode == "forever" and state_data["action"] == "delete":
         lesson = db.get(RecurrentEvent, int(state_data["lesson"].replace("re", "")))
         if lesson is None:
-            await message.answer(replies.LESSON_NOT_FOUND_ERR)
+            await respond(callback, replies.LESSON_NOT_FOUND_ERR)
             await state.clear()
             return
         lesson_str = str(lesson)
         db.delete(lesson)
         db.commit()
-        await message.answer(replies.LESSON_DELETED)
+        await respond(callback, replies.LESSON_DELETED)
         username = user.username if user.username else user.full_name
         EventHistoryRepo(db).create(
             username, MoveLesson.scene, "deleted_recur_lesson", lesson_str
@@ -268,33 +274,35 @@ async def once_or_forever(
         await state.clear()
     elif mode == "once" and state_data["action"] == "move":
         await state.set_state(MoveLesson.type_recur_date)
-        await message.answer(replies.CHOOSE_CURRENT_LESSON_DATE)
+        await respond(callback, replies.CHOOSE_CURRENT_LESSON_DATE)
     elif mode == "forever" and state_data["action"] == "move":
         weekdays = EventRepo(db).available_weekdays(user.executor_id)
-        await message.answer(
+        await respond(
+            callback,
             replies.CHOOSE_WEEKDAY,
             reply_markup=Keyboards.weekdays(weekdays, MoveLesson.choose_weekday),
         )
     else:
-        await message.answer(replies.UNKNOWN_ACTION_ERR)
+        await respond(callback, replies.UNKNOWN_ACTION_ERR)
         await state.clear()
 
 
 # ---- RECURRENT LESSON MOVE FOREVER ---- #
 
 
-@router.callback_query(F.data.startswith(MoveLesson.choose_weekday))
+@router.callback_query(Callback(MoveLesson.choose_weekday))
 async def choose_weekday(
     callback: CallbackQuery, state: FSMContext, db: Session
 ) -> None:
-    message = telegram_checks(callback)
+    telegram_checks(callback)
     state_data = await state.get_data()
     user = UserRepo(db).get_by_telegram_id(state_data["user_id"], True)
 
     weekday = int(get_callback_arg(callback.data, MoveLesson.choose_weekday))
     await state.update_data(weekday=weekday)
     available_time = EventRepo(db).available_time_weekday(user.executor_id, weekday)
-    await message.answer(
+    await respond(
+        callback,
         replies.CHOOSE_TIME,
         reply_markup=Keyboards.choose_time(
             available_time, MoveLesson.choose_recur_time
@@ -302,16 +310,16 @@ async def choose_weekday(
     )
 
 
-@router.callback_query(F.data.startswith(MoveLesson.choose_recur_time))
+@router.callback_query(Callback(MoveLesson.choose_recur_time))
 async def choose_recur_time(
     callback: CallbackQuery, state: FSMContext, db: Session
 ) -> None:
-    message = telegram_checks(callback)
+    telegram_checks(callback)
     state_data = await state.get_data()
     user = UserRepo(db).get_by_telegram_id(state_data["user_id"], True)
 
     time = get_callback_arg(callback.data, MoveLesson.choose_recur_time)
-    now = datetime.now()
+    now = clock.now()
     start_of_week = now.date() - timedelta(days=now.weekday())
     current_day = start_of_week + timedelta(days=state_data["weekday"])
     start = datetime.combine(current_day, datetime.strptime(time, TIME_FMT).time())
@@ -330,7 +338,7 @@ async def choose_recur_time(
     old_lesson_str = str(old_lesson)
     db.delete(old_lesson)
     db.commit()
-    await message.answer(replies.LESSON_MOVED)
+    await respond(callback, replies.LESSON_MOVED)
     username = user.username if user.username else user.full_name
     EventHistoryRepo(db).create(
         username,
@@ -402,7 +410,7 @@ async def type_recur_date(message: Message, state: FSMContext, db: Session) -> N
         await state.set_state(MoveLesson.type_date)
         return
     day = day.date()
-    today = datetime.now().date()
+    today = clock.now().date()
     if today > day:
         await message.answer(replies.CHOOSE_FUTURE_DATE)
         if len(message.text) <= 7:
@@ -463,7 +471,7 @@ async def type_recur_new_date(message: Message, state: FSMContext, db: Session)
         await state.set_state(MoveLesson.type_date)
         return
     day = day.date()
-    today = datetime.now().date()
+    today = clock.now().date()
     if today > day:
         await message.answer(replies.CHOOSE_FUTURE_DATE)
         if len(message.text) <= 7:
@@ -485,11 +493,11 @@ async def type_recur_new_date(message: Message, state: FSMContext, db: Session)
         await state.clear()
 
 
-@router.callback_query(F.data.startswith(MoveLesson.choose_recur_new_time))
+@router.callback_query(Callback(MoveLesson.choose_recur_new_time))
 async def choose_recur_new_time(
     callback: CallbackQuery, state: FSMContext, db: Session
 ) -> None:
-    message = telegram_checks(callback)
+    telegram_checks(callback)
     state_data = await state.get_data()
     user = UserRepo(db).get_by_telegram_id(state_data["user_id"], True)
 
@@ -519,7 +527,7 @@ async def choose_recur_new_time(
     )
     db.add_all([lesson, cancel])
     db.commit()
-    await message.answer(replies.LESSON_MOVED)
+    await respond(callback, replies.LESSON_MOVED)
     username = user.username if user.username else user.full_name
     EventHistoryRepo(db).create(
         username,
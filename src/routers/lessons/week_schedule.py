@@ -7,13 +7,15 @@ from aiogram.fsm.state import StatesGroup
 from aiogram.types import CallbackQuery, Message
 from sqlalchemy.orm import Session
 
+from src import clock
+from src.callbacks import Callback
 from src.core.config import DATE_FMT, SHORT_DATE_FMT, WEEKDAY_MAP
 from src.keyboards import Commands, Keyboards
 from src.messages import replies
 from src.middlewares import DatabaseMiddleware
 from src.models import User
 from src.repositories import EventRepo, UserRepo
-from src.utils import day_schedule_text, get_callback_arg, telegram_checks
+from src.utils import day_schedule_text, get_callback_arg, respond, telegram_checks
 
 router = Router()
 router.message.middleware(DatabaseMiddleware())
@@ -27,32 +29,14 @@ class WeekSchedule(StatesGroup):
     week_start = f"{base_callback}week_start/"
 
 
-@router.message(Command(WeekSchedule.command))
-@router.message(F.text == Commands.WEEK_SCHEDULE.value)
-@router.callback_query(F.data.startswith(WeekSchedule.week_start))
-async def week_schedule_handler(
-    event: Message | CallbackQuery, state: FSMContext, db: Session
-) -> None:
-    message = telegram_checks(event)
-    state_data = await state.get_data()
-    if isinstance(event, CallbackQuery):
-        user = UserRepo(db).get_by_telegram_id(state_data["user_id"], True)
-    else:
-        user = UserRepo(db).get_by_telegram_id(message.from_user.id, True)
-        await state.update_data(user_id=message.from_user.id)
-
+def week_schedule_text(db: Session, user: User, date: datetime) -> str:
+    """Lessons of the week containing `date`, the teacher sees every student."""
     users_map = {  # TODO f"tg://user?id={u.telegram_id}" does not work
         u.id: f"@{u.username}"
         if u.username
         else html.link(u.full_name, f"tg://user?id={u.telegram_id}")
         for u in db.query(User).filter(User.executor_id == user.executor_id)
     }
-    if isinstance(event, Message):
-        date = datetime.now()
-    else:
-        date = datetime.strptime(
-            get_callback_arg(event.data, WeekSchedule.week_start), DATE_FMT
-        )
     start_of_week = date - timedelta(days=date.weekday())
     date_lesson_map = {}
     for i in range(7):
@@ -73,7 +57,32 @@ async def week_schedule_handler(
     text = []
     for d, day_text in date_lesson_map.items():
         text.append(d + "\n" + day_text)
-    await message.answer(
-        "\n\n".join(text),
+    return "\n\n".join(text)
+
+
+@router.message(Command(WeekSchedule.command))
+@router.message(F.text == Commands.WEEK_SCHEDULE.value)
+@router.callback_query(Callback(WeekSchedule.week_start))
+async def week_schedule_handler(
+    event: Message | CallbackQuery, state: FSMContext, db: Session
+) -> None:
+    message = telegram_checks(event)
+    state_data = await state.get_data()
+    if isinstance(event, CallbackQuery):
+        user = UserRepo(db).get_by_telegram_id(state_data["user_id"], True)
+    else:
+        user = UserRepo(db).get_by_telegram_id(message.from_user.id, True)
+        await state.update_data(user_id=message.from_user.id)
+
+    if isinstance(event, Message):
+        date = clock.now()
+    else:
+        date = datetime.strptime(
+            get_callback_arg(event.data, WeekSchedule.week_start), DATE_FMT
+        )
+    # Paging edits the schedule in place
+    await respond(
+        event,
+        week_schedule_text(db, user, date),
         reply_markup=Keyboards.choose_week(date, WeekSchedule.week_start),
     )
@@ -5,12 +5,13 @@ from aiogram.fsm.state import StatesGroup
 from aiogram.types import CallbackQuery, Message
 from sqlalchemy.orm import Session
 
+from src.callbacks import Callback
 from src.keyboards import AdminCommands, Keyboards
 from src.messages import replies
 from src.middlewares import DatabaseMiddleware
 from src.models import User
 from src.repositories import EventRepo, UserRepo
-from src.utils import send_message, telegram_checks
+from src.utils import respond, send_message, telegram_checks
 
 router = Router()
 router.message.middleware(DatabaseMiddleware())
@@ -49,11 +50,11 @@ async def check_overlaps_handler(
         await message.answer(replies.NO_OVERLAPS)
 
 
-@router.callback_query(F.data.startswith(CheckOverlaps.send_messages))
+@router.callback_query(Callback(CheckOverlaps.send_messages))
 async def send_messages(
     callback: CallbackQuery, state: FSMContext, db: Session
 ) -> None:
-    message = telegram_checks(callback)
+    telegram_checks(callback)
     state_data = await state.get_data()
     user = UserRepo(db).get_by_telegram_id(state_data["user_id"], True)
     if user.role != User.Roles.TEACHER:
@@ -69,5 +70,5 @@ async def send_messages(
         await send_message(user_tg, msg)
         counter += 1
 
-    await message.answer(f"sent messages to {counter} users")
+    await respond(callback, f"sent messages to {counter} users")
     await state.clear()
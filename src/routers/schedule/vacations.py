@@ -7,12 +7,20 @@ from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import CallbackQuery, Message
 from sqlalchemy.orm import Session
 
+from src import clock
+from src.callbacks import Callback
 from src.keyboards import Commands, Keyboards
 from src.messages import replies
 from src.middlewares import DatabaseMiddleware
 from src.models import Event
 from src.repositories import EventHistoryRepo, EventRepo, UserRepo
-from src.utils import get_callback_arg, parse_date, send_message, telegram_checks
+from src.utils import (
+    get_callback_arg,
+    parse_date,
+    respond,
+    send_message,
+    telegram_checks,
+)
 
 router = Router()
 router.message.middleware(DatabaseMiddleware())
@@ -41,11 +49,11 @@ async def vacations_handler(message: Message, state: FSMContext, db: Session) ->
     )
 
 
-@router.callback_query(F.data.startswith(Vacations.edit_vacations))
+@router.callback_query(Callback(Vacations.edit_vacations))
 async def edit_vacations(
     callback: CallbackQuery, state: FSMContext, db: Session
 ) -> None:
-    message = telegram_checks(callback)
+    telegram_checks(callback)
     state_data = await state.get_data()
     user = UserRepo(db).get_by_telegram_id(state_data["user_id"], True)
 
@@ -56,7 +64,7 @@ async def edit_vacations(
         event_str = f"{event.start.date()} - {event.end.date()}"
         db.delete(event)
         db.commit()
-        await message.answer(replies.VACATION_DELETED)
+        await respond(callback, replies.VACATION_DELETED)
         username = user.username if user.username else user.full_name
         EventHistoryRepo(db).create(
             username, Vacations.scene, "delete_vacation", event_str
@@ -65,7 +73,7 @@ async def edit_vacations(
         await send_message(executor_tg, f"{username} удалил(а) Каникулы {event_str}")
         await state.clear()
     elif action.startswith("add_vacation"):
-        await message.answer(replies.CHOOSE_DATES)
+        await respond(callback, replies.CHOOSE_DATES)
         await state.set_state(Vacations.choose_dates)
     else:
         raise Exception(
@@ -98,8 +106,8 @@ async def choose_time(message: Message, state: FSMContext, db: Session) -> None:
         user_id=user.id,
         executor_id=user.executor_id,
         event_type=Event.EventTypes.VACATION,
-        start=datetime.combine(start, datetime.now().time().replace(hour=0, minute=0)),
-        end=datetime.combine(end, datetime.now().time().replace(hour=23, minute=59)),
+        start=datetime.combine(start, clock.now().time().replace(hour=0, minute=0)),
+        end=datetime.combine(end, clock.now().time().replace(hour=23, minute=59)),
     )
     db.add(event)
     db.commit()
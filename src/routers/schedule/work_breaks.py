@@ -1,4 +1,4 @@
-from datetime import datetime, timedelta
+from datetime import timedelta
 
 from aiogram import F, Router
 from aiogram.filters import Command
@@ -7,12 +7,14 @@ from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import CallbackQuery, Message
 from sqlalchemy.orm import Session
 
+from src import clock
+from src.callbacks import Callback
 from src.keyboards import AdminCommands, Keyboards
 from src.messages import replies
 from src.middlewares import DatabaseMiddleware
 from src.models import RecurrentEvent, User
 from src.repositories import EventHistoryRepo, EventRepo, UserRepo
-from src.utils import get_callback_arg, parse_time, telegram_checks
+from src.utils import get_callback_arg, parse_time, respond, telegram_checks
 
 router = Router()
 router.message.middleware(DatabaseMiddleware())
@@ -49,25 +51,26 @@ async def manage_work_breaks_handler(
     )
 
 
-@router.callback_query(F.data.startswith(WorkBreaks.add_break))
+@router.callback_query(Callback(WorkBreaks.add_break))
 async def add_break(callback: CallbackQuery, state: FSMContext, db: Session) -> None:
-    message = telegram_checks(callback)
+    telegram_checks(callback)
     state_data = await state.get_data()
     user = UserRepo(db).get_by_telegram_id(state_data["user_id"], True)
     if user.role != User.Roles.TEACHER:
         raise Exception("message", replies.PERMISSION_DENIED, "user.role != Teacher")
 
-    await message.answer(
+    await respond(
+        callback,
         replies.CHOOSE_WEEKDAY,
         reply_markup=Keyboards.weekdays(list(range(7)), WorkBreaks.choose_duration),
     )
 
 
-@router.callback_query(F.data.startswith(WorkBreaks.choose_duration))
+@router.callback_query(Callback(WorkBreaks.choose_duration))
 async def choose_duration(
     callback: CallbackQuery, state: FSMContext, db: Session
 ) -> None:
-    message = telegram_checks(callback)
+    telegram_checks(callback)
     state_data = await state.get_data()
     user = UserRepo(db).get_by_telegram_id(state_data["user_id"], True)
     if user.role != User.Roles.TEACHER:
@@ -76,7 +79,7 @@ async def choose_duration(
     weekday = get_callback_arg(callback.data, WorkBreaks.choose_duration)
     await state.update_data(weekday=weekday)
 
-    await message.answer(replies.CHOOSE_TIMES)
+    await respond(callback, replies.CHOOSE_TIMES)
     await state.set_state(WorkBreaks.result)
 
 
@@ -100,7 +103,7 @@ async def result(message: Message, state: FSMContext, db: Session) -> None:
         return
 
     weekday = int(state_data["weekday"])
-    start_of_week = datetime.now() - timedelta(days=datetime.now().weekday())
+    start_of_week = clock.now() - timedelta(days=clock.now().weekday())
     day = start_of_week + timedelta(days=weekday)
     event = RecurrentEvent(
         user_id=user.id,
@@ -120,9 +123,9 @@ async def result(message: Message, state: FSMContext, db: Session) -> None:
     await state.clear()
 
 
-@router.callback_query(F.data.startswith(WorkBreaks.remove_break))
+@router.callback_query(Callback(WorkBreaks.remove_break))
 async def remove_break(callback: CallbackQuery, state: FSMContext, db: Session) -> None:
-    message = telegram_checks(callback)
+    telegram_checks(callback)
     state_data = await state.get_data()
     user = UserRepo(db).get_by_telegram_id(state_data["user_id"], True)
     if user.role != User.Roles.TEACHER:
@@ -134,7 +137,7 @@ async def remove_break(callback: CallbackQuery, state: FSMContext, db: Session)
     db.delete(event)
     db.commit()
 
-    await message.answer(replies.BREAK_REMOVED)
+    await respond(callback, replies.BREAK_REMOVED)
     username = user.username if user.username else user.full_name
     EventHistoryRepo(db).create(username, WorkBreaks.scene, "removed_break", event_str)
     await state.clear()
@@ -7,13 +7,15 @@ from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import CallbackQuery, Message
 from sqlalchemy.orm import Session
 
+from src import clock
+from src.callbacks import Callback
 from src.core.config import WEEKDAY_MAP
 from src.keyboards import AdminCommands, Keyboards
 from src.messages import replies
 from src.middlewares import DatabaseMiddleware
 from src.models import RecurrentEvent, User
 from src.repositories import EventHistoryRepo, EventRepo, UserRepo
-from src.utils import get_callback_arg, parse_time, telegram_checks
+from src.utils import get_callback_arg, parse_time, respond, telegram_checks
 
 router = Router()
 router.message.middleware(DatabaseMiddleware())
@@ -54,9 +56,9 @@ async def manage_work_schedule_handler(
 # ---- WORK HOURS ---- #
 
 
-@router.callback_query(F.data.startswith(WorkSchedule.action))
+@router.callback_query(Callback(WorkSchedule.action))
 async def action(callback: CallbackQuery, state: FSMContext, db: Session) -> None:
-    message = telegram_checks(callback)
+    telegram_checks(callback)
     state_data = await state.get_data()
     user = UserRepo(db).get_by_telegram_id(state_data["user_id"], True)
     if user.role != User.Roles.TEACHER:
@@ -75,14 +77,14 @@ async def action(callback: CallbackQuery, state: FSMContext, db: Session) -> Non
             EventHistoryRepo(db).create(
                 username, WorkSchedule.scene, "deleted_end", str(time)
             )
-        await message.answer(replies.WORK_HOURS_DELETED)
+        await respond(callback, replies.WORK_HOURS_DELETED)
     elif action_type.startswith("add"):
         if action_type.endswith("start"):
             await state.update_data(mode="start")
         elif action_type.endswith("end"):
             await state.update_data(mode="end")
         await state.set_state(WorkSchedule.choose_time)
-        await message.answer(replies.CHOOSE_TIME)
+        await respond(callback, replies.CHOOSE_TIME)
     else:
         raise Exception(
             "message",
@@ -100,15 +102,15 @@ async def choose_time(message: Message, state: FSMContext, db: Session) -> None:
         raise Exception("message", replies.PERMISSION_DENIED, "user.role != Teacher")
 
     time = parse_time(message.text).time()
-    current_day = datetime.now().date()
+    current_day = clock.now().date()
     start = datetime.combine(current_day, time)
     if state_data["mode"] == "start":
         event_type = RecurrentEvent.EventTypes.WORK_START
-        start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        start = clock.now().replace(hour=0, minute=0, second=0, microsecond=0)
         end = start.replace(hour=time.hour, minute=time.minute)
     elif state_data["mode"] == "end":
         event_type = RecurrentEvent.EventTypes.WORK_END
-        end = datetime.now().replace(hour=23, minute=59, second=0, microsecond=0)
+        end = clock.now().replace(hour=23, minute=59, second=0, microsecond=0)
         start = end.replace(hour=time.hour, minute=time.minute)
     event = RecurrentEvent(
         user_id=user.id,
@@ -131,11 +133,11 @@ async def choose_time(message: Message, state: FSMContext, db: Session) -> None:
 # ---- WEEKENDS ---- #
 
 
-@router.callback_query(F.data.startswith(WorkSchedule.choose_weekday))
+@router.callback_query(Callback(WorkSchedule.choose_weekday))
 async def choose_weekday(
     callback: CallbackQuery, state: FSMContext, db: Session
 ) -> None:
-    message = telegram_checks(callback)
+    telegram_checks(callback)
     state_data = await state.get_data()
     user = UserRepo(db).get_by_telegram_id(state_data["user_id"], True)
     if user.role != User.Roles.TEACHER:
@@ -148,7 +150,7 @@ async def choose_weekday(
         weekday = WEEKDAY_MAP[event.start.weekday()]["short"]
         db.delete(event)
         db.commit()
-        await message.answer(replies.WEEKEND_DELETED)
+        await respond(callback, replies.WEEKEND_DELETED)
         await state.clear()
         username = user.username if user.username else user.full_name
         EventHistoryRepo(db).create(
@@ -156,7 +158,8 @@ async def choose_weekday(
         )
     elif "add_weekend" in callback.data:
         weekdays = EventRepo(db).available_work_weekdays(user.executor_id)
-        await message.answer(
+        await respond(
+            callback,
             replies.CHOOSE_WEEKDAY,
             reply_markup=Keyboards.weekdays(weekdays, WorkSchedule.create_weekend),
         )
@@ -166,18 +169,18 @@ async def choose_weekday(
         )
 
 
-@router.callback_query(F.data.startswith(WorkSchedule.create_weekend))
+@router.callback_query(Callback(WorkSchedule.create_weekend))
 async def create_weekend(
     callback: CallbackQuery, state: FSMContext, db: Session
 ) -> None:
-    message = telegram_checks(callback)
+    telegram_checks(callback)
     state_data = await state.get_data()
     user = UserRepo(db).get_by_telegram_id(state_data["user_id"], True)
     if user.role != User.Roles.TEACHER:
         raise Exception("message", replies.PERMISSION_DENIED, "user.role != Teacher")
 
     weekday = int(get_callback_arg(callback.data, WorkSchedule.create_weekend))
-    start_of_week = datetime.now() - timedelta(days=datetime.now().weekday())
+    start_of_week = clock.now() - timedelta(days=clock.now().weekday())
     day = start_of_week + timedelta(days=weekday)
     event = RecurrentEvent(
         user_id=user.id,
@@ -189,7 +192,7 @@ async def create_weekend(
     )
     db.add(event)
     db.commit()
-    await message.answer(replies.WEEKEND_ADDED)
+    await respond(callback, replies.WEEKEND_ADDED)
     weekday = WEEKDAY_MAP[weekday]["short"]
     username = user.username if user.username else user.full_name
     EventHistoryRepo(db).create(username, WorkSchedule.scene, "added_weekend", weekday)
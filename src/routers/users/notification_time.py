@@ -0,0 +1,53 @@
+from datetime import datetime
+
+from aiogram import Router
+from aiogram.filters import Command
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.types import Message
+from sqlalchemy.orm import Session
+
+from src.core.config import TIME_FMT
+from src.messages import replies
+from src.middlewares import DatabaseMiddleware
+from src.repositories import EventHistoryRepo, UserRepo
+from src.utils import parse_time, telegram_checks
+
+router = Router()
+router.message.middleware(DatabaseMiddleware())
+
+
+class NotificationTime(StatesGroup):
+    scene = "notification_time"
+    command = "/" + scene
+    type_time = State()
+
+
+@router.message(Command(NotificationTime.command))
+async def notification_time_handler(
+    message: Message, state: FSMContext, db: Session
+) -> None:
+    message = telegram_checks(message)
+    UserRepo(db).get_by_telegram_id(message.from_user.id, True)
+
+    await state.set_state(NotificationTime.type_time)
+    await message.answer(replies.CHOOSE_NOTIFICATION_TIME)
+
+
+@router.message(NotificationTime.type_time)
+async def type_time(message: Message, state: FSMContext, db: Session) -> None:
+    message = telegram_checks(message)
+    user = UserRepo(db).get_by_telegram_id(message.from_user.id, True)
+
+    time = parse_time(message.text)
+    if time is None:
+        await message.answer(replies.WRONG_TIME_FMT)
+        return
+    UserRepo(db).set_notification_time(user, time.time())
+    time_str = datetime.strftime(time, TIME_FMT)
+    await message.answer(replies.NOTIFICATION_TIME_SET % time_str)
+    username = user.username if user.username else user.full_name
+    EventHistoryRepo(db).create(
+        username, NotificationTime.scene, "notification_time", time_str
+    )
+    await state.clear()
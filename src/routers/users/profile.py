@@ -5,16 +5,18 @@ from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup
 from aiogram.types import CallbackQuery, Message
-from sqlalchemy import text
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
-from src.core.config import DATE_FMT, DATETIME_FMT, DB_DATETIME
+from src import clock
+from src.callbacks import Callback
+from src.core.config import DATE_FMT, DATETIME_FMT
 from src.keyboards import AdminCommands, Keyboards
 from src.messages import replies
 from src.middlewares import DatabaseMiddleware
 from src.models import Event, User
 from src.repositories import HISTORY_MAP, EventHistoryRepo, UserRepo
-from src.utils import get_callback_arg, telegram_checks
+from src.utils import get_callback_arg, respond, telegram_checks
 
 router = Router()
 router.message.middleware(DatabaseMiddleware())
@@ -27,12 +29,8 @@ def profile_text(
     vacations_list = []
     for vacation in vacations:
         start, end = (
-            datetime.strptime(vacation[0], DB_DATETIME),
-            datetime.strptime(vacation[1], DB_DATETIME),
-        )
-        start, end = (
-            datetime.strftime(start, DATE_FMT),
-            datetime.strftime(end, DATE_FMT),
+            datetime.strftime(vacation[0], DATE_FMT),
+            datetime.strftime(vacation[1], DATE_FMT),
         )
         vacations_list.append(f"{start} - {end}")
     if vacations_list:
@@ -83,7 +81,7 @@ async def profile_handler(message: Message, state: FSMContext, db: Session) -> N
     )
 
 
-@router.callback_query(F.data.startswith(Profile.profile))
+@router.callback_query(Callback(Profile.profile))
 async def profile(callback: CallbackQuery, state: FSMContext, db: Session) -> None:
     message = telegram_checks(callback)
     state_data = await state.get_data()
@@ -100,22 +98,18 @@ async def profile(callback: CallbackQuery, state: FSMContext, db: Session) -> No
     event_history = EventHistoryRepo(db).user_history(student.username)
     events = []
     for e in event_history:
-        dt = datetime.strptime(e.created_at, DB_DATETIME)
+        dt = e.created_at
         event = (
             HISTORY_MAP[e.event_type] if e.event_type in HISTORY_MAP else e.event_type
         )
         events.append(f"{datetime.strftime(dt, DATETIME_FMT)} {event} {e.event_value}")
     vacations = list(
         db.execute(
-            text("""
-        select start, end from events
-        where user_id = :user_id and event_type == :event_type and start >= :today
-    """),
-            {
-                "user_id": student.id,
-                "event_type": Event.EventTypes.VACATION,
-                "today": datetime.now(),
-            },
+            select(Event.start, Event.end).where(
+                Event.user_id == student.id,
+                Event.event_type == Event.EventTypes.VACATION,
+                Event.start >= clock.now(),
+            )
         ).fetchall()
     )
     msg = profile_text(
@@ -126,11 +120,11 @@ async def profile(callback: CallbackQuery, state: FSMContext, db: Session) -> No
     )
 
 
-@router.callback_query(F.data.startswith(Profile.delete_student))
+@router.callback_query(Callback(Profile.delete_student))
 async def delete_student(
     callback: CallbackQuery, state: FSMContext, db: Session
 ) -> None:
-    message = telegram_checks(callback)
+    telegram_checks(callback)
     state_data = await state.get_data()
     user = UserRepo(db).get_by_telegram_id(state_data["user_id"], True)
     if user.role != User.Roles.TEACHER:
@@ -138,14 +132,15 @@ async def delete_student(
 
     student_id = int(get_callback_arg(callback.data, Profile.delete_student))
     await state.update_data(student_id=student_id)
-    await message.answer(
+    await respond(
+        callback,
         replies.ARE_YOU_SURE, reply_markup=Keyboards.confirm(Profile.confirm)
     )
 
 
-@router.callback_query(F.data.startswith(Profile.confirm))
+@router.callback_query(Callback(Profile.confirm))
 async def confirm(callback: CallbackQuery, state: FSMContext, db: Session) -> None:
-    message = telegram_checks(callback)
+    telegram_checks(callback)
     state_data = await state.get_data()
     user = UserRepo(db).get_by_telegram_id(state_data["user_id"], True)
     if user.role != User.Roles.TEACHER:
@@ -153,13 +148,13 @@ async def confirm(callback: CallbackQuery, state: FSMContext, db: Session) -> No
 
     answer = get_callback_arg(callback.data, Profile.confirm)
     if answer != "yes":
-        await message.answer(replies.CANCELED)
+        await respond(callback, replies.CANCELED)
         await state.clear()
         return
 
     student_id = state_data["student_id"]
     UserRepo(db).delete(student_id)
-    await message.answer(replies.USER_DELETED)
+    await respond(callback, replies.USER_DELETED)
     await state.clear()
     EventHistoryRepo(db).create(
         user.username, Profile.scene, "deleted_user", str(student_id)
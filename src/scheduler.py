@@ -1,16 +1,196 @@
 import asyncio
-from datetime import datetime, time
+import contextlib
+import os
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from datetime import datetime, timedelta
 
 import aiojobs
+from aiogram.exceptions import TelegramForbiddenError
 from sqlalchemy.orm import Session
 
 from core import logs
-from core.config import TIMEZONE
-from database import engine
+from core.config import (
+    JOB_RUNS_KEEP,
+    METRICS_HOST,
+    NOTIFICATION_CATCH_UP,
+    NOTIFICATION_TIME,
+    NOTIFICATIONS_CONCURRENCY,
+    SCHEDULER_METRICS_PORT,
+    metrics_port,
+)
+from database import SHARDS_DIR, get_engine, init_db, is_sqlite
 from logger import logger
-from src.models import User
-from src.repositories import EventRepo
-from utils import day_schedule_text, send_message
+from src.backup import BACKUP_DIR, create_backup, utc_now
+from src.bot import close_bot, get_bot
+from src.metrics import JOB_SECONDS, registry, start_metrics_server
+from src.querywatch import QUERY_WATCH, watch, watch_repository
+from src.tracing import setup_tracing, span
+from src.models import JobRun, NotificationSetting, ScheduleChange, User
+from src.repositories import EventRepo, JobRunRepo
+from src.reminders import reminders
+from src.shards import shard_engines
+from startup import StartupReport
+from utils import day_schedule_text, local_now
+
+NOTIFICATIONS_JOB = "notifications"
+
+
+class Cron:
+    """
+    Cron expression `minute hour day month weekday`.
+
+    Fields support `*`, `*/n`, `a-b`, `a-b/n` and comma separated lists.
+    Weekdays follow python (and WEEKDAY_MAP): 0 is Monday, 6 is Sunday.
+    """
+
+    FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 6))
+
+    def __init__(self, expression: str):
+        parts = expression.split()
+        if len(parts) != len(self.FIELDS):
+            raise ValueError(f"cron expression needs 5 fields: {expression!r}")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            self._parse(part, low, high)
+            for part, (low, high) in zip(parts, self.FIELDS)
+        )
+
+    @staticmethod
+    def _parse(field: str, low: int, high: int):
+        values = set()
+        for item in field.split(","):
+            item, _, step = item.partition("/")
+            if item == "*":
+                start, end = low, high
+            elif "-" in item:
+                start, end = (int(v) for v in item.split("-"))
+            else:
+                start = end = int(item)
+            if not low <= start <= end <= high:
+                raise ValueError(f"cron field {field!r} out of range {low}-{high}")
+            values.update(range(start, end + 1, int(step) if step else 1))
+        return frozenset(values)
+
+    def matches(self, dt: datetime):
+        return (
+            dt.minute in self.minutes
+            and dt.hour in self.hours
+            and dt.day in self.days
+            and dt.month in self.months
+            and dt.weekday() in self.weekdays
+        )
+
+    def next_after(self, dt: datetime):
+        """First matching minute strictly after `dt`."""
+        dt = dt.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = dt + timedelta(days=366 * 4)
+        while dt < limit:
+            if (
+                dt.month not in self.months
+                or dt.day not in self.days
+                or dt.weekday() not in self.weekdays
+            ):
+                dt = dt.replace(hour=0, minute=0) + timedelta(days=1)
+            elif dt.hour not in self.hours:
+                dt = dt.replace(minute=0) + timedelta(hours=1)
+            elif dt.minute not in self.minutes:
+                dt += timedelta(minutes=1)
+            else:
+                return dt
+        raise ValueError(f"cron expression never fires: {self.expression!r}")
+
+
+@dataclass
+class Job:
+    name: str
+    trigger: Cron
+    func: Callable[[datetime], Awaitable]
+    # How far back a run missed during downtime is still executed on startup
+    catch_up: timedelta = timedelta(0)
+    # Jobs that keep their own per-item records (like notifications) skip job_runs
+    record: bool = True
+
+
+class JobScheduler:
+    """Runs jobs on cron triggers, completed runs are recorded in `job_runs`."""
+
+    def __init__(self):
+        self.jobs: list[Job] = []
+
+    def job(self, name: str, cron: str, catch_up=timedelta(0), record=True):
+        def decorator(func):
+            self.jobs.append(Job(name, Cron(cron), func, catch_up, record))
+            return func
+
+        return decorator
+
+    @staticmethod
+    def claim(job: str, key: str):
+        with Session(get_engine()) as db:
+            return JobRunRepo(db).claim(job, key)
+
+    @staticmethod
+    def finish(job: str, key: str):
+        with Session(get_engine()) as db:
+            JobRunRepo(db).finish(job, key)
+
+    @staticmethod
+    def release(job: str, key: str):
+        with Session(get_engine()) as db:
+            JobRunRepo(db).release(job, key)
+
+    async def execute(self, job: Job, scheduled_for: datetime):
+        key = scheduled_for.isoformat(timespec="minutes")
+        if job.record and not self.claim(job.name, key):
+            return
+        started = time.perf_counter()
+        queries = watch(f"job {job.name}") if QUERY_WATCH else contextlib.nullcontext()
+        try:
+            with queries as log, span(f"job.{job.name}", "job", key=key):
+                await job.func(scheduled_for)
+            if log is not None:
+                log.report()
+        except Exception:
+            JOB_SECONDS.observe(time.perf_counter() - started, job.name, "failed")
+            logger.exception(logs.JOB_FAILED, job.name, key)
+            if job.record:
+                self.release(job.name, key)
+            return
+        JOB_SECONDS.observe(time.perf_counter() - started, job.name, "ok")
+        if job.record:
+            self.finish(job.name, key)
+
+    async def catch_up(self, scheduler: aiojobs.Scheduler, now: datetime):
+        for job in self.jobs:
+            if not job.catch_up:
+                continue
+            missed, fire = None, job.trigger.next_after(now - job.catch_up)
+            while fire <= now:
+                missed, fire = fire, job.trigger.next_after(fire)
+            if missed is not None:
+                await scheduler.spawn(self.execute(job, missed))
+
+    async def start(self):
+        with Session(get_engine()) as db:
+            JobRunRepo(db).release_unfinished()
+        async with aiojobs.Scheduler() as scheduler:
+            now = local_now()
+            await self.catch_up(scheduler, now)
+            upcoming = {job.name: job.trigger.next_after(now) for job in self.jobs}
+            while True:
+                next_fire = min(upcoming.values())
+                delay = (next_fire - local_now()).total_seconds()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                for job in self.jobs:
+                    if upcoming[job.name] <= next_fire:
+                        await scheduler.spawn(self.execute(job, upcoming[job.name]))
+                        upcoming[job.name] = job.trigger.next_after(next_fire)
+
+
+jobs = JobScheduler()
 
 
 def notification(events: list, user: User, users_map):
@@ -20,45 +200,145 @@ def notification(events: list, user: User, users_map):
     return "Скоро занятия:\n" + "\n".join(rows)
 
 
+def due_users(db: Session, now: datetime, done: set[str]):
+    """Users whose notification time has come today and who were not notified yet."""
+    day = now.date()
+    times = {s.user_id: s.time for s in db.query(NotificationSetting)}
+    result = []
+    for user in db.query(User).filter(User.executor_id.isnot(None)):
+        due = datetime.combine(day, times.get(user.id, NOTIFICATION_TIME))
+        if due <= now < due + NOTIFICATION_CATCH_UP:
+            if f"{day.isoformat()}:{user.id}" not in done:
+                result.append(user)
+    return result
+
+
+def notifications_for(db: Session, users: list[User], day):
+    repo = EventRepo(db)
+    due_by_executor = {}
+    for user in users:
+        due_by_executor.setdefault(user.executor_id, []).append(user)
+
+    messages = []
+    for executor_id, due in due_by_executor.items():
+        roster = list(db.query(User).filter(User.executor_id == executor_id))
+        # The teacher's timeline is computed once and sliced per student
+        timeline = repo.day_schedule(executor_id, day)
+        users_map = {
+            u.id: u.username if u.username else u.full_name for u in roster
+        }
+        on_vacation = repo.users_on_vacation([u.id for u in due], day)
+        for user in due:
+            if user.role == User.Roles.STUDENT:
+                events = (
+                    []
+                    if user.id in on_vacation
+                    else [e for e in timeline if e[2] == user.id]
+                )
+            else:
+                events = timeline
+            text = notification(events, user, users_map)
+            messages.append((user, users_map[user.id], text))
+    return messages
+
+
+@jobs.job(NOTIFICATIONS_JOB, "* * * * *", record=False)
 async def send_notifications(now: datetime):
+    day = now.date()
+    # Job runs live in the catalog, users and lessons in the shards
+    with Session(get_engine()) as db:
+        done = JobRunRepo(db).keys(NOTIFICATIONS_JOB, f"{day.isoformat()}:")
+    messages = []
+    for engine in shard_engines():
+        with Session(engine) as db:
+            users = due_users(db, now, done)
+            if users:
+                messages += notifications_for(db, users, day)
+    if not messages:
+        return
     logger.info(logs.NOTIFICATIONS_START)
-    with Session(engine) as db:
-        notifies = set()
-        users = db.query(User).all()
-        repo = EventRepo(db)
-        for user in users:
-            student_id = user.id if user.role == User.Roles.STUDENT else None
-            events = repo.day_schedule(user.executor_id, now.date(), student_id)
-            user_ids = [e[2] for e in events]
-            users_map = {
-                u.id: u.username if u.username else u.full_name
-                for u in db.query(User).filter(User.id.in_(user_ids))
-            }
-            text = notification(events, user, users_map)
-            if not text:
-                continue
-            username = user.username if user.username else user.full_name
-            notifies.add(username)
-            await send_message(user.telegram_id, text)
-        logger.info(logs.NOTIFICATIONS_SENT, ", ".join(notifies))
+
+    semaphore = asyncio.Semaphore(NOTIFICATIONS_CONCURRENCY)
+    key_prefix = day.isoformat()
+
+    sent = set()
+
+    async def send(user: User, name: str, text: str | None):
+        key = f"{key_prefix}:{user.id}"
+        if not JobScheduler.claim(NOTIFICATIONS_JOB, key):
+            return
+        try:
+            if text:
+                async with semaphore:
+                    await get_bot().send_message(user.telegram_id, text)
+                sent.add(name)
+        except TelegramForbiddenError as e:
+            # Blocked the bot, retrying will not help
+            logger.warning(logs.NOTIFICATION_BLOCKED, user.telegram_id, e)
+        except Exception as e:
+            # The next minute's run sends it again
+            JobScheduler.release(NOTIFICATIONS_JOB, key)
+            logger.warning(logs.NOTIFICATION_FAILED, user.telegram_id, e)
+            return
+        JobScheduler.finish(NOTIFICATIONS_JOB, key)
+
+    await asyncio.gather(*(send(user, name, text) for user, name, text in messages))
+    logger.info(logs.NOTIFICATIONS_SENT, ", ".join(sent))
+
+
+@jobs.job("cleanup_job_runs", "0 4 * * *", catch_up=timedelta(days=1))
+async def cleanup_job_runs(now: datetime):
+    with Session(get_engine()) as db:
+        db.query(JobRun).filter(JobRun.started_at < now - JOB_RUNS_KEEP).delete()
+        db.commit()
+    for engine in shard_engines():
+        with Session(engine) as db:
+            db.query(ScheduleChange).filter(
+                ScheduleChange.created_at < now - JOB_RUNS_KEEP
+            ).delete()
+            db.commit()
 
 
-async def lessons_notifications(timeout: float):
-    """Send notifications about lessons."""
-    now = datetime.now(TIMEZONE)
-    if time(8, 15) <= now.time() < time(8, 20):
-        await send_notifications(now)
-    await asyncio.sleep(timeout)
+@jobs.job("backup", "30 */6 * * *", catch_up=timedelta(hours=6))
+async def backup_database(now: datetime):
+    if not is_sqlite(get_engine()):
+        # A database server is backed up with its own tools
+        return
+    # Named in UTC like the backups made by hand, not after the local `now`
+    taken = utc_now()
+    # Copying and compressing are blocking, reminders and notifications keep running
+    if not SHARDS_DIR:
+        await asyncio.to_thread(create_backup, get_engine().url.database, now=taken)
+        return
+    # Every file of a sharded database has its own chain in a subdirectory
+    for engine in [get_engine(), *shard_engines()]:
+        path = engine.url.database
+        directory = os.path.join(BACKUP_DIR, os.path.splitext(os.path.basename(path))[0])
+        await asyncio.to_thread(create_backup, path, directory, taken)
 
 
 async def start_scheduler():
     """Start scheduler."""
-    timeout = 5 * 60
+    report = StartupReport("Scheduler")
+    report.mark("imports")
     logger.info(logs.SCHEDULER_START)
-    async with aiojobs.Scheduler() as scheduler:
-        while True:
-            await scheduler.spawn(lessons_notifications(timeout))
-            await asyncio.sleep(timeout)
+    init_db()
+    setup_tracing("scheduler", EventRepo, JobRunRepo)
+    if QUERY_WATCH:
+        watch_repository(EventRepo)
+    report.mark("database")
+    registry.gauge(
+        "olm_reminders_queued", "Reminders waiting in the heap", lambda: len(reminders.heap)
+    )
+    port = metrics_port(SCHEDULER_METRICS_PORT)
+    metrics_server = await start_metrics_server(METRICS_HOST, port) if port else None
+    report.log()
+    try:
+        await asyncio.gather(jobs.start(), reminders.start())
+    finally:
+        if metrics_server is not None:
+            await metrics_server.cleanup()
+        await close_bot()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,158 @@
+"""
+Shadow reads: a candidate engine (src/engines.py) answers live queries too,
+but only the legacy answer is served.
+
+With `SHADOW_ENGINE=<name>` a `SHADOW_SAMPLE` percent of the `day_schedule`
+and `available_time` calls is repeated by the candidate in a background
+thread with its own session and the clock of the original call. Results that
+differ are logged with a compact diff and a fingerprint of the input, both
+engines' latencies go to `olm_engine_seconds`. A divergence is only reported
+when the legacy engine still returns what it served, otherwise the schedule
+changed in between and the run counts as stale.
+"""
+
+import functools
+import hashlib
+import os
+import random
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+from sqlalchemy import Engine
+from sqlalchemy.orm import Session
+
+from logger import logger
+from src import clock
+from src.engines import ENGINES
+from src.metrics import ENGINE_SECONDS, SHADOW_RESULTS
+
+SHADOW_ENGINE = os.environ.get("SHADOW_ENGINE", "")
+SHADOW_SAMPLE = float(os.environ.get("SHADOW_SAMPLE", 5))
+# Runs waiting for the thread, the rest are dropped instead of piling up
+SHADOW_MAX_PENDING = int(os.environ.get("SHADOW_MAX_PENDING", 20))
+SHADOWED_METHODS = ("day_schedule", "available_time")
+DIFF_ITEMS = 3
+
+
+def _short(value) -> str:
+    if isinstance(value, datetime):
+        return value.strftime("%d.%m %H:%M")
+    if isinstance(value, date):
+        return value.strftime("%d.%m.%Y")
+    if isinstance(value, tuple):
+        return "(" + ", ".join(_short(v) for v in value) + ")"
+    return str(value)
+
+
+def fingerprint(method: str, args: tuple, moment: datetime) -> str:
+    """Same for the same query at the same minute, to group repeated reports."""
+    key = f"{method}{args}@{moment:%Y-%m-%d %H:%M}"
+    return hashlib.sha1(key.encode()).hexdigest()[:10]
+
+
+def diff(served, candidate) -> str:
+    """`-` what only the served result has, `+` what only the candidate has."""
+    if isinstance(served, Exception) or isinstance(candidate, Exception):
+        return f"served {served!r}, candidate {candidate!r}"
+    if not isinstance(served, list) or not isinstance(candidate, list):
+        return f"served {_short(served)}, candidate {_short(candidate)}"
+    missing = [item for item in served if item not in candidate]
+    extra = [item for item in candidate if item not in served]
+    if not missing and not extra:
+        return "same items in another order"
+    parts = [f"-{_short(item)}" for item in missing[:DIFF_ITEMS]]
+    parts += [f"+{_short(item)}" for item in extra[:DIFF_ITEMS]]
+    hidden = len(missing) + len(extra) - len(parts)
+    if hidden > 0:
+        parts.append(f"and {hidden} more")
+    return f"{len(served)} vs {len(candidate)} items: " + " ".join(parts)
+
+
+class Shadow:
+    def __init__(self, legacy: type, candidate: type, name: str):
+        self.legacy = legacy
+        self.candidate = candidate
+        self.name = name
+        # Unwrapped methods of the legacy engine
+        self.originals: dict[str, Callable] = {}
+        self.executor = ThreadPoolExecutor(1, thread_name_prefix="shadow")
+        self.pending = 0
+        self.lock = threading.Lock()
+
+    def submit(self, method: str, args: tuple, served, engine: Engine):
+        with self.lock:
+            if self.pending >= SHADOW_MAX_PENDING:
+                SHADOW_RESULTS.inc(method, "dropped")
+                return
+            self.pending += 1
+        self.executor.submit(self.compare, method, args, served, clock.now(), engine)
+
+    def run(self, engine: type, db: Session, method: str, args: tuple):
+        if engine is self.legacy:
+            return self.originals[method](engine(db), *args)
+        return getattr(engine(db), method)(*args)
+
+    def compare(self, method: str, args: tuple, served, moment: datetime, engine: Engine):
+        try:
+            with clock.frozen(moment), Session(engine) as db:
+                started = time.perf_counter()
+                try:
+                    result = self.run(self.candidate, db, method, args)
+                except Exception as e:
+                    result = e
+                ENGINE_SECONDS.observe(time.perf_counter() - started, method, self.name)
+                if result == served:
+                    SHADOW_RESULTS.inc(method, "match")
+                    return
+                if self.run(self.legacy, db, method, args) != served:
+                    SHADOW_RESULTS.inc(method, "stale")
+                    return
+            SHADOW_RESULTS.inc(method, "diverged")
+            logger.warning(
+                f"Shadow {self.name} diverges on {method}{args} "
+                f"[{fingerprint(method, args, moment)}]: {diff(served, result)}"
+            )
+        except Exception:
+            SHADOW_RESULTS.inc(method, "error")
+            logger.exception(f"Shadow {self.name} could not run {method}{args}")
+        finally:
+            with self.lock:
+                self.pending -= 1
+
+    def wrap(self, method, name: str):
+        self.originals[name] = method
+
+        @functools.wraps(method)
+        def wrapper(repo, *args, **kwargs):
+            # The candidate inherits the wrapped methods, it only runs them
+            if type(repo) is not self.legacy or kwargs:
+                return method(repo, *args, **kwargs)
+            started = time.perf_counter()
+            served = method(repo, *args)
+            ENGINE_SECONDS.observe(time.perf_counter() - started, name, "legacy")
+            # Rows written but not committed yet are invisible to another session
+            if random.random() * 100 < SHADOW_SAMPLE and not (
+                repo.db.new or repo.db.dirty or repo.db.deleted
+            ):
+                self.submit(name, args, served, repo.db.get_bind())
+            return served
+
+        return wrapper
+
+
+def shadow_repository(cls: type, engine: str = SHADOW_ENGINE) -> Shadow | None:
+    """Shadow SHADOWED_METHODS of `cls` with `ENGINES[engine]`, no-op without one."""
+    if not engine or getattr(cls, "_shadow", None) is not None:
+        return None
+    if engine not in ENGINES:
+        logger.error(f"Unknown SHADOW_ENGINE {engine}, choose from {', '.join(ENGINES)}")
+        return None
+    shadow = Shadow(cls, ENGINES[engine], engine)
+    for name in SHADOWED_METHODS:
+        setattr(cls, name, shadow.wrap(getattr(cls, name), name))
+    cls._shadow = shadow
+    logger.info(f"Shadowing {', '.join(SHADOWED_METHODS)} with {engine} at {SHADOW_SAMPLE}%")
+    return shadow
@@ -0,0 +1,379 @@
+"""
+Optional layout with one SQLite file per executor, so a teacher's broadcast
+or backlog only locks that teacher's file.
+
+With `DB_SHARDS_DIR=db/shards` the directory holds `catalog.sqlite` and an
+`executor_<id>.sqlite` per executor. The catalog keeps the executors, the
+scheduler's job runs, users who have not joined a teacher yet, the shard of
+every Telegram user (`user_shards`) and the id blocks; a shard keeps the
+executor's users, lessons, breaks, broadcasts and history. Ids are handed out
+by the catalog in blocks, so they stay unique across files and the ids in
+job runs, reminders and broadcasts never clash. DatabaseMiddleware opens the
+session on the shard of the user, a user is moved from the catalog to the
+shard right after joining a teacher.
+
+    python -m src.shards split db/db.sqlite db/shards
+    python -m src.shards merge db/shards db/merged.sqlite
+"""
+
+import argparse
+import os
+import sqlite3
+import threading
+
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    Engine,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    create_engine,
+    delete,
+    event,
+    insert,
+    select,
+    text,
+)
+from sqlalchemy.orm import Session, object_mapper
+
+from database import CATALOG_DB, SHARDS_DIR, get_engine, open_engine
+from logger import logger
+from src.models import Base, Executor, NotificationSetting, User
+
+# Ids taken from the catalog at once by a process, per table
+ID_BLOCK = 100
+
+catalog_metadata = MetaData()
+user_shards = Table(
+    "user_shards",
+    catalog_metadata,
+    Column("telegram_id", BigInteger, primary_key=True),
+    Column("user_id", Integer, nullable=False),
+    Column("executor_id", Integer, nullable=False, index=True),
+)
+id_blocks = Table(
+    "id_blocks",
+    catalog_metadata,
+    Column("table_name", String, primary_key=True),
+    Column("next_id", Integer, nullable=False),
+)
+
+# Name a user writes history under, see UserRepo.delete
+_AUTHOR = "coalesce(nullif(username, ''), full_name)"
+# Rows of a shard, `:executor_id` is the shard's executor
+SHARD_ROWS = {
+    "executors": "id = :executor_id",
+    "users": "executor_id = :executor_id",
+    "events": "executor_id = :executor_id",
+    "recurrent_events": "executor_id = :executor_id",
+    "event_breaks": "event_id IN "
+    "(SELECT id FROM src.recurrent_events WHERE executor_id = :executor_id)",
+    "event_history": f"author IN (SELECT {_AUTHOR} FROM src.users "
+    "WHERE executor_id = :executor_id)",
+    "broadcasts": "executor_id = :executor_id",
+    "broadcast_recipients": "broadcast_id IN "
+    "(SELECT id FROM src.broadcasts WHERE executor_id = :executor_id)",
+    "notification_settings": "user_id IN "
+    "(SELECT id FROM src.users WHERE executor_id = :executor_id)",
+    "schedule_changes": "executor_id = :executor_id",
+}
+CATALOG_ROWS = {
+    "executors": "1",
+    "users": "executor_id IS NULL",
+    "event_history": f"author IS NULL OR author NOT IN (SELECT {_AUTHOR} FROM src.users "
+    f"WHERE executor_id IS NOT NULL AND {_AUTHOR} IS NOT NULL)",
+    "notification_settings": "user_id IN (SELECT id FROM src.users WHERE executor_id IS NULL)",
+    "job_runs": "1",
+}
+# Tables whose rows may sit in several files, the copies are the same row
+SHARED_TABLES = ("executors", "event_history")
+
+
+def shard_path(executor_id: int, directory: str = SHARDS_DIR) -> str:
+    return os.path.join(directory, f"executor_{executor_id}.sqlite")
+
+
+class IdAllocator:
+    """Hands out ids from blocks reserved in the catalog, one block per table."""
+
+    def __init__(self, block: int = ID_BLOCK):
+        self.block = block
+        self.ranges: dict[str, tuple[int, int]] = {}
+        self.lock = threading.Lock()
+
+    def reserve(self, table: str) -> int:
+        # A single UPDATE, the bot and the scheduler may reserve at the same time
+        with get_engine().begin() as conn:
+            conn.execute(insert(id_blocks).prefix_with("OR IGNORE"), {"table_name": table, "next_id": 1})
+            end = conn.execute(
+                text(
+                    "UPDATE id_blocks SET next_id = next_id + :block "
+                    "WHERE table_name = :table RETURNING next_id"
+                ),
+                {"block": self.block, "table": table},
+            ).scalar_one()
+        return end - self.block
+
+    def next(self, table: str) -> int:
+        with self.lock:
+            start, end = self.ranges.get(table, (0, 0))
+            if start >= end:
+                start = self.reserve(table)
+                end = start + self.block
+            self.ranges[table] = (start + 1, end)
+            return start
+
+
+allocator = IdAllocator()
+
+
+def _assign_id(mapper, _connection, target):
+    if target.id is None:
+        target.id = allocator.next(mapper.local_table.name)
+
+
+def _assign_ids(session, _flush_context, _instances):
+    # Before the flush writes anything: a block is reserved in the catalog, a
+    # flush into the catalog that inserted a row would hold it locked. Rows
+    # added by later before_flush listeners (schedule_changes, in the shards)
+    # get theirs in before_insert
+    for target in session.new:
+        if isinstance(target, Base):
+            _assign_id(object_mapper(target), None, target)
+
+
+def init_catalog():
+    """Create the catalog and give every new row an id from it."""
+    os.makedirs(SHARDS_DIR, exist_ok=True)
+    Base.metadata.create_all(get_engine())
+    catalog_metadata.create_all(get_engine())
+    if not event.contains(Session, "before_flush", _assign_ids):
+        event.listen(Session, "before_flush", _assign_ids)
+        event.listen(Base, "before_insert", _assign_id, propagate=True)
+
+
+_ready: set[int] = set()
+
+
+def engine_for(executor_id: int | None) -> Engine:
+    """Database with the schedule of an executor, without sharding the only one."""
+    if not SHARDS_DIR or executor_id is None:
+        return get_engine()
+    engine = open_engine(f"sqlite:///{shard_path(executor_id, SHARDS_DIR)}")
+    if executor_id not in _ready:
+        # An executor added after the split gets its file on first use
+        Base.metadata.create_all(engine)
+        with Session(get_engine()) as catalog, Session(engine) as shard:
+            executor = catalog.get(Executor, executor_id)
+            if executor is not None and shard.get(Executor, executor_id) is None:
+                shard.add(
+                    Executor(id=executor.id, code=executor.code, telegram_id=executor.telegram_id)
+                )
+                shard.commit()
+        _ready.add(executor_id)
+    return engine
+
+
+def shard_engines() -> list[Engine]:
+    """Every database with schedules: the shards, or the combined one."""
+    if not SHARDS_DIR:
+        return [get_engine()]
+    with Session(get_engine()) as catalog:
+        executor_ids = [i for (i,) in catalog.query(Executor.id).order_by(Executor.id)]
+    return [engine_for(executor_id) for executor_id in executor_ids]
+
+
+# telegram id -> executor id, users move from the catalog to a shard and leave
+# it only when deleted
+_routes: dict[int, int] = {}
+
+
+def route(telegram_id: int) -> Engine:
+    """Database to open for an update from this user."""
+    if not SHARDS_DIR:
+        return get_engine()
+    executor_id = _routes.get(telegram_id)
+    if executor_id is None:
+        with get_engine().connect() as conn:
+            executor_id = conn.execute(
+                select(user_shards.c.executor_id).where(
+                    user_shards.c.telegram_id == telegram_id
+                )
+            ).scalar()
+        if executor_id is not None:
+            _routes[telegram_id] = executor_id
+    return engine_for(executor_id)
+
+
+def adopt(telegram_id: int):
+    """Move a user who joined a teacher from the catalog to the teacher's shard."""
+    if not SHARDS_DIR or telegram_id in _routes:
+        return
+    catalog = get_engine()
+    with catalog.connect() as conn:
+        user = conn.execute(
+            select(User.__table__).where(User.telegram_id == telegram_id)
+        ).mappings().first()
+        if user is None or user["executor_id"] is None:
+            return
+        settings = conn.execute(
+            select(NotificationSetting.__table__).where(
+                NotificationSetting.user_id == user["id"]
+            )
+        ).mappings().all()
+    # Shard first: after a crash in between the user is adopted again
+    with engine_for(user["executor_id"]).begin() as conn:
+        conn.execute(insert(User.__table__).prefix_with("OR REPLACE"), [dict(user)])
+        if settings:
+            conn.execute(
+                insert(NotificationSetting.__table__).prefix_with("OR REPLACE"),
+                [dict(s) for s in settings],
+            )
+    with catalog.begin() as conn:
+        conn.execute(
+            insert(user_shards).prefix_with("OR REPLACE"),
+            {"telegram_id": telegram_id, "user_id": user["id"], "executor_id": user["executor_id"]},
+        )
+        conn.execute(delete(NotificationSetting.__table__).where(NotificationSetting.user_id == user["id"]))
+        conn.execute(delete(User.__table__).where(User.id == user["id"]))
+    _routes[telegram_id] = user["executor_id"]
+    logger.info(f"User {user['id']} moved to the shard of executor {user['executor_id']}")
+
+
+def forget(telegram_id: int):
+    """Drop the route of a deleted user, a new /start registers in the catalog again."""
+    if not SHARDS_DIR:
+        return
+    with get_engine().begin() as conn:
+        conn.execute(delete(user_shards).where(user_shards.c.telegram_id == telegram_id))
+    _routes.pop(telegram_id, None)
+
+
+def _create_schema(path: str, *metadata: MetaData):
+    engine = create_engine(f"sqlite:///{path}")
+    for m in metadata:
+        m.create_all(engine)
+    engine.dispose()
+
+
+def _copy(conn: sqlite3.Connection, table: str, where: str, params: dict, verb="INSERT"):
+    columns = ", ".join(f'"{c.name}"' for c in Base.metadata.tables[table].columns)
+    conn.execute(
+        f"{verb} INTO main.{table} ({columns}) SELECT {columns} FROM src.{table} WHERE {where}",
+        params,
+    )
+
+
+def _ids(paths: list[str], table: str) -> set[int]:
+    ids = set()
+    for path in paths:
+        with sqlite3.connect(path) as conn:
+            ids.update(i for (i,) in conn.execute(f"SELECT id FROM {table}"))
+    return ids
+
+
+def _verify(source: list[str], target: list[str]) -> dict[str, int]:
+    """Every table holds the same rows (by id) on both sides."""
+    counts = {}
+    for table in Base.metadata.tables:
+        before, after = _ids(source, table), _ids(target, table)
+        if before != after:
+            raise ValueError(
+                f"{table}: {len(before - after)} rows lost, {len(after - before)} rows appeared"
+            )
+        counts[table] = len(after)
+    return counts
+
+
+def split(source: str, directory: str) -> dict[str, int]:
+    """Shards and a catalog in `directory` from a combined database."""
+    missing = set(Base.metadata.tables) - set(SHARD_ROWS) - set(CATALOG_ROWS)
+    if missing:
+        raise ValueError(f"No shard rule for {', '.join(sorted(missing))}")
+    os.makedirs(directory, exist_ok=True)
+    if os.listdir(directory):
+        raise FileExistsError(f"{directory} is not empty")
+    tables = [t.name for t in Base.metadata.sorted_tables]
+
+    catalog = os.path.join(directory, CATALOG_DB)
+    _create_schema(catalog, Base.metadata, catalog_metadata)
+    conn = sqlite3.connect(catalog)
+    conn.execute("ATTACH DATABASE ? AS src", (source,))
+    for table in tables:
+        if table in CATALOG_ROWS:
+            _copy(conn, table, CATALOG_ROWS[table], {})
+    conn.execute(
+        "INSERT INTO user_shards (telegram_id, user_id, executor_id) "
+        "SELECT telegram_id, id, executor_id FROM src.users "
+        "WHERE executor_id IS NOT NULL AND telegram_id IS NOT NULL"
+    )
+    for table in tables:
+        conn.execute(
+            f"INSERT INTO id_blocks (table_name, next_id) "
+            f"SELECT ?, coalesce(max(id), 0) + 1 FROM src.{table}",
+            (table,),
+        )
+    executor_ids = [i for (i,) in conn.execute("SELECT id FROM src.executors ORDER BY id")]
+    conn.commit()
+    conn.close()
+
+    shards = []
+    for executor_id in executor_ids:
+        path = shard_path(executor_id, directory)
+        _create_schema(path, Base.metadata)
+        conn = sqlite3.connect(path)
+        conn.execute("ATTACH DATABASE ? AS src", (source,))
+        for table in tables:
+            if table in SHARD_ROWS:
+                _copy(conn, table, SHARD_ROWS[table], {"executor_id": executor_id})
+        conn.commit()
+        conn.close()
+        shards.append(path)
+    return _verify([source], [catalog, *shards])
+
+
+def merge(directory: str, target: str) -> dict[str, int]:
+    """One combined database from the catalog and the shards in `directory`."""
+    if os.path.exists(target):
+        raise FileExistsError(f"{target} exists")
+    sources = [os.path.join(directory, CATALOG_DB)] + sorted(
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if name.startswith("executor_") and name.endswith(".sqlite")
+    )
+    _create_schema(target, Base.metadata)
+    conn = sqlite3.connect(target)
+    for path in sources:
+        conn.execute("ATTACH DATABASE ? AS src", (path,))
+        for table in Base.metadata.sorted_tables:
+            verb = "INSERT OR IGNORE" if table.name in SHARED_TABLES else "INSERT"
+            _copy(conn, table.name, "1", {}, verb)
+        conn.commit()
+        conn.execute("DETACH DATABASE src")
+    conn.close()
+    return _verify(sources, [target])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split the database by executor or merge it back.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    split_parser = commands.add_parser("split", help="combined database -> shards")
+    split_parser.add_argument("source")
+    split_parser.add_argument("directory")
+    merge_parser = commands.add_parser("merge", help="shards -> combined database")
+    merge_parser.add_argument("directory")
+    merge_parser.add_argument("target")
+    args = parser.parse_args()
+
+    if args.command == "split":
+        counts = split(args.source, args.directory)
+    else:
+        counts = merge(args.directory, args.target)
+    for table, rows in counts.items():
+        print(f"{table:<24} {rows:>9} rows")
+
+
+if __name__ == "__main__":
+    main()
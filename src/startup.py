@@ -0,0 +1,64 @@
+import os
+import time
+
+from aiogram import BaseMiddleware, Dispatcher
+
+from core import logs
+from logger import logger
+
+
+def process_age() -> float:
+    """Seconds since the interpreter was started, 0 where /proc is not available."""
+    try:
+        with open("/proc/self/stat") as f:
+            # The command may contain spaces, fields are counted after it
+            fields = f.read().rsplit(")", 1)[1].split()
+        started = int(fields[19]) / os.sysconf("SC_CLK_TCK")
+        return max(time.clock_gettime(time.CLOCK_BOOTTIME) - started, 0.0)
+    except (OSError, IndexError, ValueError, AttributeError):
+        return 0.0
+
+
+class StartupReport:
+    """
+    Wall-clock of the startup phases of an entry point, logged as one line.
+
+    The first phase ends at the first `mark` and covers the interpreter start
+    and the imports of the entry point.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.perf_counter() - process_age()
+        self.last = self.started
+        self.phases: list[tuple[str, float]] = []
+
+    def mark(self, phase: str):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def log(self):
+        phases = ", ".join(f"{name} {seconds:.3f}s" for name, seconds in self.phases)
+        logger.info(logs.STARTUP_REPORT, self.name, self.last - self.started, phases)
+
+
+class FirstUpdateMiddleware(BaseMiddleware):
+    """Logs the time from process start to the first handled update, then removes itself."""
+
+    def __init__(self, report: StartupReport, dp: Dispatcher):
+        self.report = report
+        self.middlewares = dp.update.outer_middleware
+        self.middlewares.register(self)
+
+    async def __call__(self, handler, event, data):
+        try:
+            return await handler(event, data)
+        finally:
+            if self in self.middlewares:
+                self.middlewares.unregister(self)
+                logger.info(logs.FIRST_UPDATE, self.report.elapsed)
@@ -0,0 +1,201 @@
+import asyncio
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from datetime import time as dt_time
+from typing import Any
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import (
+    BaseStorage,
+    DefaultKeyBuilder,
+    KeyBuilder,
+    StateType,
+    StorageKey,
+)
+
+from src.core.config import FSM_CACHE_SIZE, FSM_DB, FSM_PURGE_INTERVAL, FSM_TTL
+
+
+def _encode(value: Any):
+    # datetime is a subclass of date, check it first
+    if isinstance(value, datetime):
+        return {"$dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"$d": value.isoformat()}
+    if isinstance(value, dt_time):
+        return {"$t": value.isoformat()}
+    raise TypeError(f"{type(value).__name__} can't be stored in FSM data")
+
+
+def _decode(obj: dict):
+    if len(obj) == 1:
+        ((tag, value),) = obj.items()
+        if tag == "$dt":
+            return datetime.fromisoformat(value)
+        if tag == "$d":
+            return date.fromisoformat(value)
+        if tag == "$t":
+            return dt_time.fromisoformat(value)
+    return obj
+
+
+def dumps(data: dict[str, Any]) -> str:
+    """Compact JSON, dates and times (`day`, chosen slots) keep their type."""
+    return json.dumps(data, default=_encode, separators=(",", ":"), ensure_ascii=False)
+
+
+def loads(raw: str | None) -> dict[str, Any]:
+    return json.loads(raw, object_hook=_decode) if raw else {}
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    FSM storage in its own SQLite file, so half-finished dialogs survive a deploy.
+
+    Reads are served from a write-through in-memory cache of the
+    `cache_size` most recently used chats, chats without a dialog included so
+    their updates skip the database too. Records untouched for longer than
+    `ttl` are treated as empty and purged. The cache is per process: with
+    several workers either route each chat to one worker or pass `cache=False`.
+
+    The database is called synchronously from the event loop. A cache miss is
+    a primary key lookup and a write an upsert in WAL mode without fsync, both
+    well under a millisecond on a local file, cheaper than handing every call
+    to a thread. A slow disk stalls every chat for that long.
+    """
+
+    def __init__(
+        self,
+        path: str = FSM_DB,
+        ttl: float = FSM_TTL.total_seconds(),
+        key_builder: KeyBuilder | None = None,
+        cache: bool = True,
+        cache_size: int = FSM_CACHE_SIZE,
+    ):
+        self.ttl = ttl
+        self.key_builder = key_builder or DefaultKeyBuilder(
+            with_bot_id=True, with_destiny=True
+        )
+        self.use_cache = cache
+        self.cache_size = cache_size
+        self.cache: OrderedDict[str, tuple[str | None, dict[str, Any], float]] = (
+            OrderedDict()
+        )
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(path, isolation_level=None)
+        self.conn.execute("pragma journal_mode=wal")
+        self.conn.execute("pragma synchronous=normal")
+        self.conn.execute("""
+            create table if not exists fsm (
+                key text primary key,
+                state text,
+                data text,
+                updated_at real not null
+            )
+        """)
+        self.conn.execute("""
+            create table if not exists updates (
+                bot_id integer primary key,
+                update_id integer not null
+            )
+        """)
+
+    def _load(self, key: str):
+        now = time.time()
+        record = self.cache.get(key) if self.use_cache else None
+        if record is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            row = self.conn.execute(
+                "select state, data, updated_at from fsm where key = ?", (key,)
+            ).fetchone()
+            record = (row[0], loads(row[1]), row[2]) if row else (None, {}, now)
+        if now - record[2] > self.ttl:
+            self._save(key, None, {})
+            return None, {}
+        if self.use_cache:
+            self._remember(key, record)
+        return record[0], record[1]
+
+    def _remember(self, key: str, record: tuple[str | None, dict[str, Any], float]):
+        self.cache[key] = record
+        self.cache.move_to_end(key)
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def _save(self, key: str, state: str | None, data: dict[str, Any]):
+        if state is None and not data:
+            self.conn.execute("delete from fsm where key = ?", (key,))
+            self.cache.pop(key, None)
+            return
+        now = time.time()
+        self.conn.execute(
+            """
+            insert into fsm (key, state, data, updated_at) values (?, ?, ?, ?)
+            on conflict (key) do update set
+                state = excluded.state,
+                data = excluded.data,
+                updated_at = excluded.updated_at
+            """,
+            (key, state, dumps(data), now),
+        )
+        if self.use_cache:
+            self._remember(key, (state, data, now))
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        storage_key = self.key_builder.build(key)
+        _, data = self._load(storage_key)
+        state = state.state if isinstance(state, State) else state
+        self._save(storage_key, state, data)
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        state, _ = self._load(self.key_builder.build(key))
+        return state
+
+    async def set_data(self, key: StorageKey, data: dict[str, Any]) -> None:
+        storage_key = self.key_builder.build(key)
+        state, _ = self._load(storage_key)
+        self._save(storage_key, state, data.copy())
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        _, data = self._load(self.key_builder.build(key))
+        return data.copy()
+
+    def last_update_id(self, bot_id: int) -> int:
+        """The update every earlier update of `bot_id` was handled up to, 0 if none."""
+        row = self.conn.execute(
+            "select update_id from updates where bot_id = ?", (bot_id,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def save_update_id(self, bot_id: int, update_id: int):
+        self.conn.execute(
+            """
+            insert into updates (bot_id, update_id) values (?, ?)
+            on conflict (bot_id) do update set update_id = excluded.update_id
+            """,
+            (bot_id, update_id),
+        )
+
+    def purge(self):
+        """Drop conversations that expired, on startup and every purge interval."""
+        expired_before = time.time() - self.ttl
+        self.conn.execute("delete from fsm where updated_at < ?", (expired_before,))
+        self.cache = OrderedDict(
+            (k, v) for k, v in self.cache.items() if v[2] >= expired_before
+        )
+
+    async def purge_periodically(
+        self, interval: float = FSM_PURGE_INTERVAL.total_seconds()
+    ) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            self.purge()
+
+    async def close(self) -> None:
+        self.conn.close()
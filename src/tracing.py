@@ -0,0 +1,321 @@
+"""
+Lightweight tracing: a trace per update or job with child spans.
+
+Off unless TRACING=1. Spans are kept in memory while the trace runs and
+written out when its root span ends, one JSON line per trace in a rotating
+file of the process, db/traces-bot.jsonl or db/traces-scheduler.jsonl. When
+OTEL_EXPORTER_OTLP_ENDPOINT is set and opentelemetry-sdk is installed they go
+to the OTLP collector instead. A span per SQL statement is costly, TRACE_SQL=1
+adds them.
+
+    python -m src.tracing --top 10
+"""
+
+import argparse
+import functools
+import json
+import logging
+import os
+import sys
+import time
+from collections.abc import Callable
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from sqlalchemy import Engine, event
+
+TRACING = os.environ.get("TRACING", "0") not in ("", "0")
+TRACE_SQL = os.environ.get("TRACE_SQL", "0") not in ("", "0")
+# RotatingFileHandler can't share a file between processes, one file per process
+TRACES_DIR = os.environ.get("TRACES_DIR", "db")
+TRACES_PROCESSES = ("bot", "scheduler")
+TRACES_MAX_BYTES = 10 * 1024 * 1024
+TRACES_BACKUPS = 3
+
+
+@dataclass
+class Span:
+    name: str
+    kind: str
+    span_id: str
+    parent_id: str | None
+    start: float
+    duration: float = 0.0
+    attrs: dict = field(default_factory=dict)
+
+
+@dataclass
+class Trace:
+    trace_id: str
+    spans: list[Span] = field(default_factory=list)
+
+
+# Trace of the current task and its innermost open span
+_current: ContextVar[tuple[Trace, Span] | None] = ContextVar("trace", default=None)
+
+
+def _new_id(size: int) -> str:
+    return os.urandom(size).hex()
+
+
+@contextmanager
+def span(name: str, kind: str = "internal", **attrs):
+    """Child span of the current one, or the root span of a new trace."""
+    current = _current.get()
+    if current is None:
+        trace, parent_id = Trace(_new_id(16)), None
+    else:
+        trace, parent_id = current[0], current[1].span_id
+    opened = Span(name, kind, _new_id(8), parent_id, time.time(), attrs=attrs)
+    token = _current.set((trace, opened))
+    started = time.perf_counter()
+    try:
+        yield opened
+    except Exception as e:
+        opened.attrs["error"] = repr(e)
+        raise
+    finally:
+        opened.duration = time.perf_counter() - started
+        _current.reset(token)
+        trace.spans.append(opened)
+        if parent_id is None and exporter is not None:
+            exporter.export(trace)
+
+
+def in_trace() -> bool:
+    return _current.get() is not None
+
+
+class JsonlExporter:
+    """One line per trace: the root span and the flat list of its children."""
+
+    def __init__(self, path: str):
+        self.log = logging.getLogger("traces")
+        self.log.propagate = False
+        self.log.setLevel(logging.INFO)
+        if not self.log.handlers:
+            self.log.addHandler(
+                RotatingFileHandler(
+                    path, maxBytes=TRACES_MAX_BYTES, backupCount=TRACES_BACKUPS
+                )
+            )
+
+    def export(self, trace: Trace):
+        root = trace.spans[-1]
+        record = {
+            "trace_id": trace.trace_id,
+            "name": root.name,
+            "kind": root.kind,
+            "start": datetime.fromtimestamp(root.start).isoformat(),
+            "duration_ms": round(root.duration * 1000, 3),
+            "attrs": root.attrs,
+            "spans": [
+                {
+                    "id": s.span_id,
+                    "parent": s.parent_id,
+                    "name": s.name,
+                    "kind": s.kind,
+                    "offset_ms": round((s.start - root.start) * 1000, 3),
+                    "duration_ms": round(s.duration * 1000, 3),
+                    "attrs": s.attrs,
+                }
+                for s in trace.spans[:-1]
+            ],
+        }
+        self.log.info(json.dumps(record, ensure_ascii=False, default=str))
+
+
+class OtlpExporter:
+    """Replays finished spans into the OpenTelemetry SDK with their real timings."""
+
+    def __init__(self):
+        from opentelemetry import trace
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import (
+            OTLPSpanExporter,
+        )
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+        provider = TracerProvider(
+            resource=Resource.create({"service.name": "online-lesson-manager"})
+        )
+        provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+        self.otel = trace
+        self.tracer = provider.get_tracer(__name__)
+
+    def export(self, trace: Trace):
+        children: dict[str | None, list[Span]] = {}
+        for s in trace.spans:
+            children.setdefault(s.parent_id, []).append(s)
+
+        def emit(s: Span, context):
+            started = int(s.start * 1e9)
+            otel_span = self.tracer.start_span(
+                s.name, context=context, start_time=started, attributes=s.attrs
+            )
+            otel_span.set_attribute("kind", s.kind)
+            for child in children.get(s.span_id, []):
+                emit(child, self.otel.set_span_in_context(otel_span))
+            otel_span.end(end_time=started + int(s.duration * 1e9))
+
+        for root in children.get(None, []):
+            emit(root, None)
+
+
+exporter: JsonlExporter | OtlpExporter | None = None
+
+
+def _sql_start(conn, _cursor, statement, _parameters, _context, _many):
+    if in_trace():
+        manager = span("sql", "sql", statement=" ".join(statement.split())[:300])
+        manager.__enter__()
+        conn.info.setdefault("trace_spans", []).append(manager)
+
+
+def _sql_end(conn, _cursor, _statement, _parameters, _context, _many):
+    spans = conn.info.get("trace_spans")
+    if spans:
+        spans.pop().__exit__(None, None, None)
+
+
+def _sql_error(context):
+    spans = context.connection.info.get("trace_spans") if context.connection else None
+    if spans:
+        error = context.original_exception
+        spans.pop().__exit__(type(error), error, error.__traceback__)
+
+
+def trace_methods(cls: type) -> type:
+    """Span for every public method of a repository, only inside a trace."""
+
+    def wrap(method: Callable, name: str):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            if not in_trace():
+                return method(*args, **kwargs)
+            with span(name, "repository"):
+                return method(*args, **kwargs)
+
+        return wrapper
+
+    for attr, value in list(vars(cls).items()):
+        if not attr.startswith("_") and callable(value):
+            setattr(cls, attr, wrap(value, f"{cls.__name__}.{attr}"))
+    return cls
+
+
+class TracingMiddleware(BaseMiddleware):
+    """Root span of an update, named after the scene and handler."""
+
+    async def __call__(self, handler, event, data):
+        callback = data["handler"].callback
+        name = f"{callback.__module__.rsplit('.', 1)[-1]}.{callback.__name__}"
+        user = getattr(event, "from_user", None)
+        with span(name, "update", user_id=user.id if user else None):
+            return await handler(event, data)
+
+
+class RequestTracingMiddleware(BaseRequestMiddleware):
+    """Span for every outbound Telegram call made inside a trace."""
+
+    async def __call__(self, make_request, bot, method):
+        if not in_trace():
+            return await make_request(bot, method)
+        with span(f"telegram.{method.__api_method__}", "http"):
+            return await make_request(bot, method)
+
+
+def traces_file(process: str) -> str:
+    return os.path.join(TRACES_DIR, f"traces-{process}.jsonl")
+
+
+def setup_tracing(process: str, *repositories: type):
+    """
+    Pick the exporter and hook repository spans, no-op without TRACING=1.
+
+    `process` names the traces file. SQL spans with TRACE_SQL=1 are hooked on
+    every engine, with DB_SHARDS_DIR they are opened later.
+    """
+    global exporter
+    if not TRACING or exporter is not None:
+        return
+    if os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT"):
+        try:
+            exporter = OtlpExporter()
+        except ImportError:
+            exporter = JsonlExporter(traces_file(process))
+    else:
+        exporter = JsonlExporter(traces_file(process))
+    if TRACE_SQL:
+        event.listen(Engine, "before_cursor_execute", _sql_start)
+        event.listen(Engine, "after_cursor_execute", _sql_end)
+        event.listen(Engine, "handle_error", _sql_error)
+    for repository in repositories:
+        trace_methods(repository)
+
+
+def read_traces(path: str):
+    for name in [f"{path}.{i}" for i in range(TRACES_BACKUPS, 0, -1)] + [path]:
+        if os.path.exists(name):
+            with open(name, encoding="utf-8") as f:
+                for line in f:
+                    yield json.loads(line)
+
+
+def breakdown(trace: dict, out=sys.stdout):
+    """Span tree of a trace, SQL statements are summed up under their parent."""
+    children: dict[str | None, list[dict]] = {}
+    for s in trace["spans"]:
+        children.setdefault(s["parent"], []).append(s)
+
+    def show(parent_id, depth):
+        sql = [s for s in children.get(parent_id, []) if s["kind"] == "sql"]
+        if sql:
+            total = sum(s["duration_ms"] for s in sql)
+            out.write(f"{'  ' * depth}sql x{len(sql)} {total:.1f} ms\n")
+        for s in children.get(parent_id, []):
+            if s["kind"] != "sql":
+                out.write(f"{'  ' * depth}{s['name']} {s['duration_ms']:.1f} ms\n")
+                show(s["id"], depth + 1)
+
+    out.write(
+        f"{trace['duration_ms']:.1f} ms  {trace['name']}  {trace['start']}"
+        f"  {trace['trace_id']}\n"
+    )
+    root_ids = {s["parent"] for s in trace["spans"]} - {s["id"] for s in trace["spans"]}
+    for root_id in root_ids:
+        show(root_id, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Slowest traces and where the time went.")
+    parser.add_argument(
+        "--file",
+        action="append",
+        help="traces file, repeatable, the bot and scheduler files by default",
+    )
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--name", help="only traces whose name contains this")
+    args = parser.parse_args()
+
+    files = args.file or [traces_file(process) for process in TRACES_PROCESSES]
+    traces = [
+        t
+        for path in files
+        for t in read_traces(path)
+        if not args.name or args.name in t["name"]
+    ]
+    traces.sort(key=lambda t: t["duration_ms"], reverse=True)
+    for trace in traces[: args.top]:
+        breakdown(trace)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,14 @@
 from datetime import datetime, time, timedelta
-from os import getenv
 
-import aiohttp
-from aiogram.types import CallbackQuery, Message
+from aiogram.exceptions import TelegramAPIError, TelegramBadRequest
+from aiogram.types import CallbackQuery, InlineKeyboardMarkup, Message
 
-from src.core.config import SHORT_DATE_FMT, TIME_FMT
+from logger import logger
+from src import clock
+from src.bot import get_bot
+from src.callbacks import expand
+from src.core import logs
+from src.core.config import SHORT_DATE_FMT, TIME_FMT, TIMEZONE
 from src.models import Event, RecurrentEvent, User
 
 MAX_HOUR = 23
@@ -29,6 +33,11 @@ def telegram_checks(event: Message | CallbackQuery):
     return event.message
 
 
+def local_now() -> datetime:
+    """Naive wall-clock time in the bot's timezone, lessons are stored this way."""
+    return clock.now(TIMEZONE)
+
+
 def parse_date(text: str, in_future=False):
     for fmt in (
         SHORT_DATE_FMT,
@@ -42,7 +51,7 @@ def parse_date(text: str, in_future=False):
             date = datetime.strptime(text, fmt)
         except ValueError:
             continue
-        now = datetime.now()
+        now = clock.now()
         if date.year < now.year:
             if in_future and date.replace(year=now.year) <= now:
                 return date.replace(year=now.year + 1)
@@ -62,7 +71,7 @@ def parse_time(text: str):
 
 
 def get_callback_arg(callback_data: str, callback: str):
-    return callback_data.replace(callback, "")
+    return expand(callback_data).removeprefix(callback)
 
 
 def calc_end_time(time: time):
@@ -76,13 +85,33 @@ def calc_end_time(time: time):
 
 async def send_message(telegram_id: int, message: str) -> None:
     """Send a message to the user."""
-    token = getenv("BOT_TOKEN")
-    message = message.replace("\n", "%0A")
-    url = f"https://api.telegram.org/bot{token}/sendMessage?chat_id={telegram_id}&text={message}&parse_mode=HTML"
-    async with aiohttp.ClientSession() as session, session.get(url) as resp:
-        response = await resp.text()
-    if '"ok":false' in response:
-        print(f"tg_id:{telegram_id}\nmessage:{message}\nresponse:{response}")
+    try:
+        await get_bot().send_message(telegram_id, message)
+    except TelegramAPIError as e:
+        logger.warning(logs.MESSAGE_NOT_SENT, telegram_id, e)
+
+
+async def respond(
+    event: Message | CallbackQuery,
+    text: str,
+    reply_markup: InlineKeyboardMarkup | None = None,
+) -> Message | bool:
+    """
+    Answer a message, or edit the message of a tapped button in place.
+
+    Paging and pickers cost one editMessageText per tap instead of a new
+    message, their old keyboard can't be tapped again. A message Telegram
+    won't edit any more (too old, a photo) gets a new answer.
+    """
+    message = telegram_checks(event)
+    if isinstance(event, CallbackQuery):
+        try:
+            return await message.edit_text(text, reply_markup=reply_markup)
+        except TelegramBadRequest as e:
+            # The same page tapped twice
+            if "message is not modified" in e.message:
+                return message
+    return await message.answer(text, reply_markup=reply_markup)
 
 
 def day_schedule_text(lessons: list, users_map: dict, user: User):
@@ -0,0 +1,41 @@
+import asyncio
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+from core.config import WebhookConfig
+from logger import logger
+
+
+async def health(_request: web.Request) -> web.Response:
+    return web.json_response({"status": "ok"})
+
+
+def create_app(dp: Dispatcher, bot: Bot, config: WebhookConfig) -> web.Application:
+    """Updates are accepted only with the secret token Telegram was given."""
+    app = web.Application()
+    app.router.add_get("/health", health)
+    SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=config.secret).register(
+        app, path=config.path
+    )
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot, config: WebhookConfig):
+    async def set_webhook(bot: Bot):
+        await bot.set_webhook(
+            config.url.rstrip("/") + config.path,
+            secret_token=config.secret,
+        )
+
+    dp.startup.register(set_webhook)
+    runner = web.AppRunner(create_app(dp, bot, config))
+    await runner.setup()
+    await web.TCPSite(runner, config.host, config.port).start()
+    logger.info(f"Webhook server listening on {config.host}:{config.port}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
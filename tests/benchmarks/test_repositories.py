@@ -0,0 +1,118 @@
+"""
+EventRepo, schedule rendering and notification benchmarks on the dataset of
+tests/conftest.py. With the rest of the suite every case runs once as a plain
+test, to measure them:
+
+    poetry run pytest tests/benchmarks --benchmark-enable --benchmark-autosave
+    poetry run pytest tests/benchmarks --benchmark-enable --benchmark-compare
+
+The SQL statements of a call are kept in the `statements` extra info.
+"""
+
+import asyncio
+import socket
+from datetime import datetime, time, timedelta
+
+import pytest
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+import database
+from benchmarks.fake_api import FakeTelegramAPI
+from src.models import JobRun, User
+from src.querywatch import watch
+from src.repositories import EventRepo
+from src.routers.lessons.week_schedule import week_schedule_text
+from tests.conftest import TODAY
+
+# A working day of the next week, so there are lessons and cancellations
+DAY = TODAY + timedelta(days=8)
+CASES = {
+    "day_schedule": lambda repo, ex, student, teacher: repo.day_schedule(ex, DAY),
+    "day_schedule_student": (
+        lambda repo, ex, student, teacher: repo.day_schedule(ex, DAY, student.id)
+    ),
+    "available_time": lambda repo, ex, student, teacher: repo.available_time(ex, DAY),
+    "available_weekdays": lambda repo, ex, student, teacher: repo.available_weekdays(ex),
+    "available_time_weekday": (
+        lambda repo, ex, student, teacher: repo.available_time_weekday(ex, 2)
+    ),
+    "overlaps": lambda repo, ex, student, teacher: repo.overlaps(ex),
+    "all_user_lessons": lambda repo, ex, student, teacher: repo.all_user_lessons(student),
+    "week_render_teacher": lambda repo, ex, student, teacher: week_schedule_text(
+        repo.db, teacher, datetime.combine(DAY, time())
+    ),
+    "week_render_student": lambda repo, ex, student, teacher: week_schedule_text(
+        repo.db, student, datetime.combine(DAY, time())
+    ),
+}
+
+
+def count_statements(benchmark, func):
+    with watch("benchmark") as log:
+        func()
+    benchmark.extra_info["statements"] = log.statements
+
+
+@pytest.mark.usefixtures("frozen_clock")
+@pytest.mark.parametrize("name", CASES)
+def test_event_repo(benchmark, name, engine, executor_id, student_id):
+    with Session(engine) as db:
+        student = db.get(User, student_id)
+        teacher = db.scalars(
+            select(User).where(
+                User.executor_id == executor_id, User.role == User.Roles.TEACHER
+            )
+        ).first()
+        repo = EventRepo(db)
+
+        def call():
+            return CASES[name](repo, executor_id, student, teacher)
+
+        count_statements(benchmark, call)
+        benchmark(call)
+
+
+@pytest.fixture
+def telegram_api(monkeypatch):
+    """Fake Bot API on a free port and the bot pointed at it."""
+    from src.bot import close_bot
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    loop = asyncio.new_event_loop()
+    api = FakeTelegramAPI(port=port)
+    loop.run_until_complete(api.start())
+    monkeypatch.setenv("BOT_TOKEN", "42:benchmark")
+    monkeypatch.setenv("TELEGRAM_API_URL", api.base_url)
+    yield loop, api
+    loop.run_until_complete(close_bot())
+    loop.run_until_complete(api.stop())
+    loop.close()
+
+
+def test_send_notifications(benchmark, engine, monkeypatch, telegram_api):
+    """send_notifications for every due user, the fake API answers the messages."""
+    from scheduler import send_notifications
+
+    # The scheduler and the shards open DATABASE_URL, the dataset stands in
+    monkeypatch.setitem(database._engines, database.DATABASE_URL, engine)
+    # Before 10:00 custom notification times (07:00-10:00) and the default are due
+    now = datetime.combine(TODAY, time(9, 30))
+
+    def clear_runs():
+        with Session(engine) as db:
+            db.execute(delete(JobRun))
+            db.commit()
+
+    loop, api = telegram_api
+
+    def run():
+        loop.run_until_complete(send_notifications(now))
+
+    clear_runs()
+    count_statements(benchmark, run)
+    benchmark.pedantic(run, setup=clear_runs, rounds=3)
+    clear_runs()
+    assert api.calls.get("sendMessage")
@@ -0,0 +1,55 @@
+import os
+from datetime import date, datetime, time
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from benchmarks.dataset import generate
+from src import clock
+from src.models import Base, Executor, User
+
+pytest_plugins = ["src.querywatch"]
+
+# A Monday, the generated lessons and the frozen clock both start from it
+TODAY = date(2025, 1, 6)
+# e.g. postgresql+psycopg://localhost/olm_test, its tables are dropped
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL", "")
+
+
+@pytest.fixture(scope="session")
+def engine(tmp_path_factory):
+    """benchmarks.dataset database: one executor with 20 students."""
+    if TEST_DATABASE_URL:
+        url = TEST_DATABASE_URL
+        stale = create_engine(url)
+        Base.metadata.drop_all(stale)
+        stale.dispose()
+    else:
+        url = f"sqlite:///{tmp_path_factory.mktemp('db') / 'bench.sqlite'}"
+    generate("", executors=1, students=20, years=1, today=TODAY, url=url)
+    engine = create_engine(url)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def frozen_clock():
+    with clock.frozen(datetime.combine(TODAY, time(8))):
+        yield
+
+
+@pytest.fixture
+def executor_id(engine) -> int:
+    with Session(engine) as db:
+        return db.scalars(select(Executor.id)).first()
+
+
+@pytest.fixture
+def student_id(engine, executor_id) -> int:
+    with Session(engine) as db:
+        return db.scalars(
+            select(User.id).where(
+                User.executor_id == executor_id, User.role == User.Roles.STUDENT
+            )
+        ).first()
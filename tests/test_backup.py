@@ -0,0 +1,34 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+from src.backup import chains, create_backup, restore
+
+TAKEN = datetime(2025, 1, 6, 3, 30)
+
+
+def write(path, value: str):
+    with sqlite3.connect(path) as db:
+        db.execute("CREATE TABLE IF NOT EXISTS notes (text TEXT)")
+        db.execute("INSERT INTO notes VALUES (?)", (value,))
+    db.close()
+
+
+def test_clock_set_back_keeps_the_chain_in_order(tmp_path):
+    source, directory = tmp_path / "db.sqlite", tmp_path / "backups"
+    for hours, value in ((0, "first"), (6, "second"), (3, "third")):
+        write(source, value)
+        # The last one on another clock, e.g. local time ahead of UTC before
+        create_backup(str(source), str(directory), TAKEN + timedelta(hours=hours))
+
+    names = [p.name.split(".")[0] for chain in chains(str(directory)) for p in chain]
+    assert names == [
+        "2025-01-06_03-30-00_full",
+        "2025-01-06_09-30-00_delta",
+        "2025-01-06_09-30-01_delta",
+    ]
+    restored = tmp_path / "restored.sqlite"
+    restore(str(restored), str(directory))
+    with sqlite3.connect(restored) as db:
+        notes = [text for (text,) in db.execute("SELECT text FROM notes")]
+    db.close()
+    assert notes == ["first", "second", "third"]
@@ -0,0 +1,40 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from middlewares import ChatQueueMiddleware
+
+CHAT = SimpleNamespace(id=1)
+
+
+def test_cancelled_handler_does_not_hang_the_chat():
+    async def scenario():
+        queues = ChatQueueMiddleware()
+        started = asyncio.Event()
+
+        async def stuck(event, data):
+            started.set()
+            await asyncio.sleep(3600)
+
+        async def handled(event, data):
+            return event
+
+        first = asyncio.create_task(queues(stuck, "first", {"event_chat": CHAT}))
+        await started.wait()
+        waiting = asyncio.create_task(queues(handled, "waiting", {"event_chat": CHAT}))
+        await asyncio.sleep(0)
+        for worker in queues.workers:
+            worker.cancel()
+
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        assert queues.queues == {}
+        result = await asyncio.wait_for(
+            queues(handled, "next", {"event_chat": CHAT}), timeout=1
+        )
+        assert result == "next"
+
+    asyncio.run(scenario())
@@ -0,0 +1,21 @@
+from hypothesis import HealthCheck, given, settings
+from hypothesis import strategies as st
+
+from benchmarks.oracle import HypothesisDraw, Oracle, draw_schedule, explain
+from src.engines import ENGINES
+# In-memory SQLite: on a URL the oracle drops the tables of the dataset
+oracle = Oracle(ENGINES["legacy"], ENGINES["indexed"])
+
+
+@settings(
+    max_examples=50,
+    deadline=None,
+    database=None,
+    # Every example loads a database, slower than Hypothesis expects
+    suppress_health_check=[HealthCheck.too_slow, HealthCheck.data_too_large],
+)
+@given(st.data())
+def test_indexed_engine_agrees_with_event_repo(data):
+    schedule = draw_schedule(HypothesisDraw(data))
+    problems = oracle.differences(schedule)
+    assert not problems, explain(schedule, problems)
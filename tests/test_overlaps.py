@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from src.core.config import WEEKDAY_MAP
+from src.models import Event, Executor, RecurrentEvent, User
+from src.repositories import EventRepo
+from tests.conftest import TODAY
+
+
+@pytest.mark.usefixtures("frozen_clock")
+def test_one_off_break_over_a_lesson(engine, executor_id):
+    with Session(engine) as db:
+        executor = db.get(Executor, executor_id)
+        teacher = db.scalars(
+            select(User).where(User.telegram_id == executor.telegram_id)
+        ).one()
+        lesson = db.scalars(
+            select(RecurrentEvent).where(
+                RecurrentEvent.executor_id == executor_id,
+                RecurrentEvent.event_type == RecurrentEvent.EventTypes.LESSON,
+            )
+        ).first()
+        student_tg = db.get(User, lesson.user_id).telegram_id
+        teacher_tg = teacher.telegram_id
+        day = TODAY + timedelta(days=(lesson.start.weekday() - TODAY.weekday()) % 7)
+        start = datetime.combine(day, lesson.start.time())
+        # No recurrent event has the id of the break
+        break_id = db.scalar(select(func.max(RecurrentEvent.id))) + db.scalar(
+            select(func.max(Event.id))
+        )
+        db.add(
+            Event(
+                id=break_id,
+                user_id=teacher.id,
+                executor_id=executor_id,
+                event_type=Event.EventTypes.WORK_BREAK,
+                start=start,
+                end=start + timedelta(minutes=15),
+            )
+        )
+        db.flush()
+
+        repo = EventRepo(db)
+        messages = repo.overlaps_messages(repo.overlaps(executor_id))
+        texts = repo.overlaps_text(repo.overlaps(executor_id))
+        db.rollback()
+
+    weekday = WEEKDAY_MAP[day.weekday()]["long"]
+    row = f"Урок в {start:%H:%M} стоит в перерыв ({weekday})"
+    assert row in messages[student_tg]
+    assert teacher_tg not in messages
+    assert any(
+        text.startswith(f"Урок в {start:%H:%M} у ")
+        and text.endswith(f"стоит в перерыв ({weekday})")
+        for text in texts
+    )
@@ -0,0 +1,64 @@
+from datetime import timedelta
+
+import pytest
+from sqlalchemy.orm import Session
+
+from src.models import User
+from src.querywatch import EVENT_REPO_BUDGETS
+from src.repositories import EventRepo
+from tests.conftest import TODAY
+
+WEEK = [TODAY + timedelta(days=i) for i in range(7)]
+
+# How each budgeted method is called: repo, executor id, a student, a day
+CALLS = {
+    "EventRepo.day_schedule": lambda repo, ex, student, day: repo.day_schedule(ex, day),
+    "EventRepo.events_for_day": lambda repo, ex, student, day: repo.events_for_day(ex, day),
+    "EventRepo.recurrent_events_for_day": (
+        lambda repo, ex, student, day: repo.recurrent_events_for_day(ex, day)
+    ),
+    "EventRepo.available_weekdays": lambda repo, ex, student, day: repo.available_weekdays(ex),
+    "EventRepo.available_time": lambda repo, ex, student, day: repo.available_time(ex, day),
+    "EventRepo.available_time_weekday": (
+        lambda repo, ex, student, day: repo.available_time_weekday(ex, day.weekday())
+    ),
+    "EventRepo.all_user_lessons": (
+        lambda repo, ex, student, day: repo.all_user_lessons(student)
+    ),
+    "EventRepo.work_hours": lambda repo, ex, student, day: repo.work_hours(ex),
+    "EventRepo.weekends": lambda repo, ex, student, day: repo.weekends(ex),
+    "EventRepo.available_work_weekdays": (
+        lambda repo, ex, student, day: repo.available_work_weekdays(ex)
+    ),
+    "EventRepo.vacations": lambda repo, ex, student, day: repo.vacations(student.id),
+    "EventRepo.vacations_day": (
+        lambda repo, ex, student, day: repo.vacations_day(student.id, day)
+    ),
+    "EventRepo.users_on_vacation": (
+        lambda repo, ex, student, day: repo.users_on_vacation([student.id], day)
+    ),
+    "EventRepo.work_breaks": lambda repo, ex, student, day: repo.work_breaks(ex),
+    "EventRepo.overlaps": lambda repo, ex, student, day: repo.overlaps(ex),
+}
+
+
+def test_every_budget_is_checked():
+    assert CALLS.keys() == EVENT_REPO_BUDGETS.keys()
+
+
+@pytest.mark.usefixtures("frozen_clock")
+@pytest.mark.parametrize("name", CALLS)
+@pytest.mark.parametrize("day", WEEK, ids=lambda day: day.strftime("%a"))
+def test_event_repo_budget(name, day, engine, executor_id, student_id, query_budget):
+    # A fresh session per call, the identity map would hide statements
+    with Session(engine) as db:
+        student = db.get(User, student_id)
+        with query_budget(name):
+            CALLS[name](EventRepo(db), executor_id, student, day)
+
+
+@pytest.mark.usefixtures("frozen_clock")
+@pytest.mark.parametrize("day", WEEK, ids=lambda day: day.strftime("%a"))
+def test_student_day_schedule_budget(day, engine, executor_id, student_id, query_budget):
+    with Session(engine) as db, query_budget("EventRepo.day_schedule"):
+        EventRepo(db).day_schedule(executor_id, day, student_id)
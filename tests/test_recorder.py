@@ -0,0 +1,54 @@
+import shutil
+import sqlite3
+
+import pytest
+
+from src.recorder import anonymize_database, anonymous_id
+
+SECRET = "test-secret"
+
+
+def test_no_telegram_id_survives_anonymization(engine, tmp_path):
+    if engine.dialect.name != "sqlite":
+        pytest.skip("anonymize_database copies SQLite files")
+    source, target = tmp_path / "db.sqlite", tmp_path / "replay.sqlite"
+    shutil.copy(engine.url.database, source)
+    with sqlite3.connect(source) as db:
+        users = db.execute(
+            "SELECT telegram_id, full_name, username, role FROM users"
+        ).fetchall()
+        # Rows as UserRepo.register writes them
+        db.executemany(
+            "INSERT INTO event_history (author, scene, event_type, event_value) "
+            "VALUES (?, 'start', 'register', ?)",
+            [
+                (
+                    username,
+                    f"tg_id: {tg_id}, tg_full_name: {full_name}, "
+                    f"tg_username: {username}, role: {role}, executor: executor-0",
+                )
+                for tg_id, full_name, username, role in users
+            ],
+        )
+    db.close()
+
+    anonymize_database(str(source), str(target), SECRET)
+
+    content = target.read_bytes()
+    telegram_ids = {tg_id for tg_id, *_ in users}
+    leaked = [i for i in telegram_ids if str(i).encode() in content]
+    assert not leaked
+    with sqlite3.connect(target) as db:
+        stored = {i for (i,) in db.execute("SELECT telegram_id FROM users")}
+        history = [
+            value
+            for (value,) in db.execute(
+                "SELECT event_value FROM event_history "
+                "WHERE event_type = 'register' AND event_value != ''"
+            )
+        ]
+    db.close()
+    assert not stored & telegram_ids
+    anonymized = {anonymous_id(i, SECRET) for i in telegram_ids}
+    # The keys are masked like any other letters: "xx_xx: <id>, ..."
+    assert {int(v.split(",")[0].split(": ")[1]) for v in history} == anonymized
@@ -0,0 +1,55 @@
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+import database
+from src import shards
+from src.models import Base, Executor, User
+from src.repositories import UserRepo
+
+STUDENT = 555
+
+
+@pytest.fixture
+def sharded(tmp_path, monkeypatch):
+    """DB_SHARDS_DIR in a temporary directory, with a fresh catalog."""
+    database.dispose_engine()
+    monkeypatch.setattr(database, "SHARDS_DIR", str(tmp_path))
+    monkeypatch.setattr(shards, "SHARDS_DIR", str(tmp_path))
+    monkeypatch.setattr(shards, "_routes", {})
+    monkeypatch.setattr(shards, "_ready", set())
+    monkeypatch.setattr(shards, "allocator", shards.IdAllocator())
+    database.init_db()
+    with Session(database.get_engine()) as catalog:
+        executors = [Executor(code=code, telegram_id=i) for i, code in enumerate("ab", 1)]
+        catalog.add_all(executors)
+        catalog.flush()
+        ids = {e.code: e.id for e in executors}
+        catalog.commit()
+    yield ids
+    event.remove(Session, "before_flush", shards._assign_ids)
+    event.remove(Base, "before_insert", shards._assign_id)
+    database.dispose_engine()
+
+
+def register(code: str):
+    """What /start does: register on the routed database, then move to the shard."""
+    with Session(shards.route(STUDENT)) as db:
+        UserRepo(db).register(STUDENT, "Student", "student", User.Roles.STUDENT, code)
+    shards.adopt(STUDENT)
+
+
+def test_register_after_delete_joins_another_executor(sharded):
+    register("a")
+    assert shards.route(STUDENT) is shards.engine_for(sharded["a"])
+
+    with Session(shards.engine_for(sharded["a"])) as db:
+        UserRepo(db).delete(UserRepo(db).get_by_telegram_id(STUDENT).id)
+    assert shards.route(STUDENT) is database.get_engine()
+
+    register("b")
+    assert shards.route(STUDENT) is shards.engine_for(sharded["b"])
+    with Session(shards.engine_for(sharded["b"])) as db:
+        assert UserRepo(db).get_by_telegram_id(STUDENT).executor_id == sharded["b"]
+    with Session(shards.engine_for(sharded["a"])) as db:
+        assert UserRepo(db).get_by_telegram_id(STUDENT) is None
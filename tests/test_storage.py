@@ -0,0 +1,48 @@
+import asyncio
+import time
+
+from aiogram.fsm.storage.base import StorageKey
+
+from src.storage import SQLiteStorage
+
+
+def key(chat_id: int) -> StorageKey:
+    return StorageKey(bot_id=42, chat_id=chat_id, user_id=chat_id)
+
+
+def test_cache_keeps_the_most_recently_used_chats(tmp_path):
+    async def scenario():
+        storage = SQLiteStorage(str(tmp_path / "fsm.sqlite"), cache_size=3)
+        await storage.set_state(key(1), "Dialog:first")
+        for chat_id in range(2, 10):
+            # Chats without a dialog are cached too, the first one stays in use
+            await storage.get_state(key(chat_id))
+            assert await storage.get_state(key(1)) == "Dialog:first"
+        await storage.close()
+        return storage
+
+    storage = asyncio.run(scenario())
+    assert len(storage.cache) == 3
+    assert storage.key_builder.build(key(1)) in storage.cache
+
+
+def test_expired_dialogs_are_purged_while_running(tmp_path):
+    async def scenario():
+        storage = SQLiteStorage(str(tmp_path / "fsm.sqlite"), ttl=60)
+        await storage.set_state(key(1), "Dialog:first")
+        # Two minutes later
+        expired = time.time() - 120
+        storage.conn.execute("update fsm set updated_at = ?", (expired,))
+        storage.cache = type(storage.cache)(
+            (k, (state, data, expired)) for k, (state, data, _) in storage.cache.items()
+        )
+        purging = asyncio.create_task(storage.purge_periodically(interval=0))
+        await asyncio.sleep(0.01)
+        purging.cancel()
+        rows = storage.conn.execute("select count(*) from fsm").fetchone()[0]
+        await storage.close()
+        return storage, rows
+
+    storage, rows = asyncio.run(scenario())
+    assert rows == 0
+    assert not storage.cache